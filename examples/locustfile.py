@@ -1,9 +1,31 @@
 from locust import HttpUser, task, between
-import json
+import os
+import sys
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+from llm_test.services.llm_user import LLMUser
+from llm_test.services.workload import Workload, build_workload
 
-class LLMAPIUser(HttpUser):
-    """LLM API 压力测试用户"""
+# 从问题库抽样提示词，未设置 QUESTIONS_FILE 时使用固定提示词；
+# 设置 ARRIVAL_RATE（如 "20" 或 "ramp:1,50"）时改为开环负载，USERS 和 RUN_TIME 需与 -u、-t 一致
+WORKLOAD = Workload(build_workload({
+    "test_endpoint": "chat",
+    "model_name": os.environ.get("MODEL_NAME", "local-model"),
+    "temperature": os.environ.get("TEMPERATURE", 0.7),
+    "max_tokens": os.environ.get("MAX_TOKENS", 100),
+    "question_mode": "file" if os.environ.get("QUESTIONS_FILE") else "fixed",
+    "questions_file": os.environ.get("QUESTIONS_FILE"),
+    "prompt_length": os.environ.get("PROMPT_LENGTH"),
+    "output_length": os.environ.get("OUTPUT_LENGTH"),
+    "load_mode": "open" if os.environ.get("ARRIVAL_RATE") else "closed",
+    "arrival_rate": os.environ.get("ARRIVAL_RATE"),
+    "users": os.environ.get("USERS", 1),
+    "duration": os.environ.get("RUN_TIME", 60),
+}))
+
+
+class LLMAPIUser(LLMUser):
+    """LLM API 压力测试用户：流式请求，额外上报 TTFT、ITL 和 Tokens/s"""
     
     # 等待时间：每个任务之间等待1-3秒
     wait_time = between(1, 3)
@@ -11,55 +33,10 @@ class LLMAPIUser(HttpUser):
     # 设置基础URL
     host = "http://localhost:1234"
     
-    @task(1)
-    def get_models(self):
-        """测试获取模型列表接口"""
-        with self.client.get(
-            "/v1/models",
-            catch_response=True,
-            name="GET /v1/models"
-        ) as response:
-            if response.status_code == 200:
-                try:
-                    data = response.json()
-                    if "data" in data:
-                        response.success()
-                    else:
-                        response.failure("响应格式错误：缺少data字段")
-                except json.JSONDecodeError:
-                    response.failure("响应不是有效的JSON")
-            else:
-                response.failure(f"HTTP {response.status_code}")
+    workload = WORKLOAD
     
-    @task(3)
-    def chat_completion(self):
-        """测试聊天补全接口（权重更高）"""
-        payload = {
-            "model": "local-model",
-            "messages": [
-                {"role": "user", "content": "你好，请简单介绍一下自己。"}
-            ],
-            "temperature": 0.7,
-            "max_tokens": 100
-        }
-        
-        with self.client.post(
-            "/v1/chat/completions",
-            json=payload,
-            catch_response=True,
-            name="POST /v1/chat/completions"
-        ) as response:
-            if response.status_code == 200:
-                try:
-                    data = response.json()
-                    if "choices" in data and len(data["choices"]) > 0:
-                        response.success()
-                    else:
-                        response.failure("响应格式错误：缺少choices字段")
-                except json.JSONDecodeError:
-                    response.failure("响应不是有效的JSON")
-            else:
-                response.failure(f"HTTP {response.status_code}")
+    # 聊天补全接口权重更高；开环模式下由 open_loop 按到达率调度
+    tasks = [LLMUser.open_loop] if WORKLOAD.spec["arrival"] else {LLMUser.get_models: 1, LLMUser.chat_completion: 3}
     
     def on_start(self):
         """每个用户启动时执行"""
@@ -0,0 +1,87 @@
+# scripts/bench_startup.py
+"""测量控制台的冷启动时间，并检查启动时没有导入重量级依赖
+
+每轮在新的 Python 进程中导入应用并调用 create_app()，取多轮的中位数（不含解释器本身的启动）。
+pandas、openpyxl、numpy、locust 等只应在用到它们的功能运行时导入，出现在启动阶段即视为退化。
+
+用法: python scripts/bench_startup.py [--runs 7] [--max-ms 1500] [--importtime]
+启动时间超过 --max-ms 或导入了重量级依赖时退出码为 1，可以直接放进 CI。
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# 启动阶段不应导入的模块
+HEAVY_MODULES = ('pandas', 'openpyxl', 'numpy', 'locust', 'gevent', 'rapidfuzz', 'pyarrow', 'httpx')
+
+PROBE = f'''
+import sys, time, json
+sys.path.insert(0, {ROOT!r})
+started = time.perf_counter()
+from src.llm_test.app import create_app
+create_app()
+elapsed = time.perf_counter() - started
+heavy = sorted(name for name in {HEAVY_MODULES!r} if name in sys.modules)
+print(json.dumps({{"elapsed_ms": elapsed * 1000, "heavy": heavy, "modules": len(sys.modules)}}))
+'''
+
+
+def measure(runs: int) -> list:
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', PROBE], capture_output=True, text=True,
+                                check=True, cwd=ROOT).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+    return samples
+
+
+def print_importtime(limit: int = 15):
+    """按累计耗时列出导入最慢的模块"""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE], capture_output=True,
+                            text=True, cwd=ROOT).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative), name.strip()))
+    print(f"累计导入耗时最长的 {limit} 个模块:")
+    for cumulative, name in sorted(rows, reverse=True)[:limit]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='测量控制台冷启动时间')
+    parser.add_argument('--runs', type=int, default=7, help='测量轮数（默认7）')
+    parser.add_argument('--max-ms', type=float, default=1500, help='启动时间中位数上限，超过时退出码为1')
+    parser.add_argument('--importtime', action='store_true', help='同时列出导入最慢的模块')
+    args = parser.parse_args()
+
+    samples = measure(args.runs)
+    times = sorted(sample['elapsed_ms'] for sample in samples)
+    median = statistics.median(times)
+    heavy = samples[-1]['heavy']
+    print(f"启动时间（{args.runs} 轮）: 中位数 {median:.1f} ms，最快 {times[0]:.1f} ms，最慢 {times[-1]:.1f} ms")
+    print(f"已加载模块数: {samples[-1]['modules']}")
+    if args.importtime:
+        print_importtime()
+
+    failed = False
+    if heavy:
+        print(f"✗ 启动时导入了重量级依赖: {', '.join(heavy)}")
+        failed = True
+    if median > args.max_ms:
+        print(f"✗ 启动时间中位数超过上限 {args.max_ms:.0f} ms")
+        failed = True
+    if not failed:
+        print("✓ 启动时间正常")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,94 @@
 # scripts/clean_reports.py
+"""按运行记录清理过期的运行：删除记录库中的运行及其报告文件
+
+用法: python scripts/clean_reports.py [保留天数] [--keep-last N]
+不在记录库中的旧报告（如早期版本生成的 reports/test_report_*.xlsx）按修改时间清理。
+"""
 import os
+import sys
 import time
-from datetime import datetime, timedelta
+import shutil
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.llm_test.services.run_store import RunStore
+from src.llm_test.services.stress_service import STRESS_DIR
+from src.llm_test.services.capacity_search import CAPACITY_DIR
+from src.llm_test.services.checkpoint import CHECKPOINT_DIR, checkpoint_path
+from src.llm_test.services.report_files import remove_stale_copies
+
+# 每个运行独占一个目录的报告，删除运行时删除整个目录（相对于报告目录）
+RUN_DIRS = {'stress': os.path.basename(STRESS_DIR), 'capacity': os.path.basename(CAPACITY_DIR)}
+CHECKPOINT_SUBDIR = os.path.basename(CHECKPOINT_DIR)
+
+
+def _remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.isfile(path):
+        os.remove(path)
+    else:
+        return False
+    return True
+
+
+def _stem(path):
+    """不含扩展名的绝对路径，xlsx 报告和同名的 CSV 旁路文件视为同一份报告"""
+    return os.path.splitext(os.path.abspath(path))[0]
 
-def clean_reports(days_old=7, reports_dir='reports'):
-    """清理指定天数之前的报告文件"""
+
+def clean_reports(days_old=7, reports_dir='reports', keep_last=0):
+    """清理指定天数之前的运行记录和报告文件，最近的 keep_last 个运行始终保留
+
+    keep_last 只计顶层运行，对比的各目标和容量搜索的各档压测随上级运行一起保留或删除。
+    仍被保留的运行引用的报告（包括对比运行中父运行和子运行共用的报告）不会删除。
+    压测、容量搜索和检查点目录都位于 reports_dir 下。
+    """
     if not os.path.exists(reports_dir):
         print(f"目录 {reports_dir} 不存在")
         return
-    
-    now = time.time()
-    cutoff_time = now - (days_old * 86400)  # 86400秒/天
-    
+
+    cutoff_time = time.time() - (days_old * 86400)  # 86400秒/天
+    store_path = os.path.join(reports_dir, 'runs.sqlite')
+    checkpoint_dir = os.path.join(reports_dir, CHECKPOINT_SUBDIR)
+
     deleted = 0
+    store = RunStore(store_path)
+    try:
+        pruned = store.prune(cutoff_time, keep_last)
+        kept = {_stem(path) for path in store.report_paths()}
+        for run in pruned:
+            directory = RUN_DIRS.get(run['kind'])
+            paths = [os.path.join(reports_dir, directory, run['run_id'])] if directory else \
+                [run['report_path'], checkpoint_path(run['run_id'], checkpoint_dir)]
+            for path in paths:
+                if path and _stem(path) not in kept and _remove(path):
+                    print(f"已删除过期报告: {path}")
+            deleted += 1
+    finally:
+        store.close()
+
+    # 记录库之外的旧报告文件，记录库本身除外
     for filename in os.listdir(reports_dir):
         file_path = os.path.join(reports_dir, filename)
-        if os.path.isfile(file_path):
-            file_mtime = os.path.getmtime(file_path)
-            if file_mtime < cutoff_time:
-                os.remove(file_path)
-                deleted += 1
-                print(f"已删除过期报告: {filename}")
-    
-    print(f"清理完成，共删除 {deleted} 个过期报告")
+        if filename.startswith('runs.sqlite') or not os.path.isfile(file_path) or _stem(file_path) in kept:
+            continue
+        if os.path.getmtime(file_path) < cutoff_time:
+            os.remove(file_path)
+            print(f"已删除过期报告: {filename}")
+
+    # 原报告已删除的压缩副本
+    stale = remove_stale_copies(reports_dir)
+    if stale:
+        print(f"已删除 {stale} 个过期的压缩副本")
+
+    print(f"清理完成，共删除 {deleted} 个过期运行")
 
 if __name__ == "__main__":
-    clean_reports()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='清理过期的运行记录和报告')
+    parser.add_argument('days', nargs='?', type=int, default=7, help='保留最近多少天的运行（默认7）')
+    parser.add_argument('--keep-last', type=int, default=0, help='无论多久都保留最近的N个运行（不计对比和容量搜索的子运行）')
+    parser.add_argument('--reports-dir', default='reports')
+    args = parser.parse_args()
+    clean_reports(args.days, args.reports_dir, args.keep_last)
@@ -3,12 +3,21 @@ LLM测试工具安装配置
 """
 from setuptools import setup, find_packages
 
-with open("README.md", "r", encoding="utf-8") as fh:
+with open("docs/README.md", "r", encoding="utf-8") as fh:
     long_description = fh.read()
 
 with open("requirements.txt", "r", encoding="utf-8") as fh:
     requirements = [line.strip() for line in fh if line.strip() and not line.startswith("#")]
 
+# 可选功能的依赖，未安装时对应功能给出安装提示或退回到纯 Python 实现
+extras_require = {
+    "fast": ["rapidfuzz>=3.0.0"],        # 编辑距离相似度加速
+    "parquet": ["pyarrow>=12.0.0"],      # Parquet 问题文件
+    "async": ["httpx>=0.24.0"],          # 异步运行器
+    "server": ['gunicorn>=21.2.0; platform_system != "Windows"'],  # 生产部署
+}
+extras_require["all"] = sorted({req for reqs in extras_require.values() for req in reqs})
+
 setup(
     name="llm-test-tool",
     version="1.0.0",
@@ -20,6 +29,7 @@ setup(
     url="https://github.com/yourusername/llm-test-tool",
     package_dir={"": "src"},
     packages=find_packages(where="src"),
+    package_data={"llm_test": ["templates/*.html"]},
     classifiers=[
         "Development Status :: 4 - Beta",
         "Intended Audience :: Developers",
@@ -34,6 +44,7 @@ setup(
     ],
     python_requires=">=3.7",
     install_requires=requirements,
+    extras_require=extras_require,
     entry_points={
         "console_scripts": [
             "llm-test=llm_test.app:main",
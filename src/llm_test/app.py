@@ -0,0 +1,450 @@
+"""
+Web 控制台：应用工厂、路由和生产环境入口
+
+create_app() 创建 Flask 应用，可以交给任意 WSGI 服务器运行：
+
+    gunicorn -c python:llm_test.gunicorn_conf "llm_test.app:create_app()"
+
+main() 是 llm-test 命令的入口：安装了 gunicorn 时以多线程 worker 运行（配置见
+gunicorn_conf.py，可用命令行参数或 LLM_TEST_* 环境变量调整），否则或指定 --dev 时
+使用 Flask 自带的开发服务器。
+"""
+import os
+import sys
+import json
+import argparse
+import logging
+import mimetypes
+from datetime import datetime
+
+from flask import Blueprint, Flask, Response, current_app, jsonify, redirect, render_template, request, send_file
+
+from .services.jobs import QueueFullError, get_job, list_jobs, submit_qa_job
+from .services.stress_service import start_stress_job, get_stress_job, probe_locust
+from .services.capacity_search import start_capacity_search
+from .services.run_store import get_run_store
+from .services.report_files import (
+    REPORTS_DIR, available_encodings, compressed_copy, is_compressible, resolve_report,
+)
+
+logger = logging.getLogger(__name__)
+
+# 模板随包安装（llm_test/templates），可用 LLM_TEST_TEMPLATES 指向其他位置
+TEMPLATE_DIR = os.environ.get("LLM_TEST_TEMPLATES") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "templates")
+# 禁止反向代理缓冲 SSE 响应（nginx 默认会缓冲），保证事件实时送达
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+bp = Blueprint("dashboard", __name__)
+
+
+def create_app(config: dict = None) -> Flask:
+    """创建 Web 控制台应用
+
+    报告、检查点和运行记录都写在当前工作目录的 reports/ 下，
+    应用的 root_path 也设为当前工作目录，下载和查看报告时按同一目录解析相对路径。
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s [%(levelname)s] %(message)s',
+        handlers=[
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+    app = Flask(__name__, root_path=os.getcwd(), template_folder=TEMPLATE_DIR)
+    # nginx 中映射到 reports 目录的 internal location，如 /protected-reports/
+    app.config['REPORTS_ACCEL_REDIRECT'] = os.environ.get('LLM_TEST_ACCEL_REDIRECT')
+    app.config.update(config or {})
+    app.register_blueprint(bp)
+    return app
+
+
+@bp.route('/')
+def index():
+    """重定向到问答测试页面"""
+    return redirect('/qa')
+
+@bp.route('/qa')
+def qa_test():
+    try:
+        return render_template('qa_test.html', active_page='qa')
+    except Exception as e:
+        logger.error(f"加载失败: {e}", exc_info=True)
+        return str(e), 500
+
+@bp.route('/stress')
+def stress():
+    try:
+        return render_template('stress_test.html', active_page='stress')
+    except Exception as e:
+        logger.error(f"加载失败: {e}", exc_info=True)
+        return str(e), 500
+
+@bp.route('/runs')
+def runs_page():
+    try:
+        return render_template('runs.html', active_page='runs')
+    except Exception as e:
+        logger.error(f"加载失败: {e}", exc_info=True)
+        return str(e), 500
+
+@bp.route('/test_locust')
+def test_locust():
+    """测试Locust是否可用，结果按进程缓存，refresh=1 时重新检查"""
+    if request.args.get('refresh', '').lower() in ('1', 'true', 'yes'):
+        probe_locust.cache_clear()
+    return jsonify(probe_locust())
+
+@bp.route('/run_test', methods=['POST'])
+def run_test_route():
+    try:
+        config = {
+            'api_url': request.form['api_url'],
+            'model_name': request.form['model_name'],
+            'temperature': float(request.form['temperature']),
+            'max_tokens': int(request.form['max_tokens']),
+            'timeout': int(request.form['timeout']),
+            'sleep_interval': float(request.form['sleep_interval']),
+            'questions_file': request.form['questions_file']
+        }
+        logger.info(f"开始测试: {config['questions_file']}")
+        return jsonify({'status': 'started', 'config': config})
+    except Exception as e:
+        logger.error(f"启动测试失败: {e}", exc_info=True)
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+
+def _qa_config(values):
+    """把页面提交的问答测试参数转换为运行配置"""
+    config = values.to_dict()
+    config['temperature'] = float(config['temperature'])
+    config['max_tokens'] = int(config['max_tokens'])
+    config['timeout'] = int(config['timeout'])
+    config['sleep_interval'] = float(config['sleep_interval'])
+    config['concurrency'] = int(config.get('concurrency', 1))
+    config['question_mode'] = config.get('question_mode', 'file')
+    return config
+
+def _job_events(job, start):
+    """以 SSE 推送任务事件，事件ID为序号，断线重连时浏览器按 Last-Event-ID 从中断处继续"""
+    def generate():
+        for event in job.iter_events(start):
+            if event is None:
+                yield ": keepalive\n\n"
+                continue
+            seq = event.get('seq')
+            yield (f"id: {seq}\n" if seq else "") + f"data: {json.dumps(event)}\n\n"
+    
+    return Response(generate(), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+def _last_event_id():
+    return int(request.headers.get('Last-Event-ID') or request.args.get('from') or 0)
+
+@bp.route('/qa_jobs', methods=['POST'])
+def submit_qa_test():
+    """提交问答测试任务并立即返回任务ID，进度通过 /jobs/<job_id>/stream 获取"""
+    try:
+        config = _qa_config(request.values)
+        logger.info(f"提交问答测试任务，模式: {config['question_mode']}, 运行器: {config.get('runner', 'thread')}")
+        job = submit_qa_job(config)
+    except QueueFullError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 429
+    except Exception as e:
+        logger.error(f"提交问答测试失败: {e}", exc_info=True)
+        return jsonify({'status': 'error', 'message': str(e)}), 500
+    return jsonify({
+        'status': job.status,
+        'job_id': job.id,
+        'stream_url': f'/jobs/{job.id}/stream'
+    })
+
+@bp.route('/stream')
+def stream():
+    """兼容旧页面：提交问答测试任务后直接接入其事件流，断开连接不会中断测试"""
+    try:
+        job = submit_qa_job(_qa_config(request.args))
+    except Exception as e:
+        logger.error(f"流式测试失败: {e}", exc_info=True)
+        message = json.dumps({'type': 'error', 'message': str(e)})
+        return Response(f"data: {message}\n\n", mimetype='text/event-stream', headers=SSE_HEADERS)
+    return _job_events(job, 0)
+
+@bp.route('/jobs')
+def jobs():
+    return jsonify({'jobs': list_jobs(request.args.get('kind'))})
+
+@bp.route('/jobs/<job_id>')
+def job_status(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': f'未找到任务: {job_id}'}), 404
+    return jsonify(job.info())
+
+@bp.route('/jobs/<job_id>/stream')
+def job_stream(job_id):
+    """接入任务的事件流，可以随时断开和重新接入，错过的事件从缓冲区重放"""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': f'未找到任务: {job_id}'}), 404
+    return _job_events(job, _last_event_id())
+
+@bp.route('/jobs/<job_id>/cancel', methods=['POST'])
+def job_cancel(job_id):
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': f'未找到任务: {job_id}'}), 404
+    if not job.stop():
+        return jsonify({'status': 'error', 'message': '任务已结束'}), 409
+    return jsonify({'status': 'stopping', 'job_id': job_id})
+
+@bp.route('/.well-known/appspecific/com.chrome.devtools.json')
+def devtools():
+    return '', 204
+
+@bp.route('/stress_test', methods=['GET', 'POST'])
+def stress_test():
+    """启动后台压测任务并立即返回任务ID，进度通过 /stress_test/<job_id>/stream 获取
+    
+    wait=true 时等待压测结束，直接返回最终结果。手动输入的问题较长时用 POST 表单提交。
+    """
+    logger.info("=" * 50)
+    logger.info("收到压力测试请求")
+    config = request.values.to_dict()
+    params = {key: value for key, value in config.items() if key != 'questions_text'}
+    logger.info(f"请求参数: {params}")
+    
+    try:
+        wait = config.pop('wait', '').lower() in ('1', 'true', 'yes')
+        logger.info(f"配置: target={config.get('target_url')}, endpoint={config.get('test_endpoint')}, "
+                    f"users={config.get('users')}, duration={config.get('duration')}s, "
+                    f"workers={config.get('workers', 0)}+{config.get('external_workers', 0)}, "
+                    f"questions={config.get('question_mode', 'fixed')}")
+        job = start_stress_job(config)
+    except Exception as e:
+        logger.error(f"压测失败: {e}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': f'压测失败: {str(e)}'
+        }), 500
+    
+    if wait:
+        result = job.wait()
+        return jsonify(result), 200 if result['status'] == 'success' else 500
+    return jsonify({
+        'status': 'started',
+        'job_id': job.id,
+        'stream_url': f'/stress_test/{job.id}/stream'
+    })
+
+@bp.route('/capacity_search', methods=['GET', 'POST'])
+def capacity_search():
+    """启动容量搜索：逐级压测直到违反 SLO，事件同样通过 /stress_test/<job_id>/stream 获取"""
+    logger.info("=" * 50)
+    logger.info("收到容量搜索请求")
+    config = request.values.to_dict()
+    params = {key: value for key, value in config.items() if key != 'questions_text'}
+    logger.info(f"请求参数: {params}")
+    
+    try:
+        wait = config.pop('wait', '').lower() in ('1', 'true', 'yes')
+        job = start_capacity_search(config)
+    except Exception as e:
+        logger.error(f"容量搜索失败: {e}", exc_info=True)
+        return jsonify({
+            'status': 'error',
+            'message': f'容量搜索失败: {str(e)}'
+        }), 500
+    
+    if wait:
+        result = job.wait()
+        return jsonify(result), 200 if result['status'] == 'success' else 500
+    return jsonify({
+        'status': 'started',
+        'job_id': job.id,
+        'stream_url': f'/stress_test/{job.id}/stream'
+    })
+
+@bp.route('/stress_test/<job_id>')
+def stress_test_status(job_id):
+    job = get_stress_job(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': f'未找到压测任务: {job_id}'}), 404
+    return jsonify(job.info())
+
+@bp.route('/stress_test/<job_id>/stream')
+def stress_test_stream(job_id):
+    """以 SSE 推送压测事件，断线重连时按 Last-Event-ID 从中断处继续"""
+    job = get_stress_job(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': f'未找到压测任务: {job_id}'}), 404
+    return _job_events(job, _last_event_id())
+
+@bp.route('/stress_test/<job_id>/stop', methods=['POST'])
+def stress_test_stop(job_id):
+    job = get_stress_job(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': f'未找到压测任务: {job_id}'}), 404
+    if not job.stop():
+        return jsonify({'status': 'error', 'message': '压测任务已结束'}), 409
+    return jsonify({'status': 'stopping', 'job_id': job_id})
+
+def _send_report(filename: str, as_attachment: bool):
+    """发送 reports 目录下的文件
+
+    支持 Range、ETag/Last-Modified 条件请求（由 send_file 处理）；文本报告在客户端支持时
+    发送缓存的 gzip/zstd 副本。完整文件由 WSGI 服务器的 file_wrapper 发送（gunicorn 使用
+    sendfile 零拷贝）；配置了 REPORTS_ACCEL_REDIRECT 时改为返回 X-Accel-Redirect，由 nginx 发送。
+    """
+    path = resolve_report(filename)
+    accel_prefix = current_app.config.get('REPORTS_ACCEL_REDIRECT')
+    if accel_prefix:
+        response = Response(mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + os.path.relpath(
+            path, os.path.realpath(REPORTS_DIR)).replace(os.sep, '/')
+        if as_attachment:
+            response.headers.set('Content-Disposition', 'attachment', filename=os.path.basename(path))
+        return response
+
+    served, encoding = path, None
+    if is_compressible(path):
+        encoding = request.accept_encodings.best_match(available_encodings())
+        if encoding:
+            served = compressed_copy(path, encoding)
+    response = send_file(served, mimetype=mimetypes.guess_type(path)[0], as_attachment=as_attachment,
+                         download_name=os.path.basename(path))
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if is_compressible(path):
+        response.vary.add('Accept-Encoding')
+    return response
+
+@bp.route('/download/<path:filename>')
+def download_file(filename):
+    try:
+        logger.info(f"下载文件: {filename}")
+        return _send_report(filename, as_attachment=True)
+    except FileNotFoundError as e:
+        logger.error(f"下载文件失败: {e}")
+        return str(e), 404
+
+def _parse_time(value):
+    """接受时间戳或 YYYY-MM-DD[ HH:MM[:SS]] 格式的时间，空值返回 None"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+@bp.route('/api/runs')
+def list_runs():
+    """按类型、状态、目标、模型、关键字和时间范围筛选运行记录，分页返回"""
+    args = request.args
+    try:
+        result = get_run_store().list_runs(
+            kind=args.get('kind'),
+            status=args.get('status'),
+            target=args.get('target'),
+            model=args.get('model'),
+            search=args.get('q'),
+            since=_parse_time(args.get('since')),
+            until=_parse_time(args.get('until')),
+            parent_id=args.get('parent_id'),
+            top_level=args.get('top_level', '').lower() in ('1', 'true', 'yes'),
+            sort=args.get('sort', '-started'),
+            limit=int(args.get('limit', 50)),
+            offset=int(args.get('offset', 0)),
+        )
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return jsonify(result)
+
+@bp.route('/api/runs/compare')
+def compare_runs():
+    """对比多个运行的汇总指标，ids 以逗号分隔，第一个为基准"""
+    run_ids = [run_id for run_id in request.args.get('ids', '').split(',') if run_id]
+    if len(run_ids) < 2:
+        return jsonify({'status': 'error', 'message': '至少选择两个运行进行对比'}), 400
+    return jsonify(get_run_store().compare(run_ids))
+
+@bp.route('/api/runs/<run_id>')
+def get_run(run_id):
+    run = get_run_store().get_run(run_id)
+    if run is None:
+        return jsonify({'status': 'error', 'message': f'未找到运行记录: {run_id}'}), 404
+    return jsonify(run)
+
+@bp.route('/api/runs/<run_id>/rows')
+def get_run_rows(run_id):
+    """问答测试的逐题结果或压测的每秒统计，分页返回"""
+    store = get_run_store()
+    run = store.get_run(run_id)
+    if run is None:
+        return jsonify({'status': 'error', 'message': f'未找到运行记录: {run_id}'}), 404
+    return jsonify(store.get_rows(run_id, run['kind'], int(request.args.get('limit', 50)),
+                                  int(request.args.get('offset', 0))))
+
+@bp.route('/report/<path:filename>')
+def view_report(filename):
+    try:
+        logger.info(f"查看报告: {filename}")
+        return _send_report(filename, as_attachment=False)
+    except FileNotFoundError as e:
+        logger.error(f"查看报告失败: {e}")
+        return str(e), 404
+
+def _run_gunicorn(app: Flask, options: dict):
+    from gunicorn.app.base import BaseApplication
+    from . import gunicorn_conf
+
+    class DashboardApplication(BaseApplication):
+        def load_config(self):
+            settings = {key: getattr(gunicorn_conf, key) for key in self.cfg.settings if hasattr(gunicorn_conf, key)}
+            settings.update((key, value) for key, value in options.items() if value is not None)
+            for key, value in settings.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return app
+
+    DashboardApplication().run()
+
+
+def main(argv: list = None):
+    """llm-test 命令：默认用 gunicorn 运行，未安装 gunicorn（如 Windows）或指定 --dev 时用开发服务器"""
+    parser = argparse.ArgumentParser(description="LLM 测试工具 Web 控制台")
+    parser.add_argument("--host", default=os.environ.get("LLM_TEST_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("LLM_TEST_PORT", 5000)))
+    parser.add_argument("--workers", type=int, help="worker 进程数（默认 1，见 gunicorn_conf.py 的说明）")
+    parser.add_argument("--threads", type=int, help="每个 worker 的线程数，即可同时保持的 SSE 连接数")
+    parser.add_argument("--timeout", type=int, help="worker 无响应多少秒后重启")
+    parser.add_argument("--dev", action="store_true", help="使用 Flask 开发服务器（调试模式，自动重载）")
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    logger.info("=" * 60)
+    logger.info("LLM 测试工具 v1.0.0")
+    logger.info("=" * 60)
+    logger.info(f"访问地址: http://localhost:{args.port}")
+    logger.info(f"问答测试: http://localhost:{args.port}/")
+    logger.info(f"压力测试: http://localhost:{args.port}/stress")
+    logger.info(f"运行记录: http://localhost:{args.port}/runs")
+    logger.info("=" * 60)
+
+    if not args.dev:
+        try:
+            import gunicorn  # noqa: F401
+        except ImportError:
+            logger.warning("未安装 gunicorn，使用开发服务器运行。生产环境请运行: pip install gunicorn")
+        else:
+            _run_gunicorn(app, {
+                "bind": f"{args.host}:{args.port}",
+                "workers": args.workers,
+                "threads": args.threads,
+                "timeout": args.timeout,
+            })
+            return
+    app.run(host=args.host, port=args.port, debug=args.dev, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
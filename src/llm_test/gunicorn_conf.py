@@ -0,0 +1,26 @@
+"""gunicorn 配置：llm-test 命令和 gunicorn -c python:llm_test.gunicorn_conf 共用
+
+默认使用 gthread worker：每个 SSE 连接占用一个线程，空闲时阻塞在条件变量上，
+每 15 秒发送一次心跳，不占用 CPU。同时打开的页面较多时调大 LLM_TEST_THREADS。
+
+后台任务（问答测试、压测、容量搜索）和它们的事件缓冲保存在 worker 进程内，接入事件流的
+请求必须落到提交任务的同一个进程，因此默认只有 1 个 worker。运行记录保存在 SQLite 中，
+多个 worker 之间共享；需要多个 worker 时，反向代理要按客户端做会话保持（如 nginx 的
+ip_hash），否则其他 worker 会对任务ID返回 404。
+"""
+import os
+
+bind = os.environ.get("LLM_TEST_BIND") or f"{os.environ.get('LLM_TEST_HOST', '0.0.0.0')}:{os.environ.get('LLM_TEST_PORT', 5000)}"
+workers = int(os.environ.get("LLM_TEST_WORKERS", 1))
+worker_class = os.environ.get("LLM_TEST_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("LLM_TEST_THREADS", 64))
+# gthread worker 的 timeout 只检查 worker 心跳，不限制单个请求，长时间的 SSE 连接不受影响
+timeout = int(os.environ.get("LLM_TEST_TIMEOUT", 120))
+# 重启或关闭时等待运行中的请求结束的时间，SSE 连接会在这之后被断开，由浏览器自动重连
+graceful_timeout = int(os.environ.get("LLM_TEST_GRACEFUL_TIMEOUT", 30))
+# 反向代理到 gunicorn 的连接保持时间
+keepalive = int(os.environ.get("LLM_TEST_KEEPALIVE", 5))
+accesslog = os.environ.get("LLM_TEST_ACCESS_LOG", "-")
+forwarded_allow_ips = os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1")
+# 报告下载通过 wsgi.file_wrapper 以 sendfile 零拷贝发送（Range 请求除外）
+sendfile = True
@@ -0,0 +1,295 @@
+"""基于 asyncio 的问答测试运行器
+
+单个事件循环即可驱动数百个在途请求，无需为每个请求占用一个线程。
+产出的事件与 qa_service.run_test_stream 完全一致。
+"""
+import asyncio
+import time
+import logging
+
+from .qa_service import (
+    build_payload,
+    build_result,
+    create_report_writer,
+    extract_answer,
+    persist_event,
+    finish_run,
+    is_blank_question,
+    is_stream_mode,
+    open_run_questions,
+    peek_rows,
+    record_result,
+    record_skip,
+    track_rows,
+    usage_metrics,
+)
+from .checkpoint import open_checkpoint
+from .response_cache import open_response_cache
+from .throttle import create_concurrency_limit, create_rate_limiter
+from .retry import create_retry_policy, hedge_connections
+from .latency_stats import create_run_stats
+from .run_store import open_run_recorder
+from .similarity import score_one, supports_incremental
+from .stream_metrics import StreamCollector
+
+logger = logging.getLogger(__name__)
+
+
+def _import_httpx():
+    try:
+        import httpx
+    except ImportError as e:
+        raise ImportError("异步运行器需要 httpx，请运行: pip install httpx") from e
+    return httpx
+
+
+def create_async_client(config: dict):
+    """按连接池配置创建 httpx.AsyncClient
+
+    开启对冲时连接数默认为并发数的 2 倍，对冲请求不会因等待连接而 PoolTimeout（落败的请求会被取消）。
+    """
+    httpx = _import_httpx()
+    concurrency = max(1, int(config.get("concurrency", 1) or 1))
+    pool_maxsize = int(config.get("pool_maxsize", max(10, hedge_connections(config, concurrency))))
+    keep_alive = config.get("keep_alive", True)
+    if isinstance(keep_alive, str):
+        keep_alive = keep_alive.lower() not in ("0", "false", "off", "no")
+
+    limits = httpx.Limits(
+        max_connections=pool_maxsize,
+        max_keepalive_connections=pool_maxsize if keep_alive else 0
+    )
+    logger.info(f"异步HTTP客户端已创建: max_connections={pool_maxsize}, keep_alive={keep_alive}")
+    return httpx.AsyncClient(limits=limits, timeout=config["timeout"])
+
+
+async def asend_request(payload: dict, config: dict, client, on_token=None) -> dict:
+    """send_request 的异步版本，返回结构相同"""
+    stream = payload.get("stream", False)
+
+    # 通过 httpx 的 trace 扩展统计建连（TCP + TLS）耗时
+    connect = {"start": None, "total": 0.0}
+
+    async def trace(event_name, info):
+        if event_name in ("connection.connect_tcp.started", "connection.start_tls.started"):
+            connect["start"] = time.perf_counter()
+        elif event_name in ("connection.connect_tcp.complete", "connection.start_tls.complete") and connect["start"]:
+            connect["total"] += time.perf_counter() - connect["start"]
+            connect["start"] = None
+
+    start_time = time.time()
+    try:
+        request = client.build_request("POST", config["api_url"], json=payload, extensions={"trace": trace})
+        response = await client.send(request, stream=stream)
+        try:
+            if response.status_code != 200:
+                await response.aread()
+                connect_time = connect["total"]
+                error_msg = f"HTTP {response.status_code}: {response.text}"
+                logger.error(f"API请求失败: {error_msg}")
+                return build_result(False, "", error_msg, time.time() - start_time - connect_time, connect_time,
+                                    status_code=response.status_code)
+
+            if stream:
+                collector = StreamCollector(start_time, on_token)
+                async for line in response.aiter_lines():
+                    collector.feed(line)
+                    if collector.done:
+                        break
+                connect_time = connect["total"]
+                answer, metrics = collector.finish(connect_time)
+                latency = time.time() - start_time - connect_time
+            else:
+                data = response.json()
+                answer = extract_answer(data)
+                connect_time = connect["total"]
+                latency = time.time() - start_time - connect_time
+                metrics = usage_metrics(data, latency)
+        finally:
+            await response.aclose()
+        return build_result(True, answer, "", latency, connect_time, **metrics)
+
+    except Exception as e:
+        connect_time = connect["total"]
+        logger.error(f"API调用异常: {e!r}", exc_info=True)
+        return build_result(False, "", str(e) or repr(e), time.time() - start_time - connect_time, connect_time)
+
+
+async def aask_model(question: str, config: dict, client, on_token=None, cache=None, limiter=None,
+                     retry=None) -> dict:
+    """ask_model 的异步版本，返回结构相同
+
+    缓存查询是本地 SQLite 的单行读写，耗时远小于一次模型请求，直接在事件循环中执行。
+    """
+    payload = build_payload(question, config)
+    if cache is not None:
+        cached = cache.get(payload, config.get("api_url"))
+        if cached is not None:
+            return dict(cached, cached=True)
+
+    if retry is not None:
+        result = await retry.arun(
+            lambda: asend_request(payload, config, client, on_token),
+            limiter,
+            stream=payload.get("stream", False)
+        )
+    else:
+        if limiter is not None:
+            delay = limiter.delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        result = await asend_request(payload, config, client, on_token)
+
+    if cache is not None:
+        cache.put(payload, result, config.get("api_url"))
+    return result
+
+
+async def aexecute_questions(rows, config: dict, results: list, total: int = None, completed: dict = None,
+                             cache=None):
+    """execute_questions 的异步版本，在途请求数和发送速率的控制与线程版相同
+
+    逐个评分放在默认线程池中执行，避免阻塞事件循环。
+    """
+    completed = completed or {}
+    limit = create_concurrency_limit(config)
+    limiter = create_rate_limiter(config)
+    retry = create_retry_policy(config)
+    stream = is_stream_mode(config)
+    score = supports_incremental(config)
+    loop = asyncio.get_running_loop()
+    # 与线程版一致：token 事件为 dict，完成结果为 (index, result) 元组
+    events = asyncio.Queue()
+    tasks = set()
+    in_flight = 0
+
+    async def ask(i, question, reference):
+        def on_token(content):
+            events.put_nowait({"type": "token", "index": i, "content": content})
+        result = None
+        try:
+            result = await aask_model(question, config, client, on_token if stream else None, cache, limiter, retry)
+            if limiter is not None:
+                limiter.record(result)
+            if score:
+                result["similarity"] = await loop.run_in_executor(
+                    None, score_one, result["answer"], reference, config
+                )
+        except Exception as e:
+            # 评分失败时保留已拿到的回答，只有请求本身失败才记为失败
+            logger.error(f"问题 {i} 执行异常: {e}", exc_info=True)
+            if result is None:
+                result = build_result(False, "", str(e), 0, 0)
+        finally:
+            # 无论成败都放入完成结果，否则 wait_one 会一直等待
+            events.put_nowait((i, result if result is not None else build_result(False, "", "请求已取消", 0, 0)))
+
+    async def wait_one():
+        """转发 token 事件，直到有一个问题完成"""
+        nonlocal in_flight
+        while True:
+            item = await events.get()
+            if isinstance(item, dict):
+                yield item
+                continue
+            in_flight -= 1
+            limit.on_result(item[1])
+            yield record_result(results, *item)
+            return
+
+    if limit.maximum > 1:
+        logger.info(f"异步并发模式，并发数: {limit.limit}")
+    async with create_async_client(dict(config, concurrency=limit.maximum)) as client:
+        try:
+            for i, question, reference in rows:
+                if i in completed:
+                    yield dict(record_result(results, i, completed[i]), resumed=True)
+                    continue
+                if is_blank_question(question):
+                    yield record_skip(results, i, total)
+                    continue
+
+                yield {"type": "question", "index": i, "total": total, "question": question}
+                task = asyncio.ensure_future(ask(i, question, reference))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                in_flight += 1
+
+                while in_flight >= limit.limit:
+                    async for event in wait_one():
+                        yield event
+
+            while in_flight:
+                async for event in wait_one():
+                    yield event
+        finally:
+            for task in tasks:
+                task.cancel()
+    if limit.adaptive:
+        logger.info(f"自适应并发结束: 最终上限 {limit.limit}, 峰值 {limit.peak}")
+
+
+async def arun_test_stream(config: dict):
+    """run_test_stream 的异步版本，以异步生成器产出相同的事件"""
+    try:
+        rows, total = open_run_questions(config)
+        rows = peek_rows(rows)
+
+        if rows is None:
+            yield {"type": "error", "message": "未找到有效的测试问题"}
+            return
+
+        store, completed = open_checkpoint(config)
+        logger.info(f"开始异步测试 {config['run_id']}，预计 {total if total is not None else '未知'} 个问题")
+        yield {"type": "start", "total": total, "run_id": config["run_id"], "resumed": len(completed)}
+        questions, reference_answers, results = [], [], []
+        writer = create_report_writer(config)
+        cache = open_response_cache(config)
+        stats = create_run_stats(config)
+        recorder = open_run_recorder(config)
+
+        try:
+            tracked = track_rows(rows, questions, reference_answers, results)
+            async for event in aexecute_questions(tracked, config, results, total, completed, cache):
+                persist_event(event, questions, results, writer, store, recorder)
+                yield event
+                stats_event = stats.observe(event)
+                if stats_event:
+                    yield stats_event
+
+            # 保存报告是阻塞的文件IO，放到线程中执行以免卡住事件循环
+            loop = asyncio.get_running_loop()
+            complete = await loop.run_in_executor(
+                None, finish_run, results, questions, reference_answers, config, writer, cache, stats
+            )
+            if recorder is not None:
+                recorder.finish(complete)
+            yield dict(complete, run_id=config["run_id"])
+        finally:
+            writer.close()
+            if recorder is not None:
+                recorder.close()
+            if store is not None:
+                store.close()
+            if cache is not None:
+                cache.close()
+    except Exception as e:
+        logger.error(f"测试执行失败: {e}", exc_info=True)
+        yield {"type": "error", "message": str(e)}
+
+
+def iterate_sync(async_gen):
+    """在当前线程的新事件循环中逐个取出异步生成器的事件，供 Flask 等同步代码使用"""
+    loop = asyncio.new_event_loop()
+    try:
+        while True:
+            try:
+                yield loop.run_until_complete(async_gen.__anext__())
+            except StopAsyncIteration:
+                break
+    finally:
+        try:
+            loop.run_until_complete(async_gen.aclose())
+            loop.run_until_complete(loop.shutdown_asyncgens())
+        finally:
+            loop.close()
@@ -0,0 +1,336 @@
+"""容量搜索：逐级提高并发（或到达率）直到违反 SLO，找出吞吐的拐点
+
+每一级是一次独立的短时压测（StressJob），级别按 search_mode 选择：
+- step: 从 search_start 起每级增加 search_step，直到 search_max 或某一级违反 SLO
+- binary: 先测 search_start 和 search_max，再在满足与违反 SLO 的两级之间二分，
+  直到两者相差不超过 search_resolution
+闭环模式下级别是用户数，开环模式（load_mode=open）下是到达率（请求/秒）。
+
+SLO 包括 slo_p95_ms（p95 响应时间，毫秒）、slo_error_rate（失败率，0~1）和
+slo_ttft_p95_ms（流式请求的首Token延迟 p95，毫秒），为0的项不检查。
+满足 SLO 的各级中 RPS 最高的一级即为拐点，同时给出输出Token/秒最高的一级。
+每级的结果写入 reports/capacity/<任务ID>/curve.csv，并生成带曲线图的 Excel 报告。
+"""
+import csv
+import os
+import threading
+import time
+import logging
+
+from .jobs import BackgroundJob, register_job
+from .stress_service import StressJob
+from .workload import build_workload
+from .run_store import record_stress_run
+
+logger = logging.getLogger(__name__)
+
+CAPACITY_DIR = os.path.join("reports", "capacity")
+SEARCH_MODES = ("step", "binary")
+DEFAULT_STEP_DURATION = 30
+DEFAULT_ERROR_RATE = 0.01
+
+CURVE_COLUMNS = [
+    ("序号", "step"),
+    ("并发用户数", "users"),
+    ("到达率(请求/秒)", "arrival_rate"),
+    ("RPS", "rps"),
+    ("输出Token/秒", "output_tokens_per_sec"),
+    ("P50(毫秒)", "p50_ms"),
+    ("P95(毫秒)", "p95_ms"),
+    ("P99(毫秒)", "p99_ms"),
+    ("TTFT P95(毫秒)", "ttft_p95_ms"),
+    ("失败率", "error_rate"),
+    ("满足SLO", "passed"),
+    ("违反项", "breach"),
+    ("压测任务ID", "job_id"),
+]
+
+
+def check_slo(step: dict, slo: dict) -> list:
+    """返回违反的 SLO 说明，全部满足时返回空列表"""
+    breaches = []
+    if slo["p95_ms"] and (step["p95_ms"] is None or step["p95_ms"] > slo["p95_ms"]):
+        breaches.append(f"P95 {step['p95_ms']}ms > {slo['p95_ms']}ms")
+    if slo["error_rate"] is not None and step["error_rate"] > slo["error_rate"]:
+        breaches.append(f"失败率 {step['error_rate']:.2%} > {slo['error_rate']:.2%}")
+    if slo["ttft_p95_ms"] and step["ttft_p95_ms"] is not None and step["ttft_p95_ms"] > slo["ttft_p95_ms"]:
+        breaches.append(f"TTFT P95 {step['ttft_p95_ms']}ms > {slo['ttft_p95_ms']}ms")
+    return breaches
+
+
+def find_knee(steps: list) -> dict:
+    """满足 SLO 的级别中 RPS 最高和输出Token/秒最高的两级"""
+    passed = [step for step in steps if step["passed"]]
+    summary = {"knee": None, "max_tokens": None}
+    if passed:
+        summary["knee"] = max(passed, key=lambda step: step["rps"])
+        with_tokens = [step for step in passed if step.get("output_tokens_per_sec") is not None]
+        if with_tokens:
+            summary["max_tokens"] = max(with_tokens, key=lambda step: step["output_tokens_per_sec"])
+    return summary
+
+
+def write_curve_csv(path: str, steps: list):
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow([name for name, _ in CURVE_COLUMNS])
+        for step in steps:
+            writer.writerow([step.get(key) for _, key in CURVE_COLUMNS])
+
+
+def write_capacity_report(path: str, steps: list, summary_rows: list, level_name: str):
+    """容量曲线（含 RPS、输出Token/秒与 P95 随级别变化的折线图）和汇总两页的 Excel 报告"""
+    from openpyxl import Workbook
+    from openpyxl.chart import LineChart, Reference
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "容量曲线"
+    sheet.append([name for name, _ in CURVE_COLUMNS])
+    # 图表的横轴按级别排序，二分搜索的执行顺序不是单调的
+    ordered = sorted(steps, key=lambda step: step["level"])
+    for step in ordered:
+        sheet.append([step.get(key) for _, key in CURVE_COLUMNS])
+
+    if ordered:
+        rows = len(ordered) + 1
+        columns = {key: index + 1 for index, (_, key) in enumerate(CURVE_COLUMNS)}
+        level_column = columns["arrival_rate" if level_name == "到达率" else "users"]
+        throughput = LineChart()
+        throughput.title = "容量曲线"
+        throughput.x_axis.title = level_name
+        throughput.y_axis.title = "RPS / 输出Token/秒"
+        for key in ("rps", "output_tokens_per_sec"):
+            throughput.add_data(Reference(sheet, min_col=columns[key], min_row=1, max_row=rows), titles_from_data=True)
+        latency = LineChart()
+        latency.y_axis.title = "P95(毫秒)"
+        latency.y_axis.axId = 200
+        latency.y_axis.crosses = "max"
+        latency.add_data(Reference(sheet, min_col=columns["p95_ms"], min_row=1, max_row=rows), titles_from_data=True)
+        throughput.set_categories(Reference(sheet, min_col=level_column, min_row=2, max_row=rows))
+        throughput += latency
+        throughput.width, throughput.height = 24, 12
+        sheet.add_chart(throughput, f"A{rows + 3}")
+
+    summary = workbook.create_sheet("容量汇总")
+    summary.append(["项目", "值"])
+    for item in summary_rows:
+        summary.append(list(item))
+    workbook.save(path)
+
+
+class CapacitySearch(BackgroundJob):
+    """逐级运行压测并在违反 SLO 时停止的后台任务"""
+
+    kind = 'capacity'
+
+    def __init__(self, config: dict, job_id: str = None):
+        super().__init__(config, job_id)
+        self.open_loop = str(config.get("load_mode") or "closed").lower() == "open"
+        self.search_mode = str(config.get("search_mode") or "step").lower()
+        self.start_level = float(config.get("search_start") or 1)
+        self.step_size = float(config.get("search_step") or self.start_level)
+        self.max_level = float(config.get("search_max") or (100 if self.open_loop else 64))
+        self.resolution = float(config.get("search_resolution") or 1)
+        self.step_duration = int(config.get("step_duration") or DEFAULT_STEP_DURATION)
+        error_rate = config.get("slo_error_rate", DEFAULT_ERROR_RATE)
+        self.slo = {
+            "p95_ms": float(config.get("slo_p95_ms") or 0),
+            "error_rate": float(error_rate) if error_rate not in (None, "") else None,
+            "ttft_p95_ms": float(config.get("slo_ttft_p95_ms") or 0),
+        }
+        self.directory = os.path.join(CAPACITY_DIR, self.id)
+        self.steps = []
+        self.current = None
+
+    @property
+    def level_name(self) -> str:
+        return "到达率" if self.open_loop else "并发用户数"
+
+    def _level(self, value: float):
+        # 用户数只能取整数
+        return round(value, 2) if self.open_loop else max(1, int(round(value)))
+
+    def step_config(self, level) -> dict:
+        config = dict(self.config, duration=self.step_duration)
+        if self.open_loop:
+            config["arrival_rate"] = str(level)
+        else:
+            # 所有用户同时启动，避免爬坡时间占用测量窗口
+            config["users"] = level
+            config["spawn_rate"] = level
+        return config
+
+    def start(self):
+        if self.search_mode not in SEARCH_MODES:
+            raise ValueError(f"未知的搜索方式: {self.search_mode}，可选: {', '.join(SEARCH_MODES)}")
+        if self.start_level <= 0 or self.max_level < self.start_level:
+            raise ValueError(f"搜索范围无效: {self.start_level} ~ {self.max_level}")
+        # 提前检查负载配置，出错时不启动任务
+        build_workload(self.step_config(self._level(self.start_level)))
+        os.makedirs(self.directory, exist_ok=True)
+        self.started = time.time()
+        self.publish({
+            "type": "start",
+            "search_mode": self.search_mode,
+            "level_name": self.level_name,
+            "search_start": self._level(self.start_level),
+            "search_max": self._level(self.max_level),
+            "step_duration": self.step_duration,
+            "slo": self.slo,
+        }, status="running")
+        logger.info(f"容量搜索 {self.id} 启动: {self.search_mode}, {self.level_name} "
+                    f"{self._level(self.start_level)} ~ {self._level(self.max_level)}, SLO: {self.slo}")
+        self.thread = threading.Thread(target=self._run, name=f"capacity-{self.id}", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> bool:
+        if self.finished:
+            return False
+        self.stop_requested = True
+        logger.info(f"停止容量搜索 {self.id}")
+        if self.current is not None:
+            self.current.stop()
+        return True
+
+    def run_level(self, level):
+        """运行一级压测并返回该级的结果，被停止或压测失败时返回 None"""
+        number = len(self.steps) + 1
+        job = StressJob(self.step_config(level), parent_id=self.id).start()
+        self.current = job
+        self.publish({"type": "step_start", "step": number, "level": level, "stress_job_id": job.id})
+        for event in job.iter_events():
+            if event is not None and event["type"] == "stats":
+                self.publish(dict(event, step=number, level=level))
+        self.current = None
+        result = job.result or {}
+        if result.get("status") != "success" or result.get("stopped"):
+            if not self.stop_requested:
+                raise RuntimeError(f"第 {number} 级压测失败: {result.get('message', '未知错误')}")
+            return None
+
+        total = result["total_requests"]
+        ttft = (result.get("llm_metrics") or {}).get("ttft") or {}
+        step = {
+            "step": number,
+            "level": level,
+            "users": job.users,
+            "arrival_rate": level if self.open_loop else None,
+            "rps": result["avg_rps"],
+            "output_tokens_per_sec": result.get("output_tokens_per_sec"),
+            "p50_ms": result.get("p50_response_time"),
+            "p95_ms": result.get("p95_response_time"),
+            "p99_ms": result.get("p99_response_time"),
+            "ttft_p95_ms": ttft.get("p95"),
+            "error_rate": round(result["failed_count"] / total, 4) if total else 1.0,
+            "job_id": job.id,
+            "report_path": job.html_path,
+        }
+        breaches = check_slo(step, self.slo)
+        step["passed"] = not breaches
+        step["breach"] = "; ".join(breaches)
+        self.steps.append(step)
+        self.publish(dict(step, type="step"))
+        logger.info(f"容量搜索 {self.id} 第 {number} 级: {self.level_name}={level}, RPS={step['rps']}, "
+                    f"P95={step['p95_ms']}ms, 失败率={step['error_rate']:.2%}, "
+                    f"{'满足SLO' if step['passed'] else '违反SLO: ' + step['breach']}")
+        return step
+
+    def _search_step(self):
+        level = self.start_level
+        while level <= self.max_level + 1e-9 and not self.stop_requested:
+            step = self.run_level(self._level(level))
+            if step is None or not step["passed"]:
+                return
+            level += self.step_size
+
+    def _search_binary(self):
+        low, high = self._level(self.start_level), self._level(self.max_level)
+        step = self.run_level(low)
+        if step is None or not step["passed"]:
+            return
+        step = self.run_level(high)
+        if step is None or step["passed"]:
+            return
+        while high - low > self.resolution and not self.stop_requested:
+            middle = self._level((low + high) / 2)
+            if middle in (low, high):
+                break
+            step = self.run_level(middle)
+            if step is None:
+                return
+            if step["passed"]:
+                low = middle
+            else:
+                high = middle
+
+    def _run(self):
+        try:
+            if self.search_mode == "binary":
+                self._search_binary()
+            else:
+                self._search_step()
+            self._finish()
+        except Exception as e:
+            logger.error(f"容量搜索失败: {e}", exc_info=True)
+            self.result = {"status": "error", "message": str(e), "steps": self.steps}
+            record_stress_run(self, "failed", kind="capacity")
+            self.publish({"type": "error", "message": str(e)}, status="failed")
+
+    def summary_rows(self, summary: dict) -> list:
+        knee, max_tokens = summary["knee"], summary["max_tokens"]
+        rows = [
+            ("目标API地址", self.config.get("target_url")),
+            ("搜索方式", self.search_mode),
+            ("负载模式", "开环" if self.open_loop else "闭环"),
+            ("每级时长(秒)", self.step_duration),
+            ("SLO P95(毫秒)", self.slo["p95_ms"] or "不限"),
+            ("SLO 失败率", self.slo["error_rate"] if self.slo["error_rate"] is not None else "不限"),
+            ("SLO TTFT P95(毫秒)", self.slo["ttft_p95_ms"] or "不限"),
+            ("已测级数", len(self.steps)),
+        ]
+        if knee is None:
+            rows.append(("拐点", "没有满足SLO的级别"))
+            return rows
+        rows.extend([
+            ("最大RPS", knee["rps"]),
+            (f"最大RPS时的{self.level_name}", knee["level"]),
+            ("最大RPS时的P95(毫秒)", knee["p95_ms"]),
+        ])
+        if max_tokens is not None:
+            rows.extend([
+                ("最大输出Token/秒", max_tokens["output_tokens_per_sec"]),
+                (f"最大输出Token/秒时的{self.level_name}", max_tokens["level"]),
+            ])
+        return rows
+
+    def _finish(self):
+        summary = find_knee(self.steps)
+        curve_path = os.path.join(self.directory, "curve.csv")
+        report_path = os.path.join(self.directory, "capacity_report.xlsx")
+        write_curve_csv(curve_path, self.steps)
+        write_capacity_report(report_path, self.steps, self.summary_rows(summary), self.level_name)
+        knee, max_tokens = summary["knee"], summary["max_tokens"]
+        self.result = {
+            "status": "success",
+            "stopped": self.stop_requested,
+            "level_name": self.level_name,
+            "knee": knee,
+            "max_rps": knee["rps"] if knee else None,
+            "max_rps_level": knee["level"] if knee else None,
+            "max_output_tokens_per_sec": max_tokens["output_tokens_per_sec"] if max_tokens else None,
+            "max_output_tokens_level": max_tokens["level"] if max_tokens else None,
+            "steps": self.steps,
+            "curve_path": curve_path,
+            "report_path": report_path,
+        }
+        logger.info(f"容量搜索 {self.id} 完成: 最大RPS={self.result['max_rps']}"
+                    f"（{self.level_name}={self.result['max_rps_level']}），报告: {report_path}")
+        status = "stopped" if self.stop_requested else "completed"
+        record_stress_run(self, status, kind="capacity")
+        self.publish(dict(self.result, type="complete"), status=status)
+
+
+def start_capacity_search(config: dict) -> CapacitySearch:
+    return register_job(CapacitySearch(config).start())
@@ -0,0 +1,119 @@
+"""问答测试的断点续跑
+
+每个运行以 run_id 标识，结果按完成顺序逐行追加到 reports/checkpoints/<run_id>.jsonl，
+第一行为运行的元信息。连接中断或进程重启后，以 resume_run_id 重新发起同一测试即可
+跳过已成功回答的问题。
+"""
+import json
+import os
+import re
+import uuid
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_DIR = os.path.join("reports", "checkpoints")
+
+_RUN_ID_PATTERN = re.compile(r"^[A-Za-z0-9_\-]+$")
+
+
+def new_run_id() -> str:
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+
+def checkpoint_path(run_id: str, directory: str = CHECKPOINT_DIR) -> str:
+    if not _RUN_ID_PATTERN.match(run_id or ""):
+        raise ValueError(f"无效的运行ID: {run_id}")
+    return os.path.join(directory, f"{run_id}.jsonl")
+
+
+class CheckpointStore:
+    """追加写入的 JSONL 结果记录"""
+
+    def __init__(self, run_id: str, directory: str = CHECKPOINT_DIR):
+        self.run_id = run_id
+        self.path = checkpoint_path(run_id, directory)
+        self.file = None
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def load(self) -> tuple:
+        """返回 (元信息, {序号: 结果})，同一序号多次记录时以最后一次为准"""
+        meta, completed = {}, {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 进程中断时最后一行可能只写了一半
+                    logger.warning(f"忽略损坏的断点记录: {self.path}")
+                    continue
+                if "meta" in record:
+                    meta = record["meta"]
+                else:
+                    completed[record["index"]] = record["result"]
+        return meta, completed
+
+    def open(self, meta: dict = None):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        is_new = not self.exists()
+        self.file = open(self.path, "a", encoding="utf-8")
+        if is_new:
+            self._write({"meta": dict(meta or {}, run_id=self.run_id, created=datetime.now().isoformat())})
+        return self
+
+    def append(self, index: int, result: dict):
+        self._write({"index": index, "result": result})
+
+    def _write(self, record: dict):
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+
+def is_checkpoint_enabled(config: dict) -> bool:
+    value = config.get("checkpoint", True)
+    if isinstance(value, str):
+        return value.lower() not in ("0", "false", "off", "no")
+    return bool(value)
+
+
+def open_checkpoint(config: dict) -> tuple:
+    """按配置准备本次运行的断点记录，返回 (store 或 None, 已成功回答的 {序号: 结果})
+
+    config["resume_run_id"] 指定时续写该运行并跳过其中已成功的问题，此时 run_id 与之相同；
+    否则使用 config["run_id"] 或新生成的ID。最终的 run_id 写回 config。
+    """
+    resume_run_id = config.get("resume_run_id") or None
+    run_id = resume_run_id or config.get("run_id") or new_run_id()
+    config["run_id"] = run_id
+    if not is_checkpoint_enabled(config) and not resume_run_id:
+        return None, {}
+
+    store = CheckpointStore(run_id)
+    completed = {}
+    if resume_run_id:
+        if not store.exists():
+            raise FileNotFoundError(f"未找到运行记录: {resume_run_id}")
+        meta, records = store.load()
+        if meta.get("questions_file") != config.get("questions_file"):
+            logger.warning(f"续跑的问题文件与原运行不同: {meta.get('questions_file')} -> {config.get('questions_file')}")
+        completed = {index: result for index, result in records.items() if result.get("success")}
+        logger.info(f"续跑运行 {run_id}，已完成 {len(completed)} 个问题")
+
+    store.open({
+        "question_mode": config.get("question_mode", "file"),
+        "questions_file": config.get("questions_file"),
+        "api_url": config.get("api_url"),
+        "model_name": config.get("model_name"),
+    })
+    return store, completed
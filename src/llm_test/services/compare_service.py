@@ -0,0 +1,296 @@
+"""多目标对比测试：同一批问题同时发给多个模型或服务端
+
+config["targets"] 为目标列表，每个目标是一个覆盖公共配置的 dict（至少包含 api_url，
+可以覆盖 model_name、concurrency、rate_limit_*、max_retries 等任意问答测试配置），
+name 为报告中显示的名称。从页面提交时也可以是 JSON 字符串，或每行一个目标的文本：
+
+    名称|API地址|模型名称|并发数
+
+每个问题读出后立即分发给所有目标。每个目标有自己的连接池、线程池、并发上限、限流和
+重试策略，快的目标不会被慢的目标拖住（最多领先 window 个问题），整个运行的耗时约等于
+最慢目标单独运行的耗时。结果写入一个对比报告：逐题并排列出各目标的回答、延迟和相似度，
+汇总页并排列出各目标的延迟分位数、吞吐量和平均相似度。
+
+对比运行本身以 compare 类型写入运行记录，每个目标另外作为一次问答测试记录（parent_id
+指向对比运行），可以在运行记录页面直接对比。对比模式不支持断点续跑。
+"""
+import json
+import queue
+import time
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .http_client import create_session
+from .qa_service import (
+    ask_model, build_result, is_blank_question, is_stream_mode, open_run_questions, peek_rows,
+    calculate_similarity,
+)
+from .checkpoint import new_run_id
+from .response_cache import open_response_cache
+from .throttle import create_concurrency_limit, create_rate_limiter
+from .retry import create_retry_policy
+from .latency_stats import RunStats, create_run_stats
+from .similarity import score_one, supports_incremental
+from .report_writer import write_comparison_report
+from .run_store import open_run_recorder
+
+logger = logging.getLogger(__name__)
+
+TARGET_FIELDS = ("name", "api_url", "model_name", "concurrency")
+
+
+def parse_targets(spec) -> list:
+    """把 targets 配置解析为目标 dict 的列表，名称缺省时取模型名称或“目标N”"""
+    if isinstance(spec, str):
+        text = spec.strip()
+        if text.startswith("["):
+            spec = json.loads(text)
+        else:
+            spec = []
+            for line in text.splitlines():
+                if not line.strip():
+                    continue
+                values = [value.strip() for value in line.split("|")]
+                spec.append({key: value for key, value in zip(TARGET_FIELDS, values) if value})
+    targets = []
+    for n, target in enumerate(spec or [], 1):
+        if not target.get("api_url"):
+            raise ValueError(f"第 {n} 个对比目标缺少 api_url")
+        target = dict(target)
+        target["name"] = str(target.get("name") or target.get("model_name") or f"目标{n}")
+        targets.append(target)
+    names = [target["name"] for target in targets]
+    duplicated = sorted({name for name in names if names.count(name) > 1})
+    if duplicated:
+        raise ValueError(f"对比目标名称重复: {', '.join(duplicated)}")
+    if len(targets) < 2:
+        raise ValueError("对比测试至少需要两个目标")
+    return targets
+
+
+def is_compare_mode(config: dict) -> bool:
+    return bool(config.get("targets"))
+
+
+class Target:
+    """一个对比目标的配置、连接池、线程池、并发上限和统计"""
+
+    def __init__(self, index: int, spec: dict, config: dict):
+        self.index = index
+        self.name = spec["name"]
+        self.config = dict(config, **{key: value for key, value in spec.items()
+                                       if key != "name" and value not in (None, "")})
+        self.config.pop("targets", None)
+        self.limit = create_concurrency_limit(self.config)
+        self.limiter = create_rate_limiter(self.config)
+        self.retry = create_retry_policy(self.config)
+        self.session = create_session(dict(self.config, concurrency=self.limit.maximum))
+        self.executor = ThreadPoolExecutor(max_workers=self.limit.maximum,
+                                           thread_name_prefix=f"compare-{index}")
+        self.stats = RunStats(interval=0)
+        self.results = []
+        self.backlog = deque()
+        self.in_flight = 0
+        self.last_result = None
+        self.recorder = None
+
+    def summary(self, similarities: list) -> dict:
+        snapshot = self.stats.snapshot()
+        # 吞吐量按该目标自己完成最后一个问题的时刻计算，不计等待其他目标的时间
+        elapsed = (self.last_result or time.time()) - self.stats.start_time
+        if elapsed > 0:
+            snapshot.update(
+                elapsed=round(elapsed, 2),
+                throughput=round(self.stats.completed / elapsed, 3),
+                output_tokens_per_sec=round(self.stats.output_tokens / elapsed, 2),
+            )
+        scored = [value for value in similarities if value is not None]
+        return dict(
+            snapshot,
+            name=self.name,
+            api_url=self.config.get("api_url"),
+            model_name=self.config.get("model_name"),
+            concurrency=self.limit.limit,
+            total=len(self.results),
+            success_count=sum(1 for result in self.results if result and result["success"]),
+            cached_count=sum(1 for result in self.results if result and result.get("cached")),
+            similarity_avg=round(sum(scored) / len(scored), 4) if scored else None,
+        )
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.session.close()
+        if self.retry is not None:
+            self.retry.close()
+
+
+def execute_compare(rows, targets: list, config: dict, questions: list, references: list,
+                    total: int = None, cache=None):
+    """把每个问题分发给所有目标，按完成顺序产出事件
+
+    每个目标的在途请求不超过自己的并发上限，其余问题在该目标的 backlog 中排队；
+    尚未被所有目标回答完的问题达到 window 个时暂停读取新问题，
+    window 默认为最大并发数的两倍（compare_window 可配置）。
+    """
+    stream = is_stream_mode(config)
+    score = supports_incremental(config)
+    window = int(config.get("compare_window") or 2 * max(target.limit.maximum for target in targets))
+    events = queue.Queue()
+    remaining = {}
+
+    def ask(target, i, question, reference):
+        def on_token(content):
+            events.put({"type": "token", "index": i, "target": target.name, "content": content})
+        result = None
+        try:
+            result = ask_model(question, target.config, target.session, on_token if stream else None,
+                               cache, target.limiter, target.retry)
+            if target.limiter is not None:
+                target.limiter.record(result)
+            if score:
+                result["similarity"] = score_one(result["answer"], reference, config)
+        except Exception as e:
+            logger.error(f"[{target.name}] 问题 {i} 执行异常: {e}", exc_info=True)
+            if result is None:
+                result = build_result(False, "", str(e), 0, 0)
+        finally:
+            # 无论成败都放入完成结果，否则 wait_one 会一直等待
+            events.put((target.index, i,
+                        result if result is not None else build_result(False, "", "请求已中断", 0, 0)))
+
+    def dispatch(target):
+        while target.backlog and target.in_flight < target.limit.limit:
+            target.executor.submit(ask, target, *target.backlog.popleft())
+            target.in_flight += 1
+
+    def wait_one():
+        """转发 token 事件，直到有一个目标完成一个问题"""
+        while True:
+            item = events.get()
+            if isinstance(item, dict):
+                yield item
+                continue
+            index, i, result = item
+            target = targets[index]
+            target.in_flight -= 1
+            target.limit.on_result(result)
+            target.results[i - 1] = result
+            # 缓存命中的回答不是该目标本次的真实响应，不计入延迟和吞吐量
+            if not result.get("cached"):
+                target.stats.add(result)
+                target.last_result = time.time()
+            if target.recorder is not None:
+                target.recorder.add(i, questions[i - 1], result)
+            dispatch(target)
+            yield {"type": "answer", "index": i, "target": target.name, **result}
+            remaining[i] -= 1
+            if not remaining[i]:
+                del remaining[i]
+                yield {"type": "row", "index": i}
+            return
+
+    for i, question, reference in rows:
+        questions.append(question)
+        references.append(reference)
+        for target in targets:
+            target.results.append(None)
+        if is_blank_question(question):
+            for target in targets:
+                target.results[i - 1] = build_result(False, "", "问题为空", 0, 0, similarity=0.0)
+            yield {"type": "skip", "index": i, "total": total}
+            continue
+
+        yield {"type": "question", "index": i, "total": total, "question": question}
+        remaining[i] = len(targets)
+        for target in targets:
+            target.backlog.append((i, question, reference))
+            dispatch(target)
+        while len(remaining) >= window:
+            yield from wait_one()
+
+    while remaining:
+        yield from wait_one()
+
+
+def run_compare_stream(config: dict):
+    """执行对比测试并实时流式输出进度，事件与 run_test_stream 相同，另有：
+    answer 事件带 target 字段；某个问题被所有目标回答完后产出 row 事件；
+    stats 和 complete 事件的 targets 字段为各目标的统计。
+    """
+    targets = []
+    try:
+        specs = parse_targets(config["targets"])
+        rows, total = open_run_questions(config)
+        rows = peek_rows(rows)
+        if rows is None:
+            yield {"type": "error", "message": "未找到有效的测试问题"}
+            return
+
+        config["run_id"] = config.get("run_id") or new_run_id()
+        if config.get("runner") == "async":
+            logger.info("对比模式使用线程运行器")
+        logger.info(f"开始对比测试 {config['run_id']}，{len(specs)} 个目标: "
+                    f"{', '.join(spec['name'] for spec in specs)}，预计 {total if total is not None else '未知'} 个问题")
+        targets = [Target(index, spec, config) for index, spec in enumerate(specs)]
+        yield {"type": "start", "total": total, "run_id": config["run_id"], "resumed": 0,
+               "targets": [target.name for target in targets]}
+
+        cache = open_response_cache(config)
+        interval = create_run_stats(config).interval
+        started = last_emit = time.time()
+        recorder = open_run_recorder(config, kind="compare")
+        for target in targets:
+            target.recorder = open_run_recorder(dict(target.config, run_id=f"{config['run_id']}_{target.index + 1}"),
+                                                parent_id=config["run_id"])
+        questions, references = [], []
+        try:
+            for event in execute_compare(rows, targets, config, questions, references, total, cache):
+                yield event
+                if event["type"] == "answer" and interval and time.time() - last_emit >= interval:
+                    last_emit = time.time()
+                    yield {"type": "stats", "targets": [dict(target.stats.snapshot(), name=target.name)
+                                                        for target in targets]}
+
+            if supports_incremental(config):
+                similarities = [[result.get("similarity") for result in target.results] for target in targets]
+            else:
+                similarities = [calculate_similarity([result["answer"] for result in target.results],
+                                                     references, config) for target in targets]
+                for target, scores in zip(targets, similarities):
+                    for result, value in zip(target.results, scores):
+                        result["similarity"] = value
+
+            summaries = [target.summary(scores) for target, scores in zip(targets, similarities)]
+            report_path = write_comparison_report(questions, references, targets, summaries,
+                                                  is_stream_mode(config))
+            elapsed = round(time.time() - started, 2)
+            complete = {"type": "complete", "total": len(questions), "report_path": report_path,
+                        "elapsed": elapsed, "targets": summaries,
+                        "success_count": min(summary["success_count"] for summary in summaries)}
+            if cache is not None:
+                complete.update(cache.stats())
+            for target, summary in zip(targets, summaries):
+                logger.info(f"[{target.name}] 成功 {summary['success_count']}/{summary['total']}，"
+                            f"延迟 p50={summary['latency_p50']}s p95={summary['latency_p95']}s，"
+                            f"平均相似度 {summary['similarity_avg']}")
+                if target.recorder is not None:
+                    target.recorder.finish(dict(summary, report_path=report_path))
+            if recorder is not None:
+                recorder.finish(complete, metrics={"total": len(questions), "duration": elapsed})
+            logger.info(f"对比测试完成，用时 {elapsed}s，报告: {report_path}")
+            yield dict(complete, run_id=config["run_id"])
+        finally:
+            for target in targets:
+                if target.recorder is not None:
+                    target.recorder.close()
+            if recorder is not None:
+                recorder.close()
+            if cache is not None:
+                cache.close()
+    except Exception as e:
+        logger.error(f"对比测试执行失败: {e}", exc_info=True)
+        yield {"type": "error", "message": str(e)}
+    finally:
+        for target in targets:
+            target.close()
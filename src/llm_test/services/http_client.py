@@ -0,0 +1,96 @@
+"""带连接池的HTTP客户端，供问答测试在整个运行期间复用连接"""
+import threading
+import time
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .retry import hedge_connections, is_hedge_enabled
+
+logger = logging.getLogger(__name__)
+
+# 记录当前线程内新建连接（含TLS握手）的耗时，由 ask_model 在每次请求前后读取
+_local = threading.local()
+
+
+def reset_connect_time():
+    """清零当前线程的建连耗时"""
+    _local.connect_time = 0.0
+
+
+def get_connect_time() -> float:
+    """返回当前线程自上次清零以来新建连接的总耗时（秒）"""
+    return getattr(_local, "connect_time", 0.0)
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _local.connect_time = get_connect_time() + time.perf_counter() - start
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            super().connect()
+        finally:
+            _local.connect_time = get_connect_time() + time.perf_counter() - start
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """记录建连耗时的连接池适配器"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+def create_session(config: dict) -> requests.Session:
+    """按配置创建连接池会话
+
+    pool_connections: 缓存的主机连接池数量
+    pool_maxsize: 每个主机的最大连接数，默认不小于并发数，开启对冲时为并发数的 2 倍
+    keep_alive: 为 False 时每次请求后关闭连接
+
+    开启对冲时连接池不阻塞：被放弃的落败请求在返回前仍占用连接，
+    超出 pool_maxsize 的请求临时新建连接，用完即关闭，不等待空闲连接。
+    """
+    concurrency = max(1, int(config.get("concurrency", 1) or 1))
+    pool_connections = int(config.get("pool_connections", 10))
+    pool_maxsize = int(config.get("pool_maxsize", max(10, hedge_connections(config, concurrency))))
+    pool_block = not is_hedge_enabled(config)
+    keep_alive = config.get("keep_alive", True)
+    if isinstance(keep_alive, str):
+        keep_alive = keep_alive.lower() not in ("0", "false", "off", "no")
+
+    adapter = TimedHTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        pool_block=pool_block
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    if not keep_alive:
+        session.headers["Connection"] = "close"
+
+    logger.info(f"HTTP连接池已创建: pool_connections={pool_connections}, pool_maxsize={pool_maxsize}, pool_block={pool_block}, keep_alive={keep_alive}")
+    return session
@@ -0,0 +1,314 @@
+"""后台任务：事件环形缓冲、任务登记和问答测试的调度器
+
+所有后台任务（问答测试、压测、容量搜索）都继承 BackgroundJob：任务线程通过 publish
+发布事件，每个事件带递增的序号 seq；最近的 event_buffer 个事件保留在内存中，SSE
+客户端可以随时接入、断开，并以 Last-Event-ID（即上次收到的 seq）从中断处重放。
+重放的起点早于缓冲区时先收到一个 gap 事件，说明有多少事件已被丢弃。流式回答的 token
+增量数量远多于其他事件，只通过 publish_live 推送给当时在线的订阅者，不进入缓冲区，
+也不占用序号，避免把问题、回答和进度事件挤出重放范围。
+
+问答测试以 QAJob 提交给 JobScheduler：最多 qa_job_workers 个任务同时运行，其余在
+队列中等待（超过 qa_job_queue 个时拒绝提交）。任务在后台线程中运行，与发起它的 HTTP
+请求无关，浏览器关闭后运行继续；cancel 可以取消排队中或运行中的任务。
+
+已结束的任务在内存中保留 JOB_RETENTION 秒（默认 1 小时），最多保留 MAX_FINISHED_JOBS 个
+（默认 100），超出时在登记新任务或列出任务时移除结束最早的。运行记录保存在 SQLite 中，
+移除后仍可在运行记录页面查看。
+"""
+import os
+import threading
+import time
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .checkpoint import new_run_id
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EVENT_BUFFER = 10000
+# 只推送给在线订阅者的事件最多暂存的数量，处理不过来的订阅者会漏掉较早的
+LIVE_EVENT_BUFFER = 1000
+DEFAULT_QA_WORKERS = int(os.environ.get("QA_JOB_WORKERS", 2))
+DEFAULT_QA_QUEUE = int(os.environ.get("QA_JOB_QUEUE", 20))
+JOB_RETENTION = float(os.environ.get("JOB_RETENTION", 3600))
+MAX_FINISHED_JOBS = int(os.environ.get("MAX_FINISHED_JOBS", 100))
+FINISHED_STATUSES = ('completed', 'stopped', 'failed')
+
+
+class QueueFullError(RuntimeError):
+    """等待中的任务已达上限"""
+
+
+class BackgroundJob:
+    """后台任务的公共部分：事件保存在环形缓冲中供 SSE 订阅者按序号读取"""
+
+    def __init__(self, config: dict, job_id: str = None, parent_id: str = None,
+                 event_buffer: int = DEFAULT_EVENT_BUFFER):
+        self.id = job_id or new_run_id()
+        self.config = config
+        # 作为容量搜索等任务的一部分运行时为上级任务的ID
+        self.parent_id = parent_id
+        self.status = 'pending'
+        self.result = None
+        self.created = time.time()
+        self.started = None
+        self.ended = None
+        self.stop_requested = False
+        self.event_buffer = event_buffer
+        # events[0] 的序号为 first_seq；超出缓冲区两倍时一次性丢弃较早的一半，摊还为 O(1)
+        self.events = []
+        self.first_seq = 1
+        # (发布时的 last_seq, 事件)，live_count 为累计发布的数量
+        self.live_events = deque(maxlen=LIVE_EVENT_BUFFER)
+        self.live_count = 0
+        self.condition = threading.Condition()
+        self.thread = None
+
+    @property
+    def last_seq(self) -> int:
+        return self.first_seq + len(self.events) - 1
+
+    def publish(self, event: dict, status: str = None):
+        """追加事件并唤醒订阅者，status 给出时同时更新任务状态（两者对订阅者原子可见）"""
+        with self.condition:
+            self.events.append(dict(event, job_id=self.id, seq=self.last_seq + 1))
+            if len(self.events) > 2 * self.event_buffer:
+                dropped = len(self.events) - self.event_buffer
+                del self.events[:dropped]
+                self.first_seq += dropped
+            if status:
+                self.status = status
+                if self.ended is None and self.finished:
+                    self.ended = time.time()
+            self.condition.notify_all()
+
+    def publish_live(self, event: dict):
+        """把事件推送给在线的订阅者，不保存到缓冲区，断线重连后不会重放"""
+        with self.condition:
+            self.live_events.append((self.last_seq, dict(event, job_id=self.id)))
+            self.live_count += 1
+            self.condition.notify_all()
+
+    def iter_events(self, start: int = 0, keepalive: float = 15.0):
+        """依次产出序号大于 start 的事件，任务结束后停止；长时间无事件时产出 None 作为心跳
+
+        订阅之后发布的 live 事件按发布时的位置穿插在缓冲事件之间产出。
+        """
+        position = start
+        with self.condition:
+            live_position = self.live_count
+        while True:
+            with self.condition:
+                if position >= self.last_seq and live_position >= self.live_count and not self.finished:
+                    self.condition.wait(timeout=keepalive)
+                if position + 1 < self.first_seq:
+                    missed = self.first_seq - position - 1
+                    position = self.first_seq - 1
+                else:
+                    missed = 0
+                pending = self.events[position + 1 - self.first_seq:]
+                new_live = min(self.live_count - live_position, len(self.live_events))
+                live = list(self.live_events)[len(self.live_events) - new_live:] if new_live else []
+                live_position = self.live_count
+                finished = self.finished
+            if missed:
+                yield {"type": "gap", "missed": missed, "job_id": self.id}
+            if not pending and not live and not finished:
+                yield None
+            live_index = 0
+            for event in pending:
+                while live_index < len(live) and live[live_index][0] < event["seq"]:
+                    yield live[live_index][1]
+                    live_index += 1
+                yield event
+            for _, event in live[live_index:]:
+                yield event
+            position += len(pending)
+            if finished and position >= self.last_seq:
+                return
+
+    def retained_events(self, event_type: str = None) -> list:
+        with self.condition:
+            return [event for event in self.events if event_type is None or event["type"] == event_type]
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def wait(self, timeout: float = None):
+        if self.thread is not None:
+            self.thread.join(timeout)
+        return self.result
+
+    def info(self) -> dict:
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'config': self.config,
+            'created': self.created,
+            'started': self.started,
+            'ended': self.ended,
+            'result': self.result,
+            'last_seq': self.last_seq,
+        }
+
+    kind = 'job'
+
+
+class QAJob(BackgroundJob):
+    """在调度器线程中运行的问答测试（单目标、异步运行器或多目标对比）"""
+
+    kind = 'qa'
+
+    def __init__(self, config: dict):
+        super().__init__(config)
+        config["run_id"] = config.get("resume_run_id") or config.get("run_id") or self.id
+        self.done = threading.Event()
+        self.future = None
+
+    def events_source(self):
+        if str(self.config.get("targets") or "").strip():
+            from .compare_service import run_compare_stream
+            return run_compare_stream(self.config)
+        if self.config.get("runner") == "async":
+            from .async_qa_service import arun_test_stream, iterate_sync
+            return iterate_sync(arun_test_stream(self.config))
+        from .qa_service import run_test_stream
+        return run_test_stream(self.config)
+
+    def run(self):
+        if self.stop_requested:
+            # 取消请求在任务离开队列的同时到达
+            self._cancelled('任务在排队时被取消')
+            return
+        self.started = time.time()
+        self.status = 'running'
+        events = None
+        try:
+            events = self.events_source()
+            for event in events:
+                if event["type"] == "complete":
+                    self.result = dict(event, status='success')
+                    self.publish(event, status='completed')
+                elif event["type"] == "error":
+                    self.result = {'status': 'error', 'message': event["message"]}
+                    self.publish(event, status='failed')
+                elif event["type"] == "token":
+                    self.publish_live(event)
+                else:
+                    self.publish(event)
+                if self.stop_requested:
+                    break
+        except Exception as e:
+            logger.error(f"问答任务 {self.id} 执行失败: {e}", exc_info=True)
+            self.result = {'status': 'error', 'message': str(e)}
+            self.publish({'type': 'error', 'message': str(e)}, status='failed')
+        finally:
+            # 关闭生成器时运行函数在 finally 中等待在途请求结束并保存已有结果
+            if events is not None:
+                events.close()
+            if not self.finished:
+                self._cancelled('任务已取消')
+            self.done.set()
+
+    def _cancelled(self, message: str):
+        self.result = {'status': 'error', 'message': message}
+        self.publish({'type': 'cancelled', 'message': message}, status='stopped')
+        self.done.set()
+
+    def stop(self) -> bool:
+        """取消任务：排队中的直接结束，运行中的在下一个事件后停止"""
+        if self.finished:
+            return False
+        self.stop_requested = True
+        logger.info(f"取消问答任务 {self.id}")
+        if self.future is not None and self.future.cancel():
+            self._cancelled('任务在排队时被取消')
+        return True
+
+    def wait(self, timeout: float = None):
+        self.done.wait(timeout)
+        return self.result
+
+
+class JobScheduler:
+    """有界的问答任务调度器：固定数量的工作线程和有上限的等待队列"""
+
+    def __init__(self, workers: int = DEFAULT_QA_WORKERS, max_queue: int = DEFAULT_QA_QUEUE):
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="qa-job")
+        self.lock = threading.Lock()
+        self.queued = 0
+
+    def submit(self, job: QAJob) -> QAJob:
+        with self.lock:
+            if self.max_queue and self.queued >= self.max_queue:
+                raise QueueFullError(f"等待中的任务已达上限 {self.max_queue}，请稍后再试")
+            self.queued += 1
+        job.status = 'queued'
+        job.publish({'type': 'queued', 'position': self.queued})
+        job.future = self.executor.submit(self._run, job)
+        job.future.add_done_callback(lambda future: self._dequeue() if future.cancelled() else None)
+        logger.info(f"问答任务 {job.id} 已提交，等待中 {self.queued} 个")
+        return job
+
+    def _dequeue(self):
+        with self.lock:
+            self.queued -= 1
+
+    def _run(self, job: QAJob):
+        self._dequeue()
+        job.run()
+
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+_scheduler = None
+
+
+def _evict_finished(now: float = None):
+    """移除超过保留时间或超出数量上限的已结束任务，调用方持有 _jobs_lock"""
+    now = now or time.time()
+    finished = sorted((job for job in _jobs.values() if job.finished and job.ended is not None),
+                      key=lambda job: job.ended)
+    excess = len(finished) - MAX_FINISHED_JOBS
+    for index, job in enumerate(finished):
+        if index < excess or now - job.ended > JOB_RETENTION:
+            del _jobs[job.id]
+
+
+def register_job(job: BackgroundJob) -> BackgroundJob:
+    """登记已启动的后台任务，之后可按ID查询、订阅事件和停止"""
+    with _jobs_lock:
+        _evict_finished()
+        _jobs[job.id] = job
+    return job
+
+
+def get_job(job_id: str):
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def list_jobs(kind: str = None) -> list:
+    with _jobs_lock:
+        _evict_finished()
+        return [job.info() for job in _jobs.values() if kind is None or job.kind == kind]
+
+
+def get_scheduler() -> JobScheduler:
+    global _scheduler
+    with _jobs_lock:
+        if _scheduler is None:
+            _scheduler = JobScheduler()
+        return _scheduler
+
+
+def submit_qa_job(config: dict) -> QAJob:
+    """创建问答任务并提交给调度器，立即返回（任务可能仍在排队）"""
+    job = QAJob(config)
+    get_scheduler().submit(job)
+    return register_job(job)
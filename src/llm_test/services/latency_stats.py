@@ -0,0 +1,128 @@
+"""运行中的延迟分位数与吞吐统计
+
+LatencyHistogram 按对数分桶（HDR 风格）累计延迟，每个桶的宽度为其下界的 precision 倍，
+分位数的相对误差不超过 precision / 2，内存只与延迟的取值范围有关、与样本数无关，
+因此可以在每个回答到达时更新，并随时取出 p50/p90/p95/p99。
+"""
+import math
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRECISION = 0.01
+# 低于该值（秒）的延迟都记入第一个桶
+MIN_LATENCY = 1e-4
+DEFAULT_STATS_INTERVAL = 2.0
+QUANTILES = (("p50", 0.5), ("p90", 0.9), ("p95", 0.95), ("p99", 0.99))
+
+
+class LatencyHistogram:
+    """对数分桶的流式延迟直方图"""
+
+    def __init__(self, precision: float = DEFAULT_PRECISION, min_value: float = MIN_LATENCY):
+        self.precision = precision
+        self.min_value = min_value
+        self.log_base = math.log1p(precision)
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float):
+        index = int(math.log(max(value, self.min_value) / self.min_value) / self.log_base)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float):
+        """按最近秩取分位数，返回所在桶的几何中点（不超过最大值），没有样本时返回 None"""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(self.max, self.min_value * math.exp((index + 0.5) * self.log_base))
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def summary(self, prefix: str) -> dict:
+        stats = {f"{prefix}_{name}": _round(self.quantile(q)) for name, q in QUANTILES}
+        stats[f"{prefix}_max"] = _round(self.max) if self.count else None
+        return stats
+
+
+def _round(value, digits: int = 3):
+    return round(value, digits) if value is not None else None
+
+
+class RunStats:
+    """一次运行的延迟分布、吞吐量（问题/秒）和输出速率（Token/秒）
+
+    只统计本次运行实际请求得到的回答，续跑回放和缓存命中的回答不计入。
+    延迟分布只包含成功的回答，吞吐量按所有完成的请求计算。
+    """
+
+    def __init__(self, interval: float = DEFAULT_STATS_INTERVAL):
+        self.latency = LatencyHistogram()
+        self.ttft = LatencyHistogram()
+        self.interval = interval
+        self.start_time = time.time()
+        self.last_emit = self.start_time
+        self.completed = 0
+        self.output_tokens = 0
+
+    def add(self, result: dict):
+        self.completed += 1
+        if not result.get("success"):
+            return
+        self.latency.add(result["latency"])
+        if result.get("ttft") is not None:
+            self.ttft.add(result["ttft"])
+        self.output_tokens += result.get("output_tokens") or 0
+
+    def observe(self, event: dict):
+        """处理一个运行事件，距上次统计超过 interval 秒时返回 stats 事件，否则返回 None"""
+        if event["type"] != "answer" or event.get("resumed") or event.get("cached"):
+            return None
+        self.add(event)
+        now = time.time()
+        if self.interval and now - self.last_emit >= self.interval:
+            self.last_emit = now
+            return dict(self.snapshot(), type="stats")
+        return None
+
+    def snapshot(self) -> dict:
+        elapsed = time.time() - self.start_time
+        stats = {"measured": self.completed, "elapsed": round(elapsed, 2)}
+        stats.update(self.latency.summary("latency"))
+        if self.ttft.count:
+            stats.update(self.ttft.summary("ttft"))
+        stats["throughput"] = round(self.completed / elapsed, 3) if elapsed > 0 else 0.0
+        stats["output_tokens_per_sec"] = round(self.output_tokens / elapsed, 2) if elapsed > 0 else 0.0
+        return stats
+
+    def summary_rows(self, stats: dict = None) -> list:
+        """汇总页的行，stats 为已取得的 snapshot（保证与 complete 事件一致）"""
+        stats = stats or self.snapshot()
+        rows = [(f"延迟{name.upper()}(秒)", stats[f"latency_{name}"]) for name, _ in QUANTILES]
+        rows.append(("最大延迟(秒)", stats["latency_max"]))
+        if self.ttft.count:
+            rows.extend((f"首Token延迟{name.upper()}(秒)", stats[f"ttft_{name}"]) for name, _ in QUANTILES)
+        rows.extend([
+            ("吞吐量(问题/秒)", stats["throughput"]),
+            ("输出速率(Token/秒)", stats["output_tokens_per_sec"]),
+        ])
+        return rows
+
+
+def create_run_stats(config: dict) -> RunStats:
+    """stats_interval 为周期性 stats 事件的间隔（秒），0 表示只在结束时统计"""
+    interval = config.get("stats_interval", DEFAULT_STATS_INTERVAL)
+    return RunStats(float(interval) if interval not in (None, "") else DEFAULT_STATS_INTERVAL)
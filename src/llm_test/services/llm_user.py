@@ -0,0 +1,161 @@
+"""面向 LLM 推理服务的 Locust 用户
+
+LLMUser 以流式方式请求 chat/completions，除了整个请求的响应时间外，
+还以 Locust 自定义请求事件（Type 为 LLM）上报每个请求的：
+- TTFT: 首Token延迟（毫秒）
+- ITL: 平均Token间延迟（毫秒）
+- Tokens/s: 首Token之后的输出速率（该行的“响应时间”列即为 Token/秒）
+
+这些指标与普通请求一样出现在 Locust 的 CSV、HTML 报告和分布式汇总中。
+ITL 按请求取平均值而不是逐个Token上报，避免压测机在事件处理上耗费CPU。
+
+使用时继承 LLMUser，设置 host、wait_time、workload（Workload 实例）和任务权重：
+
+    class MyUser(LLMUser):
+        host = "http://localhost:1234"
+        wait_time = between(1, 2)
+        workload = Workload(build_workload(config))
+        tasks = {LLMUser.chat_completion: 3, LLMUser.get_models: 1}
+
+开环模式（workload 的 spec 含 arrival）下任务改为 tasks = [LLMUser.open_loop]：每个用户
+按计划的到达时刻在独立的 greenlet 中发出请求而不等待前一个返回，响应时间和 TTFT 从计划
+发送时刻算起，因此发送端来不及发出或排队造成的延迟也会计入。在途请求超过上限而未发出的
+请求以 DROPPED 类型上报为失败，计入失败率但不计入响应时间。
+"""
+import time
+
+try:
+    import gevent
+    from gevent.pool import Group
+    from locust import HttpUser
+except ImportError as e:
+    raise ImportError("LLM 压测用户需要 locust，请运行: pip install locust") from e
+
+from .stream_metrics import StreamCollector, LOCUST_DROPPED_TYPE, LOCUST_METRIC_TYPE, LOCUST_METRICS
+from .workload import Workload, schedule_rate
+
+CHAT_PATH = "/v1/chat/completions"
+MODELS_PATH = "/v1/models"
+
+
+class LLMUser(HttpUser):
+    abstract = True
+    # 为 False 时发送非流式请求，只能按 usage 统计 Tokens/s
+    stream = True
+    workload = Workload({})
+
+    def fire_metric(self, key: str, value: float, length: int = 0):
+        self.environment.events.request.fire(
+            request_type=LOCUST_METRIC_TYPE,
+            name=LOCUST_METRICS[key],
+            response_time=value,
+            response_length=length,
+            exception=None,
+            context={},
+        )
+
+    def get_models(self, scheduled: float = None):
+        with self.client.get(MODELS_PATH, catch_response=True, name=f"GET {MODELS_PATH}") as response:
+            if scheduled is not None:
+                response.request_meta["response_time"] = (time.time() - scheduled) * 1000
+            if response.status_code != 200:
+                response.failure(f"HTTP {response.status_code}")
+                return
+            try:
+                if "data" not in response.json():
+                    response.failure("响应格式错误：缺少data字段")
+            except ValueError:
+                response.failure("响应不是有效的JSON")
+
+    def chat_completion(self, scheduled: float = None):
+        """scheduled 为开环模式下计划的发送时刻，延迟指标从该时刻算起"""
+        payload = self.workload.payload(stream=self.stream)
+        start_time = scheduled if scheduled is not None else time.time()
+        with self.client.post(CHAT_PATH, json=payload, stream=self.stream, catch_response=True,
+                              name=f"POST {CHAT_PATH}") as response:
+            if response.status_code != 200:
+                response.failure(f"HTTP {response.status_code}")
+                return
+            try:
+                metrics = self._read_stream(response, start_time) if self.stream else \
+                    self._read_body(response, start_time)
+            except Exception as e:
+                response.failure(f"读取响应失败: {e}")
+                return
+            if metrics is None:
+                response.failure("响应中没有生成任何内容")
+                return
+            # 流式请求的响应时间默认只计到收到响应头，改为读完整个流的时间
+            response.request_meta["response_time"] = metrics["total_time"] * 1000
+            response.request_meta["response_length"] = metrics["output_tokens"]
+            response.success()
+
+        if self.stream:
+            self.fire_metric("ttft", metrics["ttft"] * 1000)
+            if metrics["output_tokens"] > 1:
+                self.fire_metric("itl", metrics["itl"] * 1000)
+        if metrics["tokens_per_sec"]:
+            self.fire_metric("tokens_per_sec", metrics["tokens_per_sec"], metrics["output_tokens"])
+
+    def open_loop(self):
+        """开环调度：按到达率计划发送时刻，不等待响应；在途请求超过上限时记为失败"""
+        arrival = self.workload.spec["arrival"]
+        share = 1.0 / arrival["users"]
+        limit = max(1, int(arrival["max_in_flight"] * share))
+        rng = self.workload.rng
+        group = Group()
+        start = time.time()
+        scheduled = start
+        try:
+            while True:
+                rate = schedule_rate(arrival["schedule"], scheduled - start) * share
+                if rate <= 0:
+                    scheduled += 0.1
+                    gevent.sleep(max(0.0, scheduled - time.time()))
+                    continue
+                scheduled += rng.expovariate(rate) if arrival["process"] == "poisson" else 1.0 / rate
+                delay = scheduled - time.time()
+                if delay > 0:
+                    gevent.sleep(delay)
+                name = self.workload.next_task()
+                if len(group) >= limit:
+                    self._fire_dropped(name)
+                    continue
+                group.spawn(self.chat_completion if name == "chat" else self.get_models, scheduled)
+        finally:
+            group.kill(block=False)
+
+    def _fire_dropped(self, name: str):
+        """未发出的请求以单独的类型上报为失败，响应时间 0 不会拉低真实请求的延迟分位数"""
+        method, path = ("POST", CHAT_PATH) if name == "chat" else ("GET", MODELS_PATH)
+        self.environment.events.request.fire(
+            request_type=LOCUST_DROPPED_TYPE,
+            name=f"{method} {path}",
+            response_time=0,
+            response_length=0,
+            exception=RuntimeError("在途请求超过上限，未发出"),
+            context={},
+        )
+
+    def _read_stream(self, response, start_time: float):
+        collector = StreamCollector(start_time)
+        # chunk_size=None 按数据到达的块读取，不等待凑满固定大小的缓冲，避免多个增量被合并
+        for line in response.iter_lines(chunk_size=None):
+            if line:
+                collector.feed(line)
+        if not collector.token_count:
+            return None
+        _, metrics = collector.finish()
+        return metrics
+
+    def _read_body(self, response, start_time: float):
+        data = response.json()
+        if not data.get("choices"):
+            return None
+        total_time = time.time() - start_time
+        output_tokens = (data.get("usage") or {}).get("completion_tokens") or 0
+        return {
+            "total_time": total_time,
+            "output_tokens": output_tokens,
+            "tokens_per_sec": round(output_tokens / total_time, 2) if total_time > 0 else 0.0,
+        }
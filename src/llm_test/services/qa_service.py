@@ -1,258 +1,439 @@
 import requests
 import time
-from datetime import datetime
-import os
-import pandas as pd
-from difflib import SequenceMatcher
-from openpyxl import load_workbook
-from openpyxl.styles import Alignment
+import queue
+import itertools
+from concurrent.futures import ThreadPoolExecutor
 import logging
+from .http_client import create_session, reset_connect_time, get_connect_time
+from .stream_metrics import StreamCollector, strip_think
+from .similarity import is_missing, score_with_config, score_one, supports_incremental
+from .question_loader import iter_questions, iter_file, iter_text, estimate_total
+from .report_writer import ReportWriter, write_back_questions
+from .checkpoint import CheckpointStore, open_checkpoint
+from .response_cache import ResponseCache, open_response_cache
+from .throttle import RateLimiter, create_rate_limiter, create_concurrency_limit
+from .retry import RetryPolicy, create_retry_policy, is_retry_enabled
+from .latency_stats import RunStats, create_run_stats
+from .run_store import RunRecorder, open_run_recorder
 
 logger = logging.getLogger(__name__)
 
 def load_questions(file_path: str = None, text_input: str = None) -> tuple:
-    """从Excel文件或文本输入加载测试问题和答案"""
+    """从问题文件或文本输入一次性加载测试问题和答案（运行测试时改用 open_run_questions 逐行读取）"""
     try:
-        if text_input:
-            # 从文本输入加载问题
-            questions = [q.strip() for q in text_input.strip().split('\n') if q.strip()]
-            answers = [None] * len(questions)
-            logger.info(f"从文本输入加载问题成功，共 {len(questions)} 个问题")
-            return questions, answers
-        elif file_path:
-            # 从Excel文件加载问题
-            df = pd.read_excel(file_path)
-            questions = df['问题'].tolist()
-            answers = df['答案'].tolist() if '答案' in df.columns else [None] * len(questions)
-            logger.info(f"加载问题文件成功: {file_path}, 共 {len(questions)} 个问题")
-            return questions, answers
-        else:
-            logger.error("未提供问题来源")
-            return [], []
+        questions, answers = [], []
+        for _, question, answer in iter_questions(file_path=file_path, text_input=text_input):
+            questions.append(question)
+            answers.append(answer)
+        logger.info(f"加载问题成功: {file_path or '文本输入'}, 共 {len(questions)} 个问题")
+        return questions, answers
     except Exception as e:
         logger.error(f"加载问题失败: {e}", exc_info=True)
         return [], []
 
-def ask_model(question: str, config: dict) -> dict:
-    """调用本地模型 API"""
+def extract_answer(data: dict) -> str:
+    """从 chat/completions 响应中取出回答，去掉 <think> 推理部分"""
+    return strip_think(data["choices"][0]["message"]["content"])
+
+def build_payload(question: str, config: dict) -> dict:
+    """构造 chat/completions 请求体，config["stream"] 为真时启用流式输出"""
     payload = {
         "model": config["model_name"],
         "messages": [{"role": "user", "content": question}],
         "temperature": config["temperature"],
         "max_tokens": config["max_tokens"]
     }
+    if is_stream_mode(config):
+        payload["stream"] = True
+    return payload
+
+def is_stream_mode(config: dict) -> bool:
+    stream = config.get("stream", False)
+    if isinstance(stream, str):
+        return stream.lower() in ("1", "true", "on", "yes")
+    return bool(stream)
+
+def build_result(success: bool, answer: str, error: str, latency: float, connect_time: float, **metrics) -> dict:
+    """构造 ask_model 的返回结构，metrics 为流式模式等附加的指标"""
+    result = {
+        "success": success,
+        "answer": answer,
+        "error": error,
+        "latency": round(latency, 2),
+        "connect_time": round(connect_time, 3)
+    }
+    result.update(metrics)
+    return result
+
+def usage_metrics(data: dict, latency: float) -> dict:
+    """非流式响应中根据 usage 统计输出Token数和速率"""
+    output_tokens = (data.get("usage") or {}).get("completion_tokens")
+    if not output_tokens:
+        return {}
+    return {
+        "output_tokens": output_tokens,
+        "tokens_per_sec": round(output_tokens / latency, 2) if latency > 0 else 0.0
+    }
+
+def send_request(payload: dict, config: dict, session: requests.Session = None, on_token=None) -> dict:
+    """发送一次 chat/completions 请求
     
+    传入 session 时复用其连接池；latency 为扣除建连（含TLS握手）后的模型耗时，
+    建连耗时单独记录在 connect_time 中。流式模式下额外返回 ttft、total_time、
+    output_tokens、tokens_per_sec、itl，并在每个内容增量到达时调用 on_token。
+    HTTP 错误的结果带 status_code 字段。
+    """
+    stream = payload.get("stream", False)
+    http = session or requests
+    reset_connect_time()
     start_time = time.time()
     try:
-        response = requests.post(
+        response = http.post(
             config["api_url"],
             json=payload,
-            timeout=config["timeout"]
+            timeout=config["timeout"],
+            stream=stream
         )
-        latency = time.time() - start_time
         
         if response.status_code != 200:
+            connect_time = get_connect_time()
             error_msg = f"HTTP {response.status_code}: {response.text}"
             logger.error(f"API请求失败: {error_msg}")
-            return {
-                "success": False,
-                "answer": "",
-                "error": error_msg,
-                "latency": latency
-            }
+            return build_result(False, "", error_msg, time.time() - start_time - connect_time, connect_time,
+                                status_code=response.status_code)
         
-        data = response.json()
-        answer = data["choices"][0]["message"]["content"].strip()
-        if "<think>" in answer:
-            answer = answer.split("</think>")[-1].strip()
-        return {
-            "success": True,
-            "answer": answer,
-            "error": "",
-            "latency": round(latency, 2)
-        }
+        if stream:
+            collector = StreamCollector(start_time, on_token)
+            with response:
+                for line in response.iter_lines():
+                    collector.feed(line)
+                    if collector.done:
+                        break
+            connect_time = get_connect_time()
+            answer, metrics = collector.finish(connect_time)
+            latency = time.time() - start_time - connect_time
+        else:
+            data = response.json()
+            answer = extract_answer(data)
+            connect_time = get_connect_time()
+            latency = time.time() - start_time - connect_time
+            metrics = usage_metrics(data, latency)
+        return build_result(True, answer, "", latency, connect_time, **metrics)
         
     except Exception as e:
-        latency = time.time() - start_time
+        connect_time = get_connect_time()
         logger.error(f"API调用异常: {e}", exc_info=True)
-        return {
-            "success": False,
-            "answer": "",
-            "error": str(e),
-            "latency": round(latency, 2)
-        }
+        return build_result(False, "", str(e), time.time() - start_time - connect_time, connect_time)
 
-def calculate_similarity(model_answers: list, reference_answers: list) -> list:
-    """计算模型回答与参考答案的相似度"""
-    similarities = []
-    for model_ans, ref_ans in zip(model_answers, reference_answers):
-        if not ref_ans or pd.isna(ref_ans) or not model_ans:
-            similarities.append(0.0)
-        else:
-            similarity = SequenceMatcher(None, str(model_ans), str(ref_ans)).ratio()
-            similarities.append(round(similarity, 4))
-    return similarities
+def ask_model(question: str, config: dict, session: requests.Session = None, on_token=None,
+              cache: ResponseCache = None, limiter: RateLimiter = None, retry: RetryPolicy = None) -> dict:
+    """调用本地模型 API，返回结构见 send_request
+    
+    传入 cache 时先查询回答缓存，命中的结果带 cached 标记（指标为首次请求时的值），
+    新得到的成功回答写入缓存。传入 limiter 时未命中缓存的请求先按限流额度等待。
+    传入 retry 时按其策略重试和对冲，结果额外带 attempts、attempt_count、e2e_latency。
+    """
+    payload = build_payload(question, config)
+    if cache is not None:
+        cached = cache.get(payload, config.get("api_url"))
+        if cached is not None:
+            return dict(cached, cached=True)
+    
+    if retry is not None:
+        result = retry.run(
+            lambda: send_request(payload, config, session, on_token),
+            limiter,
+            stream=payload.get("stream", False)
+        )
+    else:
+        if limiter is not None:
+            limiter.wait()
+        result = send_request(payload, config, session, on_token)
+    
+    if cache is not None:
+        cache.put(payload, result, config.get("api_url"))
+    return result
+
+def record_result(results: list, i: int, result: dict) -> dict:
+    """将第 i 个问题（从1开始）的结果写入 results，返回 answer 事件"""
+    results[i - 1] = dict(result)
+    return {"type": "answer", "index": i, **result}
+
+def record_skip(results: list, i: int, total: int) -> dict:
+    """将第 i 个问题记为空问题，返回 skip 事件"""
+    results[i - 1] = build_result(False, "", "问题为空", 0, 0, similarity=0.0)
+    return {"type": "skip", "index": i, "total": total}
+
+def is_blank_question(question) -> bool:
+    return not question or is_missing(question) or str(question).strip() == ""
+
+def execute_questions(rows, config: dict, results: list, total: int = None, completed: dict = None,
+                      cache: ResponseCache = None):
+    """按配置的并发度执行问题，结果按序号写入 results，并按完成顺序产出事件
+    
+    rows 逐个产出 (序号, 问题, 参考答案)，只在有空闲并发槽时才读取下一行。
+    由线程池同时发送至多 concurrency 个请求（adaptive_concurrency 开启时上限随延迟和
+    429/503 响应自动调整），发送速率受 rate_limit_rps / rate_limit_tps 限制，
+    见 throttle 模块；失败请求的重试与对冲见 retry 模块。流式模式下回答过程中的增量以
+    token 事件转发。
+    相似度算法支持逐对评分时，工作线程在回答返回后立即评分，分数随 answer 事件的
+    similarity 字段发出。completed 中已有结果的序号不再提问，直接以 resumed 标记的
+    answer 事件回放。整个运行共用一个连接池会话和回答缓存 cache。
+    """
+    completed = completed or {}
+    limit = create_concurrency_limit(config)
+    limiter = create_rate_limiter(config)
+    retry = create_retry_policy(config)
+    stream = is_stream_mode(config)
+    score = supports_incremental(config)
+    # 工作线程把 token 事件（dict）和完成结果（(index, result) 元组）放入同一队列
+    events = queue.Queue()
+    in_flight = 0
+    
+    def ask(i, question, reference):
+        def on_token(content):
+            events.put({"type": "token", "index": i, "content": content})
+        result = None
+        try:
+            result = ask_model(question, config, session, on_token if stream else None, cache, limiter, retry)
+            if limiter is not None:
+                limiter.record(result)
+            if score:
+                result["similarity"] = score_one(result["answer"], reference, config)
+        except Exception as e:
+            # 评分失败时保留已拿到的回答，只有请求本身失败才记为失败
+            logger.error(f"问题 {i} 执行异常: {e}", exc_info=True)
+            if result is None:
+                result = build_result(False, "", str(e), 0, 0)
+        finally:
+            # 无论成败都放入完成结果，否则 wait_one 会一直等待
+            events.put((i, result if result is not None else build_result(False, "", "请求已中断", 0, 0)))
+    
+    def wait_one():
+        """转发 token 事件，直到有一个问题完成"""
+        nonlocal in_flight
+        while True:
+            item = events.get()
+            if isinstance(item, dict):
+                yield item
+                continue
+            in_flight -= 1
+            limit.on_result(item[1])
+            yield record_result(results, *item)
+            return
+    
+    if limit.maximum > 1:
+        logger.info(f"并发模式，并发数: {limit.limit}")
+    with create_session(dict(config, concurrency=limit.maximum)) as session, \
+            ThreadPoolExecutor(max_workers=limit.maximum, thread_name_prefix="qa-worker") as executor:
+        try:
+            for i, question, reference in rows:
+                if i in completed:
+                    yield dict(record_result(results, i, completed[i]), resumed=True)
+                    continue
+                if is_blank_question(question):
+                    yield record_skip(results, i, total)
+                    continue
+            
+                yield {"type": "question", "index": i, "total": total, "question": question}
+                executor.submit(ask, i, question, reference)
+                in_flight += 1
+            
+                # 在途请求达到上限时，先等待至少一个完成再读取下一行
+                while in_flight >= limit.limit:
+                    yield from wait_one()
+        
+            while in_flight:
+                yield from wait_one()
+        finally:
+            if retry is not None:
+                retry.close()
+    if limit.adaptive:
+        logger.info(f"自适应并发结束: 最终上限 {limit.limit}, 峰值 {limit.peak}")
+
+def calculate_similarity(model_answers: list, reference_answers: list, config: dict = None) -> list:
+    """计算模型回答与参考答案的相似度，算法由 config["similarity_metric"] 选择（默认 sequence）"""
+    return score_with_config(model_answers, reference_answers, config)
 
 def update_questions_file(file_path: str, results: list, similarities: list):
     """将答案和相似度回写到问题Excel文件（仅文件模式）"""
     if not file_path:
         logger.info("手动输入模式，跳过回写问题文件")
         return
+    if not file_path.lower().endswith((".xlsx", ".xlsm")):
+        logger.info(f"问题文件不是可回写的Excel格式，跳过回写: {file_path}")
+        return
     try:
-        df = pd.read_excel(file_path)
-        df['回答'] = [r["answer"] for r in results]
-        df['相似度'] = similarities
-        df.to_excel(file_path, index=False)
-        
-        wb = load_workbook(file_path)
-        ws = wb.active
-        answer_col = df.columns.get_loc('回答') + 1
-        for row in range(2, len(df) + 2):
-            ws.cell(row=row, column=answer_col).alignment = Alignment(horizontal='fill')
-        wb.save(file_path)
+        write_back_questions(file_path, results, similarities)
         logger.info(f"答案和相似度已回写到 {file_path}")
     except Exception as e:
         logger.error(f"回写答案失败: {e}", exc_info=True)
 
+def create_report_writer(config: dict) -> ReportWriter:
+    """按配置创建边运行边写出的报告，report_csv 为真时同时写出 CSV 旁路文件，
+    开启重试或对冲时包含每次尝试的耗时"""
+    return ReportWriter(
+        config,
+        stream=is_stream_mode(config),
+        with_similarity=supports_incremental(config),
+        csv_sidecar=str(config.get("report_csv", "")).lower() in ("1", "true", "on", "yes"),
+        with_attempts=is_retry_enabled(config)
+    )
+
+def persist_event(event: dict, questions: list, results: list, writer: ReportWriter, store: CheckpointStore = None,
+                  recorder: RunRecorder = None):
+    """把 answer/skip 事件对应的结果交给报告写出器和运行记录，并追加到断点记录（续跑回放的结果除外）"""
+    if event["type"] not in ("answer", "skip"):
+        return
+    i = event["index"]
+    writer.add(i, questions[i - 1], results[i - 1])
+    if recorder is not None:
+        recorder.add(i, questions[i - 1], results[i - 1])
+    if store is not None and not event.get("resumed"):
+        store.append(i, results[i - 1])
+
 def generate_excel_report(results: list, questions: list, config: dict):
     try:
-        total = len(results)
-        success_count = sum(1 for r in results if r["success"])
-        avg_latency = round(sum(r["latency"] for r in results) / total, 2)
-        refusal_keywords = ["不知道", "无法回答", "无权限", "不能提供", "未授权", "拒绝"]
-        
-        excel_data = []
-        for i, res in enumerate(results):
-            status = "成功" if res["success"] else "失败"
-            if res["success"] and any(kw in res["answer"] for kw in refusal_keywords):
-                status += "(拒答)"
-            excel_data.append({
-                "序号": i + 1,
-                "问题": questions[i],
-                "回答": res["answer"],
-                "延迟(秒)": res["latency"],
-                "状态": status,
-                "错误信息": res["error"] if not res["success"] else ""
-            })
-        
-        os.makedirs("reports", exist_ok=True)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        excel_path = f"reports/test_report_{timestamp}.xlsx"
-        
-        with pd.ExcelWriter(excel_path, engine='openpyxl') as writer:
-            pd.DataFrame(excel_data).to_excel(writer, sheet_name='测试结果', index=False)
-            summary_data = {
-                "项目": ["测试时间", "API地址", "模型名称", "总问题数", "成功响应", "平均延迟(秒)", "安全拒答数"],
-                "值": [
-                    datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                    config["api_url"],
-                    config["model_name"],
-                    total,
-                    f"{success_count}/{total} ({success_count/total:.0%})",
-                    avg_latency,
-                    sum(1 for r in results if r["success"] and any(kw in r["answer"] for kw in refusal_keywords))
-                ]
-            }
-            pd.DataFrame(summary_data).to_excel(writer, sheet_name='测试汇总', index=False)
-        
-        logger.info(f"测试报告已生成: {excel_path}")
-        return excel_path
+        writer = create_report_writer(config)
+        for i, res in enumerate(results, 1):
+            writer.add(i, questions[i - 1], res)
+        return writer.finish()
     except Exception as e:
         logger.error(f"生成报告失败: {e}", exc_info=True)
         raise
 
+def open_run_questions(config: dict) -> tuple:
+    """按 question_mode 打开问题来源，返回 (逐行迭代器, 估计问题数或 None)"""
+    if config.get("question_mode", "file") == "input":
+        text = config.get("questions_text", "")
+        return iter_text(text), estimate_total(text_input=text)
+    file_path = config.get("questions_file")
+    if not file_path:
+        raise ValueError("未提供问题文件")
+    return iter_file(file_path), estimate_total(file_path=file_path)
+
+def peek_rows(rows):
+    """读取第一行以判断是否有问题，返回可从头迭代的行迭代器，没有问题时返回 None"""
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return None
+    return itertools.chain([first], rows)
+
+def track_rows(rows, questions: list, reference_answers: list, results: list):
+    """逐行转发，同时记录问题和参考答案并为结果预留位置，供运行结束后生成报告"""
+    for i, question, reference in rows:
+        questions.append(question)
+        reference_answers.append(reference)
+        results.append(None)
+        yield i, question, reference
+
+def finish_run(results: list, questions: list, reference_answers: list, config: dict,
+               writer: ReportWriter = None, cache: ResponseCache = None, stats: RunStats = None) -> dict:
+    """计算相似度、回写问题文件并完成报告，返回 complete 事件
+    
+    传入运行中已逐行写入的 writer 时只需补写汇总页，否则一次性生成报告。
+    使用了回答缓存时，命中/未命中次数写入汇总页和 complete 事件；传入 stats 时
+    延迟分位数和吞吐量同样写入两处。
+    """
+    # 运行中已逐个评分时不再整批重算
+    if all("similarity" in r for r in results):
+        similarities = [r["similarity"] for r in results]
+    else:
+        similarities = calculate_similarity([r["answer"] for r in results], reference_answers, config)
+    
+    # 仅在文件模式下回写
+    if config.get("question_mode", "file") == "file":
+        update_questions_file(config.get("questions_file"), results, similarities)
+    
+    if writer is None:
+        writer = create_report_writer(config)
+        for i, res in enumerate(results, 1):
+            writer.add(i, questions[i - 1], res)
+    extra_summary = []
+    snapshot = stats.snapshot() if stats is not None else None
+    if stats is not None:
+        extra_summary.extend(stats.summary_rows(snapshot))
+    if cache is not None:
+        extra_summary.extend(cache.summary_rows())
+    excel_file = writer.finish(extra_summary)
+    
+    success_count = sum(1 for r in results if r["success"])
+    logger.info(f"测试完成: {success_count}/{len(results)} 成功")
+    complete = {"type": "complete", "success_count": success_count, "total": len(results), "report_path": excel_file}
+    if snapshot is not None:
+        logger.info(f"延迟 p50={snapshot['latency_p50']}s p95={snapshot['latency_p95']}s "
+                    f"p99={snapshot['latency_p99']}s, 吞吐量 {snapshot['throughput']} 问题/秒")
+        complete.update(snapshot)
+    if cache is not None:
+        logger.info(f"回答缓存命中 {cache.hits} 次，未命中 {cache.misses} 次")
+        complete.update(cache.stats())
+    return complete
+
 def run_test_stream(config: dict):
-    """执行测试并实时流式输出进度"""
+    """执行测试并实时流式输出进度，每隔 stats_interval 秒附带一个 stats 事件"""
     try:
-        question_mode = config.get("question_mode", "file")
-        
-        if question_mode == "input":
-            questions, reference_answers = load_questions(text_input=config.get("questions_text", ""))
-        else:
-            questions, reference_answers = load_questions(file_path=config.get("questions_file"))
+        rows, total = open_run_questions(config)
+        rows = peek_rows(rows)
         
-        if not questions:
+        if rows is None:
             yield {"type": "error", "message": "未找到有效的测试问题"}
             return
         
-        logger.info(f"开始测试，共 {len(questions)} 个问题")
-        yield {"type": "start", "total": len(questions)}
-        results = []
+        store, completed = open_checkpoint(config)
+        logger.info(f"开始测试 {config['run_id']}，预计 {total if total is not None else '未知'} 个问题")
+        yield {"type": "start", "total": total, "run_id": config["run_id"], "resumed": len(completed)}
+        questions, reference_answers, results = [], [], []
+        writer = create_report_writer(config)
+        cache = open_response_cache(config)
+        stats = create_run_stats(config)
+        recorder = open_run_recorder(config)
         
-        for i, question in enumerate(questions, 1):
-            if not question or pd.isna(question) or str(question).strip() == "":
-                results.append({"answer": "", "success": False, "error": "问题为空", "latency": 0})
-                yield {"type": "skip", "index": i, "total": len(questions)}
-                continue
+        try:
+            tracked = track_rows(rows, questions, reference_answers, results)
+            for event in execute_questions(tracked, config, results, total, completed, cache):
+                persist_event(event, questions, results, writer, store, recorder)
+                yield event
+                stats_event = stats.observe(event)
+                if stats_event:
+                    yield stats_event
             
-            yield {"type": "question", "index": i, "total": len(questions), "question": question}
-            result = ask_model(question, config)
-            results.append({
-                "answer": result["answer"],
-                "success": result["success"],
-                "error": result["error"],
-                "latency": result["latency"]
-            })
-            yield {"type": "answer", "index": i, "answer": result["answer"], "success": result["success"], "latency": result["latency"], "error": result["error"]}
-            time.sleep(config["sleep_interval"])
-        
-        similarities = calculate_similarity([r["answer"] for r in results], reference_answers)
-        
-        # 仅在文件模式下回写
-        if question_mode == "file":
-            update_questions_file(config.get("questions_file"), results, similarities)
-        
-        excel_file = generate_excel_report(results, questions, config)
-        
-        success_count = sum(1 for r in results if r["success"])
-        logger.info(f"测试完成: {success_count}/{len(results)} 成功")
-        yield {"type": "complete", "success_count": success_count, "total": len(results), "report_path": excel_file}
+            complete = finish_run(results, questions, reference_answers, config, writer, cache, stats)
+            if recorder is not None:
+                recorder.finish(complete)
+            yield dict(complete, run_id=config["run_id"])
+        finally:
+            writer.close()
+            if recorder is not None:
+                recorder.close()
+            if store is not None:
+                store.close()
+            if cache is not None:
+                cache.close()
     except Exception as e:
         logger.error(f"测试执行失败: {e}", exc_info=True)
         yield {"type": "error", "message": str(e)}
 
 def run_test(config: dict) -> str:
-    """执行测试并返回报告路径"""
-    try:
-        question_mode = config.get("question_mode", "file")
-        
-        if question_mode == "input":
-            questions, reference_answers = load_questions(text_input=config.get("questions_text", ""))
-        else:
-            questions, reference_answers = load_questions(file_path=config.get("questions_file"))
-        
-        if not questions:
+    """执行测试并返回报告路径
+    
+    config["runner"] 为 "async" 时改用 asyncio 运行器，在当前线程中驱动事件循环；
+    config["resume_run_id"] 指定时续跑该运行，跳过已成功回答的问题。
+    """
+    if config.get("runner") == "async":
+        from .async_qa_service import arun_test_stream, iterate_sync
+        events = iterate_sync(arun_test_stream(config))
+    else:
+        events = run_test_stream(config)
+    
+    for event in events:
+        if event["type"] == "question":
+            logger.info(f"[{event['index']}/{event['total'] or '?'}] {event['question']}")
+        elif event["type"] == "stats":
+            logger.info(f"已完成 {event['measured']} 个，p95 延迟 {event['latency_p95']}s，吞吐量 {event['throughput']} 问题/秒")
+        elif event["type"] == "complete":
+            return event["report_path"]
+        elif event["type"] == "error":
+            logger.error(f"测试失败: {event['message']}")
             return None
-        
-        logger.info(f"开始测试，共 {len(questions)} 个问题")
-        results = []
-        
-        for i, question in enumerate(questions, 1):
-            if not question or pd.isna(question) or str(question).strip() == "":
-                results.append({"answer": "", "success": False, "error": "问题为空", "latency": 0})
-                continue
-                
-            logger.info(f"[{i}/{len(questions)}] {question}")
-            result = ask_model(question, config)
-            results.append({
-                "answer": result["answer"],
-                "success": result["success"],
-                "error": result["error"],
-                "latency": result["latency"]
-            })
-            time.sleep(config["sleep_interval"])
-        
-        similarities = calculate_similarity([r["answer"] for r in results], reference_answers)
-        
-        # 仅在文件模式下回写
-        if question_mode == "file":
-            update_questions_file(config.get("questions_file"), results, similarities)
-        
-        excel_file = generate_excel_report(results, questions, config)
-        
-        success_count = sum(1 for r in results if r["success"])
-        logger.info(f"测试完成: {success_count}/{len(results)} 成功")
-        return excel_file
-    except Exception as e:
-        logger.error(f"测试失败: {e}", exc_info=True)
-        return None
+    return None
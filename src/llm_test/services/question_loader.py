@@ -0,0 +1,191 @@
+"""逐行读取测试问题
+
+支持 Excel(.xlsx/.xlsm，openpyxl 只读模式；.xls 经 pandas 读取)、CSV、JSONL 和 Parquet 文件以及文本输入。
+所有来源都以 (序号, 问题, 参考答案) 元组惰性产出，序号从1开始且与文件数据行一一对应，
+因此首个问题可以在读完整个文件之前发出，内存占用与文件大小无关。
+"""
+import csv
+import json
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+QUESTION_COLUMNS = ("问题", "question")
+ANSWER_COLUMNS = ("答案", "answer")
+
+
+def _find_column(names, candidates):
+    for candidate in candidates:
+        if candidate in names:
+            return candidate
+    return None
+
+
+def _normalize(value):
+    if value is None:
+        return None
+    if isinstance(value, float) and value != value:
+        return None
+    return value if isinstance(value, str) else str(value)
+
+
+def iter_text(text_input: str):
+    """每行一个问题，忽略空行"""
+    index = 0
+    for line in text_input.strip().split("\n"):
+        if line.strip():
+            index += 1
+            yield index, line.strip(), None
+
+
+def iter_excel(file_path: str):
+    from openpyxl import load_workbook
+
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = [str(cell).strip() if cell is not None else "" for cell in next(rows, ())]
+        question_col = _find_column(header, QUESTION_COLUMNS)
+        if question_col is None:
+            raise KeyError(f"问题文件缺少列: {QUESTION_COLUMNS[0]}")
+        answer_col = _find_column(header, ANSWER_COLUMNS)
+        q_idx = header.index(question_col)
+        a_idx = header.index(answer_col) if answer_col else None
+
+        # 与 pandas 一致：中间的空行保留（作为空问题），末尾的空行丢弃
+        index = 0
+        blank_rows = 0
+        for row in rows:
+            if all(cell is None for cell in row):
+                blank_rows += 1
+                continue
+            for _ in range(blank_rows):
+                index += 1
+                yield index, None, None
+            blank_rows = 0
+            index += 1
+            question = row[q_idx] if q_idx < len(row) else None
+            answer = row[a_idx] if a_idx is not None and a_idx < len(row) else None
+            yield index, _normalize(question), _normalize(answer)
+    finally:
+        wb.close()
+
+
+def iter_legacy_excel(file_path: str):
+    """旧版 .xls 文件 openpyxl 无法读取，只能经 pandas 整表加载后逐行产出"""
+    import pandas as pd
+
+    df = pd.read_excel(file_path)
+    question_col = _find_column(df.columns, QUESTION_COLUMNS)
+    if question_col is None:
+        raise KeyError(f"问题文件缺少列: {QUESTION_COLUMNS[0]}")
+    answer_col = _find_column(df.columns, ANSWER_COLUMNS)
+    questions = df[question_col].tolist()
+    answers = df[answer_col].tolist() if answer_col else [None] * len(questions)
+    for index, (question, answer) in enumerate(zip(questions, answers), 1):
+        yield index, _normalize(question), _normalize(answer)
+
+
+def iter_csv(file_path: str):
+    with open(file_path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.DictReader(f)
+        question_col = _find_column(reader.fieldnames or [], QUESTION_COLUMNS)
+        if question_col is None:
+            raise KeyError(f"问题文件缺少列: {QUESTION_COLUMNS[0]}")
+        answer_col = _find_column(reader.fieldnames, ANSWER_COLUMNS)
+        for index, row in enumerate(reader, 1):
+            answer = row.get(answer_col) if answer_col else None
+            yield index, _normalize(row.get(question_col)) or None, _normalize(answer) or None
+
+
+def iter_jsonl(file_path: str):
+    with open(file_path, "r", encoding="utf-8") as f:
+        index = 0
+        for line in f:
+            if not line.strip():
+                continue
+            index += 1
+            row = json.loads(line)
+            question_col = _find_column(row, QUESTION_COLUMNS)
+            answer_col = _find_column(row, ANSWER_COLUMNS)
+            yield (
+                index,
+                _normalize(row.get(question_col)) if question_col else None,
+                _normalize(row.get(answer_col)) if answer_col else None
+            )
+
+
+def iter_parquet(file_path: str, batch_size: int = 1024):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("读取 Parquet 文件需要 pyarrow，请运行: pip install pyarrow") from e
+
+    parquet = pq.ParquetFile(file_path)
+    names = parquet.schema_arrow.names
+    question_col = _find_column(names, QUESTION_COLUMNS)
+    if question_col is None:
+        raise KeyError(f"问题文件缺少列: {QUESTION_COLUMNS[0]}")
+    answer_col = _find_column(names, ANSWER_COLUMNS)
+    columns = [question_col] + ([answer_col] if answer_col else [])
+
+    index = 0
+    for batch in parquet.iter_batches(batch_size=batch_size, columns=columns):
+        questions = batch.column(0).to_pylist()
+        answers = batch.column(1).to_pylist() if answer_col else [None] * len(questions)
+        for question, answer in zip(questions, answers):
+            index += 1
+            yield index, _normalize(question), _normalize(answer)
+
+
+_READERS = {
+    ".xlsx": iter_excel,
+    ".xlsm": iter_excel,
+    ".xls": iter_legacy_excel,
+    ".csv": iter_csv,
+    ".jsonl": iter_jsonl,
+    ".parquet": iter_parquet,
+}
+
+
+def iter_file(file_path: str):
+    """按扩展名选择读取方式，逐行产出 (序号, 问题, 参考答案)"""
+    ext = os.path.splitext(file_path)[1].lower()
+    reader = _READERS.get(ext)
+    if reader is None:
+        raise ValueError(f"不支持的问题文件格式: {ext}，可选: {', '.join(sorted(_READERS))}")
+    return reader(file_path)
+
+
+def estimate_total(file_path: str = None, text_input: str = None):
+    """不读取全部数据的情况下估计问题数，无法廉价得知时返回 None"""
+    if text_input:
+        return sum(1 for line in text_input.strip().split("\n") if line.strip())
+    if not file_path or not os.path.exists(file_path):
+        return None
+    ext = os.path.splitext(file_path)[1].lower()
+    try:
+        if ext in (".xlsx", ".xlsm"):
+            from openpyxl import load_workbook
+            wb = load_workbook(file_path, read_only=True)
+            try:
+                max_row = wb.active.max_row
+            finally:
+                wb.close()
+            return max_row - 1 if max_row else None
+        if ext == ".parquet":
+            import pyarrow.parquet as pq
+            return pq.ParquetFile(file_path).metadata.num_rows
+    except Exception as e:
+        logger.warning(f"估计问题数失败: {e}")
+    return None
+
+
+def iter_questions(file_path: str = None, text_input: str = None):
+    """从文本输入或问题文件惰性产出 (序号, 问题, 参考答案)"""
+    if text_input:
+        return iter_text(text_input)
+    if file_path:
+        return iter_file(file_path)
+    raise ValueError("未提供问题来源")
@@ -0,0 +1,122 @@
+"""报告文件的定位和压缩副本
+
+/download 和 /report 只提供 reports/ 目录下的文件。文本报告（HTML、CSV、JSONL 等）在客户端
+支持时以 gzip 或 zstd 压缩传输：第一次请求时压缩一次，写入 reports/.compressed/ 下与原文件
+同名的副本，之后的请求直接发送副本；原文件更新后（修改时间变化）重新压缩。xlsx 本身是 zip
+压缩格式，不再压缩。zstd 需要安装 zstandard，未安装时只提供 gzip。
+"""
+import gzip
+import os
+import shutil
+import logging
+import tempfile
+import threading
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+REPORTS_DIR = "reports"
+COMPRESSED_DIR = os.path.join(REPORTS_DIR, ".compressed")
+# 值得压缩的文本报告
+TEXT_EXTENSIONS = (".html", ".htm", ".csv", ".json", ".jsonl", ".txt", ".log")
+# 小于该大小的文件压缩收益有限，直接发送
+MIN_COMPRESS_SIZE = 1024
+ENCODING_SUFFIXES = {"zstd": ".zst", "gzip": ".gz"}
+
+# 每个压缩副本一把锁，同一进程内的多个线程同时请求同一个报告时只压缩一次
+_copy_locks = {}
+_copy_locks_lock = threading.Lock()
+
+
+def resolve_report(filename: str, reports_dir: str = REPORTS_DIR) -> str:
+    """把请求中的路径（如 reports/stress/<任务ID>/report.html）解析为 reports 目录下的绝对路径
+
+    相对路径相对于当前工作目录（与生成报告时一致）。路径越出 reports 目录、指向压缩副本
+    或文件不存在时抛出 FileNotFoundError。
+    """
+    root = os.path.realpath(reports_dir)
+    path = os.path.realpath(filename)
+    if not _is_within(path, root) or _is_within(path, os.path.join(root, ".compressed")) \
+            or not os.path.isfile(path):
+        raise FileNotFoundError(f"报告不存在: {filename}")
+    return path
+
+
+def _is_within(path: str, directory: str) -> bool:
+    return os.path.commonpath([directory, path]) == directory
+
+
+def is_compressible(path: str) -> bool:
+    return path.lower().endswith(TEXT_EXTENSIONS) and os.path.getsize(path) >= MIN_COMPRESS_SIZE
+
+
+@lru_cache(maxsize=None)
+def available_encodings() -> tuple:
+    """服务端支持的压缩格式，按优先顺序排列"""
+    try:
+        import zstandard  # noqa: F401
+    except ImportError:
+        return ("gzip",)
+    return ("zstd", "gzip")
+
+
+def _compress(source: str, target: str, encoding: str):
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        if encoding == "zstd":
+            import zstandard
+            with zstandard.ZstdCompressor(level=10).stream_writer(dst, closefd=False) as writer:
+                shutil.copyfileobj(src, writer, 1024 * 1024)
+        else:
+            with gzip.GzipFile(fileobj=dst, mode="wb", compresslevel=6, mtime=0) as writer:
+                shutil.copyfileobj(src, writer, 1024 * 1024)
+
+
+def compressed_copy(path: str, encoding: str, reports_dir: str = REPORTS_DIR) -> str:
+    """返回 path 的压缩副本，不存在或已过期时先生成
+
+    副本的修改时间设为与原文件相同，以此判断是否过期。同一进程内按副本加锁，其他线程等待
+    第一个线程压缩完成后直接使用；每次压缩写入 mkstemp 创建的独立临时文件再原子替换，
+    多个 worker 进程同时压缩同一个报告时互不干扰，也不会读到写了一半的副本。
+    """
+    root = os.path.realpath(reports_dir)
+    relative = os.path.relpath(path, root)
+    target = os.path.join(root, ".compressed", relative + ENCODING_SUFFIXES[encoding])
+    with _copy_locks_lock:
+        lock = _copy_locks.setdefault(target, threading.Lock())
+    with lock:
+        stat = os.stat(path)
+        try:
+            if os.stat(target).st_mtime_ns == stat.st_mtime_ns:
+                return target
+        except FileNotFoundError:
+            pass
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".tmp")
+        os.close(fd)
+        try:
+            # mkstemp 创建的文件只有属主可读，改为与原文件相同的权限，便于 nginx 直接发送
+            os.chmod(tmp_path, stat.st_mode & 0o777)
+            _compress(path, tmp_path, encoding)
+            os.utime(tmp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+            os.replace(tmp_path, target)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    logger.info(f"已生成压缩副本: {target}（{stat.st_size} -> {os.path.getsize(target)} 字节）")
+    return target
+
+
+def remove_stale_copies(reports_dir: str = REPORTS_DIR) -> int:
+    """删除原文件已不存在的压缩副本，返回删除的数量"""
+    root = os.path.realpath(reports_dir)
+    compressed_root = os.path.join(root, ".compressed")
+    removed = 0
+    for directory, _, filenames in os.walk(compressed_root):
+        for filename in filenames:
+            copy = os.path.join(directory, filename)
+            source, suffix = os.path.splitext(os.path.join(root, os.path.relpath(copy, compressed_root)))
+            if suffix not in ENCODING_SUFFIXES.values() or not os.path.exists(source):
+                os.remove(copy)
+                removed += 1
+    return removed
@@ -0,0 +1,302 @@
+"""单次写出的测试报告
+
+结果行在回答到达时即按序号顺序写入 openpyxl 只写模式的工作簿（并发导致的乱序由一个
+小的重排缓冲区消化），单元格样式在写入时一并设置，运行结束时只需补写汇总页并保存。
+可选的 CSV 旁路文件按完成顺序逐行写入并立即刷新，运行中途即可查看已完成的结果。
+openpyxl 在生成报告时才导入，不拖慢控制台和 worker 进程的启动。
+"""
+import csv
+import os
+import logging
+from datetime import datetime
+
+from .retry import format_attempts
+
+logger = logging.getLogger(__name__)
+
+REFUSAL_KEYWORDS = ["不知道", "无法回答", "无权限", "不能提供", "未授权", "拒绝"]
+
+STREAM_COLUMNS = [
+    ("首Token延迟(秒)", "ttft"),
+    ("总耗时(秒)", "total_time"),
+    ("输出Token数", "output_tokens"),
+    ("Token/秒", "tokens_per_sec"),
+    ("Token间延迟(秒)", "itl"),
+]
+
+
+COMPARISON_SUMMARY_ROWS = [
+    ("API地址", "api_url"),
+    ("模型名称", "model_name"),
+    ("并发数", "concurrency"),
+    ("总问题数", "total"),
+    ("成功响应", "success_count"),
+    ("延迟P50(秒)", "latency_p50"),
+    ("延迟P90(秒)", "latency_p90"),
+    ("延迟P95(秒)", "latency_p95"),
+    ("延迟P99(秒)", "latency_p99"),
+    ("最大延迟(秒)", "latency_max"),
+    ("首Token延迟P50(秒)", "ttft_p50"),
+    ("首Token延迟P95(秒)", "ttft_p95"),
+    ("吞吐量(问题/秒)", "throughput"),
+    ("输出速率(Token/秒)", "output_tokens_per_sec"),
+    ("平均相似度", "similarity_avg"),
+]
+
+
+def is_refusal(result: dict) -> bool:
+    return result["success"] and any(kw in result["answer"] for kw in REFUSAL_KEYWORDS)
+
+
+def new_report_path(ext: str = "xlsx") -> str:
+    """reports/test_report_<时间戳>.<ext>，同一秒内重复时追加序号"""
+    os.makedirs("reports", exist_ok=True)
+    base = f"reports/test_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    path = f"{base}.{ext}"
+    suffix = 1
+    while os.path.exists(path):
+        path = f"{base}_{suffix}.{ext}"
+        suffix += 1
+    return path
+
+
+class ReportWriter:
+    """边运行边写出的 Excel 测试报告
+
+    add() 可以按任意顺序调用，行会在其之前的序号都到齐后写出；finish() 补写汇总页并保存。
+    with_similarity 为真时结果页包含相似度列（仅逐对相似度算法在运行中即可得到分数），
+    with_attempts 为真时包含端到端耗时和每次尝试的明细（开启重试或对冲时）。
+    """
+
+    def __init__(self, config: dict, stream: bool = False, with_similarity: bool = False,
+                 csv_sidecar: bool = False, path: str = None, with_attempts: bool = False):
+        self.config = config
+        self.path = path or new_report_path()
+        self.stream = stream
+        self.with_similarity = with_similarity
+        self.with_attempts = with_attempts
+
+        self.columns = ["序号", "问题", "回答", "延迟(秒)", "建连耗时(秒)", "状态", "错误信息"]
+        if with_similarity:
+            self.columns.append("相似度")
+        if stream:
+            self.columns.extend(name for name, _ in STREAM_COLUMNS)
+        if with_attempts:
+            self.columns.extend(["端到端耗时(秒)", "尝试次数", "尝试明细"])
+
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Alignment
+
+        self.new_cell = WriteOnlyCell
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet("测试结果")
+        self.sheet.append(self.columns)
+        self.answer_alignment = Alignment(horizontal="fill")
+
+        self.finished = False
+        self.pending = {}
+        self.next_index = 1
+        self.total = 0
+        self.success_count = 0
+        self.refusal_count = 0
+        self.latency_sum = 0.0
+        self.connect_time_sum = 0.0
+        self.e2e_latency_sum = 0.0
+        self.extra_attempts = 0
+
+        self.csv_path = None
+        self.csv_file = None
+        if csv_sidecar:
+            self.csv_path = os.path.splitext(self.path)[0] + ".csv"
+            self.csv_file = open(self.csv_path, "w", encoding="utf-8-sig", newline="")
+            self.csv_writer = csv.writer(self.csv_file)
+            self.csv_writer.writerow(self.columns)
+
+    def _row(self, index: int, question, result: dict) -> list:
+        status = "成功" if result["success"] else "失败"
+        if is_refusal(result):
+            status += "(拒答)"
+        row = [
+            index,
+            question,
+            result["answer"],
+            result["latency"],
+            result.get("connect_time", 0),
+            status,
+            result["error"] if not result["success"] else ""
+        ]
+        if self.with_similarity:
+            row.append(result.get("similarity"))
+        if self.stream:
+            row.extend(result.get(key) for _, key in STREAM_COLUMNS)
+        if self.with_attempts:
+            row.extend([
+                result.get("e2e_latency", result["latency"]),
+                result.get("attempt_count", 1),
+                format_attempts(result.get("attempts"))
+            ])
+        return row
+
+    def add(self, index: int, question, result: dict):
+        """记录第 index 个问题（从1开始）的结果"""
+        self.total += 1
+        self.latency_sum += result["latency"]
+        self.connect_time_sum += result.get("connect_time", 0)
+        if result["success"]:
+            self.success_count += 1
+        if is_refusal(result):
+            self.refusal_count += 1
+        self.e2e_latency_sum += result.get("e2e_latency", result["latency"])
+        self.extra_attempts += max(0, result.get("attempt_count", 1) - 1)
+
+        row = self._row(index, question, result)
+        if self.csv_file:
+            self.csv_writer.writerow(row)
+            self.csv_file.flush()
+
+        self.pending[index] = row
+        while self.next_index in self.pending:
+            self._append(self.pending.pop(self.next_index))
+            self.next_index += 1
+
+    def _append(self, row: list):
+        answer = self.new_cell(self.sheet, value=row[2])
+        answer.alignment = self.answer_alignment
+        row[2] = answer
+        self.sheet.append(row)
+
+    def summary_rows(self) -> list:
+        total = self.total
+        rows = [
+            ("测试时间", datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
+            ("API地址", self.config["api_url"]),
+            ("模型名称", self.config["model_name"]),
+            ("总问题数", total),
+            ("成功响应", f"{self.success_count}/{total} ({self.success_count / total:.0%})" if total else "0/0"),
+            ("平均延迟(秒)", round(self.latency_sum / total, 2) if total else 0),
+            ("总建连耗时(秒)", round(self.connect_time_sum, 3)),
+            ("安全拒答数", self.refusal_count),
+        ]
+        if self.with_attempts:
+            rows.extend([
+                ("平均端到端耗时(秒)", round(self.e2e_latency_sum / total, 2) if total else 0),
+                ("重试/对冲次数", self.extra_attempts),
+            ])
+        return rows
+
+    def finish(self, extra_summary: list = None) -> str:
+        """写出剩余行和汇总页并保存，返回报告路径"""
+        for index in sorted(self.pending):
+            self._append(self.pending.pop(index))
+
+        summary = self.workbook.create_sheet("测试汇总")
+        summary.append(["项目", "值"])
+        for item in self.summary_rows() + list(extra_summary or []):
+            summary.append(list(item))
+
+        self.workbook.save(self.path)
+        self.finished = True
+        self.close()
+        logger.info(f"测试报告已生成: {self.path}")
+        return self.path
+
+    def close(self):
+        """关闭旁路文件；未完成的报告（运行中断）丢弃只写工作表的临时文件"""
+        if self.csv_file:
+            self.csv_file.close()
+            self.csv_file = None
+        if not self.finished and not self.sheet.closed:
+            self.sheet.close()
+            temp_path = getattr(self.sheet._writer, "out", None)
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+
+def write_comparison_report(questions: list, references: list, targets: list, summaries: list,
+                            stream: bool = False, path: str = None) -> str:
+    """多目标对比报告：逐题并排列出各目标的回答、延迟、相似度和状态，汇总页每个目标一列
+
+    targets 为带 name 和 results 属性的对比目标，summaries 为对应的统计 dict，
+    stream 为真时每个目标另有首Token延迟和 Token/秒 两列。
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment
+
+    path = path or new_report_path()
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("对比结果")
+    header = ["序号", "问题", "参考答案"]
+    for target in targets:
+        header.extend([f"{target.name} 回答", f"{target.name} 延迟(秒)", f"{target.name} 相似度",
+                       f"{target.name} 状态"])
+        if stream:
+            header.extend([f"{target.name} 首Token延迟(秒)", f"{target.name} Token/秒"])
+    sheet.append(header)
+    alignment = Alignment(horizontal="fill")
+    for i, (question, reference) in enumerate(zip(questions, references), 1):
+        row = [i, question, reference]
+        for target in targets:
+            result = target.results[i - 1]
+            answer = WriteOnlyCell(sheet, value=result["answer"])
+            answer.alignment = alignment
+            status = "成功" if result["success"] else f"失败: {result['error']}"
+            if is_refusal(result):
+                status += "(拒答)"
+            row.extend([answer, result["latency"], result.get("similarity"), status])
+            if stream:
+                row.extend([result.get("ttft"), result.get("tokens_per_sec")])
+        sheet.append(row)
+
+    summary = workbook.create_sheet("对比汇总")
+    summary.append(["项目"] + [target.name for target in targets])
+    summary.append(["测试时间", datetime.now().strftime('%Y-%m-%d %H:%M:%S')] + [None] * (len(targets) - 1))
+    for name, key in COMPARISON_SUMMARY_ROWS:
+        if key.startswith("ttft_") and not any(key in item for item in summaries):
+            continue
+        summary.append([name] + [item.get(key) for item in summaries])
+    workbook.save(path)
+    logger.info(f"对比报告已生成: {path}")
+    return path
+
+
+def write_back_questions(file_path: str, results: list, similarities: list):
+    """将回答和相似度一次性写回问题Excel文件
+
+    以只读模式逐行读取原文件、以只写模式写出新文件（回答单元格在写入时设置对齐），
+    完成后替换原文件。已有“回答”“相似度”列时覆盖，否则追加到末尾。
+    """
+    from openpyxl import Workbook, load_workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment
+
+    source = load_workbook(file_path, read_only=True)
+    tmp_path = file_path + ".tmp"
+    try:
+        rows = source.active.iter_rows(values_only=True)
+        header = list(next(rows, ()))
+        names = [str(cell).strip() if cell is not None else "" for cell in header]
+        for name in ("回答", "相似度"):
+            if name not in names:
+                header.append(name)
+                names.append(name)
+        answer_col = names.index("回答")
+        similarity_col = names.index("相似度")
+
+        target = Workbook(write_only=True)
+        sheet = target.create_sheet(source.active.title)
+        sheet.append(header)
+        alignment = Alignment(horizontal="fill")
+        for i, row in enumerate(rows):
+            row = list(row) + [None] * (len(header) - len(row))
+            if i < len(results):
+                answer = WriteOnlyCell(sheet, value=results[i]["answer"])
+                answer.alignment = alignment
+                row[answer_col] = answer
+                row[similarity_col] = similarities[i]
+            sheet.append(row)
+        target.save(tmp_path)
+    finally:
+        source.close()
+    os.replace(tmp_path, file_path)
@@ -0,0 +1,140 @@
+"""模型回答的磁盘缓存
+
+以 (API地址, 模型名称, 消息, temperature, max_tokens) 为键把成功的回答保存到 SQLite 文件中，
+只改动报告或评分逻辑后重复运行同一批问题时无需再次请求模型。API地址参与计算，多目标对比时
+不同服务端的同名模型各自缓存，不会互相命中。
+
+cache 配置项：
+- off: 不使用缓存（默认）
+- read: 先查缓存，命中时直接返回；未命中时请求模型并写入缓存
+- write: 总是请求模型，并用新回答刷新缓存
+
+条目超过 cache_ttl 秒后失效；条目数超过 cache_max_entries 时按最近访问时间淘汰（LRU）。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+CACHE_MODES = ("off", "read", "write")
+DEFAULT_CACHE_PATH = os.path.join("reports", "cache", "responses.sqlite")
+DEFAULT_TTL = 7 * 86400
+DEFAULT_MAX_ENTRIES = 10000
+
+
+def cache_key(payload: dict, endpoint: str = None) -> str:
+    """只取影响回答内容的字段和请求的 API 地址，stream 等传输方式不参与计算"""
+    key = {
+        "endpoint": endpoint,
+        "model": payload.get("model"),
+        "messages": payload.get("messages"),
+        "temperature": payload.get("temperature"),
+        "max_tokens": payload.get("max_tokens"),
+    }
+    return hashlib.sha256(json.dumps(key, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """线程安全的 SQLite 回答缓存，同时统计本次运行的命中/未命中次数"""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, mode: str = "read",
+                 ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"未知的缓存模式: {mode}，可选: {', '.join(CACHE_MODES)}")
+        self.path = path
+        self.mode = mode
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, result TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed)")
+        self.conn.commit()
+        self._purge_expired()
+
+    def get(self, payload: dict, endpoint: str = None):
+        """读取模式下返回缓存的结果（未命中或已过期时返回 None）并计数，其他模式始终返回 None"""
+        if self.mode != "read":
+            return None
+        key = cache_key(payload, endpoint)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT result, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or (self.ttl and now - row[1] > self.ttl):
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, payload: dict, result: dict, endpoint: str = None):
+        """保存成功的结果，超出条目上限时淘汰最久未访问的条目"""
+        if self.mode == "off" or not result.get("success"):
+            return
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, result, created, accessed) VALUES (?, ?, ?, ?)",
+                (cache_key(payload, endpoint), json.dumps(result, ensure_ascii=False), now, now)
+            )
+            if self.max_entries:
+                self.conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+            self.conn.commit()
+
+    def _purge_expired(self):
+        if not self.ttl:
+            return
+        with self.lock:
+            deleted = self.conn.execute(
+                "DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,)
+            ).rowcount
+            self.conn.commit()
+        if deleted:
+            logger.info(f"已清理 {deleted} 条过期的回答缓存")
+
+    def stats(self) -> dict:
+        return {"cache_hits": self.hits, "cache_misses": self.misses}
+
+    def summary_rows(self) -> list:
+        total = self.hits + self.misses
+        return [
+            ("回答缓存", self.mode),
+            ("缓存命中", f"{self.hits}/{total} ({self.hits / total:.0%})" if total else "0/0"),
+            ("缓存未命中", self.misses),
+        ]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def open_response_cache(config: dict):
+    """按 config["cache"] 创建回答缓存，off 或未配置时返回 None"""
+    mode = str(config.get("cache") or "off").lower()
+    if mode == "off":
+        return None
+    cache = ResponseCache(
+        path=config.get("cache_path") or DEFAULT_CACHE_PATH,
+        mode=mode,
+        ttl=float(config.get("cache_ttl", DEFAULT_TTL) or 0),
+        max_entries=int(config.get("cache_max_entries", DEFAULT_MAX_ENTRIES) or 0)
+    )
+    logger.info(f"回答缓存已启用: 模式={mode}, 路径={cache.path}")
+    return cache
@@ -0,0 +1,300 @@
+"""请求重试与对冲
+
+- 重试: 对可重试的失败（HTTP 429/500/502/503/504 以及连接错误、超时等没有状态码的失败）
+  按指数退避加随机抖动（full jitter）重新发送，至多 max_retries 次
+- 对冲: 一次请求在 p95 延迟（或 hedge_after 秒）内仍未返回时再发出一个相同的请求，
+  取先成功返回的结果。流式模式下两个请求的增量无法合并，不做对冲。开启对冲时连接池
+  按并发数的 2 倍分配（见 hedge_connections），对冲请求不必等待空闲连接。
+
+每次尝试的耗时都记录在结果的 attempts 中：latency 为最终采用的那次尝试的服务端耗时，
+e2e_latency 为包含所有重试和退避等待的端到端耗时。
+"""
+import asyncio
+import random
+import threading
+import time
+import logging
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+DEFAULT_BACKOFF = 0.5
+DEFAULT_BACKOFF_MAX = 8.0
+DEFAULT_HEDGE_QUANTILE = 0.95
+# 自动对冲前至少需要的延迟样本数
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 500
+
+
+class LatencyWindow:
+    """最近若干次成功请求的延迟，用于估计对冲时机"""
+
+    def __init__(self, size: int = LATENCY_WINDOW):
+        self.samples = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def add(self, latency: float):
+        with self.lock:
+            self.samples.append(latency)
+
+    def quantile(self, q: float):
+        with self.lock:
+            if len(self.samples) < HEDGE_MIN_SAMPLES:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def attempt_record(number: int, result: dict, hedge: bool = False) -> dict:
+    record = {
+        "attempt": number,
+        "success": result["success"],
+        "latency": result["latency"],
+        "connect_time": result.get("connect_time", 0),
+    }
+    if hedge:
+        record["hedge"] = True
+    if result.get("status_code") is not None:
+        record["status_code"] = result["status_code"]
+    if not result["success"]:
+        record["error"] = result["error"][:200]
+    return record
+
+
+def abandoned_record(number: int, started: float, hedge: bool = False) -> dict:
+    """对冲中落败、未等其返回的请求"""
+    record = {"attempt": number, "success": False, "latency": round(time.time() - started, 2),
+              "connect_time": 0, "abandoned": True}
+    if hedge:
+        record["hedge"] = True
+    return record
+
+
+def format_attempts(attempts: list) -> str:
+    """报告中的尝试明细，如 "#1 HTTP 502 0.12s; #2 成功 0.3s" """
+    parts = []
+    for a in attempts or []:
+        if a["success"]:
+            status = "成功"
+        elif a.get("abandoned"):
+            status = "放弃"
+        elif a.get("status_code") is not None:
+            status = f"HTTP {a['status_code']}"
+        else:
+            status = "异常"
+        parts.append(f"#{a['attempt']}{' 对冲' if a.get('hedge') else ''} {status} {a['latency']}s")
+    return "; ".join(parts)
+
+
+class RetryPolicy:
+    """一次运行共用的重试与对冲策略，send 为发送单次请求的函数，返回 build_result 结构"""
+
+    def __init__(self, max_retries: int = 0, backoff: float = DEFAULT_BACKOFF,
+                 backoff_max: float = DEFAULT_BACKOFF_MAX, retry_status=RETRYABLE_STATUS,
+                 hedge: bool = False, hedge_after: float = 0,
+                 hedge_quantile: float = DEFAULT_HEDGE_QUANTILE):
+        self.max_retries = max(0, max_retries)
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.retry_status = tuple(retry_status)
+        self.hedge = hedge
+        self.hedge_after = hedge_after
+        self.hedge_quantile = hedge_quantile
+        self.latencies = LatencyWindow()
+
+    def is_retryable(self, result: dict) -> bool:
+        if result["success"]:
+            return False
+        status = result.get("status_code")
+        return status is None or status in self.retry_status
+
+    def backoff_delay(self, retry: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff * (2 ** retry)))
+
+    def hedge_delay(self):
+        """发出对冲请求前等待的秒数，尚无足够样本时返回 None（不对冲）"""
+        if not self.hedge:
+            return None
+        if self.hedge_after:
+            return self.hedge_after
+        return self.latencies.quantile(self.hedge_quantile)
+
+    def _observe(self, result: dict):
+        if result["success"]:
+            self.latencies.add(result["latency"] + result.get("connect_time", 0))
+
+    def _finish(self, result: dict, attempts: list, start_time: float) -> dict:
+        result = dict(result)
+        result["attempts"] = sorted(attempts, key=lambda a: a["attempt"])
+        result["attempt_count"] = len(attempts)
+        result["e2e_latency"] = round(time.time() - start_time, 2)
+        return result
+
+    def run(self, send, limiter=None, stream: bool = False) -> dict:
+        start_time = time.time()
+        attempts = []
+        for retry in range(self.max_retries + 1):
+            if retry:
+                time.sleep(self.backoff_delay(retry - 1))
+            if limiter is not None:
+                limiter.wait()
+            delay = None if stream else self.hedge_delay()
+            if delay is None:
+                result = send()
+                attempts.append(attempt_record(len(attempts) + 1, result))
+            else:
+                result = self._run_hedged(send, delay, limiter, attempts)
+            self._observe(result)
+            if not self.is_retryable(result):
+                break
+            if retry < self.max_retries:
+                logger.warning(f"请求失败，准备第 {retry + 1} 次重试: {result['error'][:100]}")
+        return self._finish(result, attempts, start_time)
+
+    @staticmethod
+    def _spawn(send) -> Future:
+        """在独立的线程中发送请求
+
+        不使用固定大小的线程池：落败的请求被放弃后仍要等到服务端返回或超时才结束，
+        放在线程池中会占满工作线程，推迟后续问题的原请求和对冲请求。
+        """
+        future = Future()
+
+        def target():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(send())
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=target, name="qa-hedge", daemon=True).start()
+        return future
+
+    def _run_hedged(self, send, delay: float, limiter, attempts: list) -> dict:
+        number = len(attempts) + 1
+        started = time.time()
+        primary = self._spawn(send)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            result = primary.result()
+            attempts.append(attempt_record(number, result))
+            return result
+
+        if limiter is not None:
+            limiter.wait()
+        labels = {primary: (number, False, started)}
+        hedged = self._spawn(send)
+        labels[hedged] = (number + 1, True, time.time())
+        pending = {primary, hedged}
+        result = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                number_, hedge, _ = labels[future]
+                attempts.append(attempt_record(number_, result, hedge=hedge))
+                if result["success"]:
+                    # 落败的请求不再等待，在后台自然结束
+                    for loser in pending:
+                        number_, hedge, started = labels[loser]
+                        attempts.append(abandoned_record(number_, started, hedge))
+                    return result
+        return result
+
+    async def arun(self, send, limiter=None, stream: bool = False) -> dict:
+        """run 的异步版本，send 为返回协程的函数；对冲落败的请求会被取消"""
+        start_time = time.time()
+        attempts = []
+        for retry in range(self.max_retries + 1):
+            if retry:
+                await asyncio.sleep(self.backoff_delay(retry - 1))
+            if limiter is not None:
+                await asyncio.sleep(limiter.delay())
+            delay = None if stream else self.hedge_delay()
+            if delay is None:
+                result = await send()
+                attempts.append(attempt_record(len(attempts) + 1, result))
+            else:
+                result = await self._arun_hedged(send, delay, limiter, attempts)
+            self._observe(result)
+            if not self.is_retryable(result):
+                break
+            if retry < self.max_retries:
+                logger.warning(f"请求失败，准备第 {retry + 1} 次重试: {result['error'][:100]}")
+        return self._finish(result, attempts, start_time)
+
+    async def _arun_hedged(self, send, delay: float, limiter, attempts: list) -> dict:
+        number = len(attempts) + 1
+        started = time.time()
+        primary = asyncio.ensure_future(send())
+        done, _ = await asyncio.wait([primary], timeout=delay)
+        if done:
+            result = primary.result()
+            attempts.append(attempt_record(number, result))
+            return result
+
+        if limiter is not None:
+            await asyncio.sleep(limiter.delay())
+        labels = {primary: (number, False, started)}
+        hedged = asyncio.ensure_future(send())
+        labels[hedged] = (number + 1, True, time.time())
+        pending = {primary, hedged}
+        result = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    number_, hedge, _ = labels[task]
+                    attempts.append(attempt_record(number_, result, hedge=hedge))
+                    if result["success"]:
+                        for loser in pending:
+                            number_, hedge, started = labels[loser]
+                            attempts.append(abandoned_record(number_, started, hedge))
+                        return result
+            return result
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def close(self):
+        """落败的请求在各自的线程中自然结束，没有需要释放的资源"""
+
+
+def is_hedge_enabled(config: dict) -> bool:
+    hedge = config.get("hedge", False)
+    if isinstance(hedge, str):
+        return hedge.lower() in ("1", "true", "on", "yes")
+    return bool(hedge)
+
+
+def hedge_connections(config: dict, concurrency: int) -> int:
+    """连接池需要的连接数：开启对冲时每个并发槽位可能同时有原请求和对冲请求"""
+    return 2 * concurrency if is_hedge_enabled(config) else concurrency
+
+
+def is_retry_enabled(config: dict) -> bool:
+    return int(config.get("max_retries", 0) or 0) > 0 or is_hedge_enabled(config)
+
+
+def create_retry_policy(config: dict):
+    """按 max_retries / retry_* / hedge* 配置创建重试策略，均未开启时返回 None"""
+    if not is_retry_enabled(config):
+        return None
+    retry_status = config.get("retry_status") or RETRYABLE_STATUS
+    if isinstance(retry_status, str):
+        retry_status = [int(code) for code in retry_status.split(",") if code.strip()]
+    policy = RetryPolicy(
+        max_retries=int(config.get("max_retries", 0) or 0),
+        backoff=float(config.get("retry_backoff", DEFAULT_BACKOFF) or DEFAULT_BACKOFF),
+        backoff_max=float(config.get("retry_backoff_max", DEFAULT_BACKOFF_MAX) or DEFAULT_BACKOFF_MAX),
+        retry_status=retry_status,
+        hedge=is_hedge_enabled(config),
+        hedge_after=float(config.get("hedge_after") or 0),
+        hedge_quantile=float(config.get("hedge_quantile") or DEFAULT_HEDGE_QUANTILE)
+    )
+    logger.info(f"重试策略: 最多重试 {policy.max_retries} 次, 对冲: {'开启' if policy.hedge else '关闭'}")
+    return policy
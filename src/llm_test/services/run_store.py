@@ -0,0 +1,406 @@
+"""运行记录库：问答测试和压测的配置、逐条结果与汇总指标
+
+所有运行都记录到 reports/runs.sqlite（WAL 模式，可同时被多个线程和进程读写）：
+- runs: 每次运行一行，配置和完整汇总以 JSON 保存，常用于筛选和对比的指标
+  （请求数、失败率、延迟分位数、吞吐量、输出Token/秒）单独成列并建有索引
+- qa_results: 问答测试的逐题结果，主键为 (run_id, idx)，按运行读取时是一次范围扫描
+- stress_history: 压测每秒的 RPS、用户数和延迟，按同样方式组织
+多目标对比（compare）只记录汇总，各目标作为 parent_id 指向它的问答测试记录。
+
+延迟统一以毫秒保存，吞吐量对问答测试是问题/秒、对压测是请求/秒。
+逐题结果按 batch_size 行批量写入，运行结束时再写入汇总，列表和对比只读 runs 表，
+与逐条结果的行数无关。
+
+config 中 record_run 为 false/off 时不记录该次运行。
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE_PATH = os.path.join("reports", "runs.sqlite")
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+RUN_KINDS = ("qa", "compare", "stress", "capacity")
+# 不写入记录的配置项：手动输入的问题已逐题保存
+SKIPPED_CONFIG_KEYS = ("questions_text",)
+
+METRIC_COLUMNS = ("total", "failed", "error_rate", "p50_ms", "p95_ms", "p99_ms",
+                  "throughput", "output_tokens_per_sec", "duration")
+RUN_COLUMNS = ("run_id", "kind", "parent_id", "status", "started", "finished", "target", "model",
+               "report_path") + METRIC_COLUMNS
+QA_COLUMNS = ("idx", "question", "success", "answer", "error", "latency_ms", "ttft_ms",
+              "output_tokens", "tokens_per_sec", "similarity")
+HISTORY_COLUMNS = ("elapsed", "users", "rps", "fail_per_sec", "p50_ms", "p95_ms",
+                   "total_requests", "failed_count")
+# list_runs 允许的排序字段
+SORT_COLUMNS = ("started", "finished", "total", "error_rate", "p50_ms", "p95_ms", "p99_ms",
+                "throughput", "output_tokens_per_sec", "duration")
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY, kind TEXT NOT NULL, parent_id TEXT, status TEXT NOT NULL,
+    started REAL NOT NULL, finished REAL, target TEXT, model TEXT, report_path TEXT,
+    {", ".join(f"{column} REAL" for column in METRIC_COLUMNS)},
+    config TEXT, summary TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_runs_started ON runs (started);
+CREATE INDEX IF NOT EXISTS idx_runs_kind ON runs (kind, started);
+CREATE INDEX IF NOT EXISTS idx_runs_target ON runs (target, started);
+CREATE INDEX IF NOT EXISTS idx_runs_model ON runs (model, started);
+CREATE INDEX IF NOT EXISTS idx_runs_parent ON runs (parent_id);
+CREATE TABLE IF NOT EXISTS qa_results (
+    run_id TEXT NOT NULL, idx INTEGER NOT NULL, question TEXT, success INTEGER, answer TEXT, error TEXT,
+    latency_ms REAL, ttft_ms REAL, output_tokens INTEGER, tokens_per_sec REAL, similarity REAL,
+    PRIMARY KEY (run_id, idx)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS stress_history (
+    run_id TEXT NOT NULL, elapsed REAL NOT NULL, users INTEGER, rps REAL, fail_per_sec REAL,
+    p50_ms REAL, p95_ms REAL, total_requests INTEGER, failed_count INTEGER,
+    PRIMARY KEY (run_id, elapsed)
+) WITHOUT ROWID;
+"""
+
+
+def is_recording_enabled(config: dict) -> bool:
+    return str(config.get("record_run", "true")).lower() not in ("0", "false", "off", "no")
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+class RunStore:
+    """线程安全的运行记录库，同一进程内通过 get_run_store 共享一个连接"""
+
+    def __init__(self, path: str = DEFAULT_STORE_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # 多个进程同时写入时等待对方提交，而不是立即报 database is locked
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        # 只对新建的库生效：清理过期运行后可以归还空闲页
+        self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    def start_run(self, run_id: str, kind: str, config: dict, parent_id: str = None, started: float = None):
+        """登记一次运行（状态为 running），同一 run_id 续跑时保留已有的逐条结果"""
+        config = {key: value for key, value in config.items() if key not in SKIPPED_CONFIG_KEYS}
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO runs (run_id, kind, parent_id, status, started, target, model, config) "
+                "VALUES (?, ?, ?, 'running', ?, ?, ?, ?) ON CONFLICT (run_id) DO UPDATE SET "
+                "status = 'running', finished = NULL, config = excluded.config",
+                (run_id, kind, parent_id, started or time.time(),
+                 config.get("target_url") or config.get("api_url"), config.get("model_name"), _dumps(config))
+            )
+            self.conn.commit()
+
+    def add_qa_results(self, run_id: str, rows: list):
+        """rows 为 (序号, 问题, ask_model 的结果) 列表"""
+        values = [(
+            run_id, index, None if question is None else str(question), int(bool(result.get("success"))),
+            result.get("answer"), result.get("error"), _ms(result.get("latency")), _ms(result.get("ttft")),
+            result.get("output_tokens"), result.get("tokens_per_sec"), result.get("similarity"),
+        ) for index, question, result in rows]
+        with self.lock:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO qa_results (run_id, {', '.join(QA_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * (len(QA_COLUMNS) + 1))})", values
+            )
+            self.conn.commit()
+
+    def add_stress_history(self, run_id: str, events: list):
+        """events 为压测的 stats 事件"""
+        values = [(
+            run_id, event.get("elapsed"), event.get("users"), event.get("current_rps"),
+            event.get("current_fail_per_sec"), event.get("p50_response_time"), event.get("p95_response_time"),
+            event.get("total_requests"), event.get("failed_count"),
+        ) for event in events if event.get("elapsed") is not None]
+        with self.lock:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO stress_history (run_id, {', '.join(HISTORY_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * (len(HISTORY_COLUMNS) + 1))})", values
+            )
+            self.conn.commit()
+
+    def finish_run(self, run_id: str, status: str, summary: dict = None, metrics: dict = None,
+                   report_path: str = None):
+        metrics = metrics or {}
+        assignments = ", ".join(f"{column} = ?" for column in METRIC_COLUMNS)
+        with self.lock:
+            self.conn.execute(
+                f"UPDATE runs SET status = ?, finished = ?, report_path = COALESCE(?, report_path), "
+                f"summary = ?, {assignments} WHERE run_id = ?",
+                (status, time.time(), report_path, _dumps(summary or {}),
+                 *(metrics.get(column) for column in METRIC_COLUMNS), run_id)
+            )
+            self.conn.commit()
+
+    def list_runs(self, kind: str = None, status: str = None, target: str = None, model: str = None,
+                  search: str = None, since: float = None, until: float = None, parent_id: str = None,
+                  top_level: bool = False, sort: str = "-started", limit: int = DEFAULT_PAGE_SIZE,
+                  offset: int = 0) -> dict:
+        """按条件筛选运行，返回 {"total": 总数, "runs": [...]}，不含配置和汇总 JSON
+
+        sort 为 SORT_COLUMNS 中的字段，前缀 - 表示降序；top_level 为真时不列出对比测试的各目标和容量搜索的各级压测。
+        """
+        clauses, params = [], []
+        for column, value in (("kind", kind), ("status", status), ("target", target),
+                              ("model", model), ("parent_id", parent_id)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if search:
+            clauses.append("(run_id LIKE ? OR target LIKE ? OR model LIKE ?)")
+            params.extend([f"%{search}%"] * 3)
+        if since is not None:
+            clauses.append("started >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("started < ?")
+            params.append(until)
+        if top_level:
+            clauses.append("parent_id IS NULL")
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        column = sort.lstrip("-")
+        if column not in SORT_COLUMNS:
+            raise ValueError(f"不支持的排序字段: {column}，可选: {', '.join(SORT_COLUMNS)}")
+        order = f"{column} {'DESC' if sort.startswith('-') else 'ASC'}, run_id DESC"
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        with self.lock:
+            total = self.conn.execute(f"SELECT COUNT(*) FROM runs {where}", params).fetchone()[0]
+            rows = self.conn.execute(
+                f"SELECT {', '.join(RUN_COLUMNS)} FROM runs {where} ORDER BY {order} LIMIT ? OFFSET ?",
+                params + [limit, int(offset)]
+            ).fetchall()
+        return {"total": total, "runs": [dict(row) for row in rows]}
+
+    def get_run(self, run_id: str):
+        """返回包含配置和汇总的完整记录，不存在时返回 None"""
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        if row is None:
+            return None
+        run = dict(row)
+        run["config"] = json.loads(run["config"] or "{}")
+        run["summary"] = json.loads(run["summary"] or "{}")
+        return run
+
+    def get_rows(self, run_id: str, kind: str, limit: int = DEFAULT_PAGE_SIZE, offset: int = 0) -> dict:
+        """问答测试返回逐题结果，压测返回每秒的统计"""
+        table, columns, order = ("qa_results", QA_COLUMNS, "idx") if kind == "qa" else \
+            ("stress_history", HISTORY_COLUMNS, "elapsed")
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        with self.lock:
+            total = self.conn.execute(f"SELECT COUNT(*) FROM {table} WHERE run_id = ?", (run_id,)).fetchone()[0]
+            rows = self.conn.execute(
+                f"SELECT {', '.join(columns)} FROM {table} WHERE run_id = ? ORDER BY {order} LIMIT ? OFFSET ?",
+                (run_id, limit, int(offset))
+            ).fetchall()
+        return {"total": total, "rows": [dict(row) for row in rows]}
+
+    def compare(self, run_ids: list) -> dict:
+        """按给定顺序返回各运行的指标，以及每项指标相对第一个运行的变化比例"""
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT {', '.join(RUN_COLUMNS)} FROM runs WHERE run_id IN ({', '.join('?' * len(run_ids))})",
+                run_ids
+            ).fetchall()
+        found = {row["run_id"]: dict(row) for row in rows}
+        runs = [found[run_id] for run_id in run_ids if run_id in found]
+        if runs:
+            base = runs[0]
+            for run in runs:
+                run["change"] = {
+                    column: round((run[column] - base[column]) / base[column], 4)
+                    if run[column] is not None and base[column] else None
+                    for column in METRIC_COLUMNS
+                }
+        return {"runs": runs, "missing": [run_id for run_id in run_ids if run_id not in found]}
+
+    def prune(self, before: float, keep_last: int = 0) -> list:
+        """删除 before 之前开始的运行及其逐条结果（最近的 keep_last 个除外），返回被删除的运行
+
+        只按顶层运行（对比运行、容量搜索、单独的问答测试和压测）计算时间和 keep_last，
+        对比的各目标、容量搜索的各档压测随上级运行一起删除。上级已不存在的子运行按顶层运行处理。
+        正在运行的记录不删除。调用方负责删除返回记录中 report_path 指向的文件。
+        """
+        top_level = "(parent_id IS NULL OR parent_id NOT IN (SELECT run_id FROM runs))"
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT run_id, kind, report_path FROM runs WHERE {top_level} AND started < ? "
+                f"AND status != 'running' AND run_id NOT IN "
+                f"(SELECT run_id FROM runs WHERE {top_level} ORDER BY started DESC LIMIT ?)",
+                (before, keep_last)
+            ).fetchall()
+            deleted = [dict(row) for row in rows]
+            parents = [run["run_id"] for run in deleted]
+            for start in range(0, len(parents), 500):
+                batch = parents[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT run_id, kind, report_path FROM runs WHERE parent_id IN ({', '.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                deleted.extend(dict(row) for row in rows)
+            for table in ("qa_results", "stress_history", "runs"):
+                self.conn.executemany(f"DELETE FROM {table} WHERE run_id = ?",
+                                      [(run["run_id"],) for run in deleted])
+            self.conn.commit()
+            self.conn.execute("PRAGMA incremental_vacuum")
+        return deleted
+
+    def report_paths(self) -> set:
+        """仍在记录库中的运行引用的报告文件"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT DISTINCT report_path FROM runs WHERE report_path IS NOT NULL AND report_path != ''"
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_run_store(path: str = DEFAULT_STORE_PATH) -> RunStore:
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = RunStore(path)
+        return store
+
+
+class RunRecorder:
+    """一次问答测试的记录：逐题结果攒满 batch_size 行后批量写入
+
+    记录失败只写日志，不影响测试本身。
+    """
+
+    def __init__(self, store: RunStore, run_id: str, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.store = store
+        self.run_id = run_id
+        self.batch_size = batch_size
+        self.pending = []
+        self.finished = False
+
+    def start(self, config: dict, kind: str = "qa", parent_id: str = None):
+        self._safely(self.store.start_run, self.run_id, kind, config, parent_id)
+        return self
+
+    def add(self, index: int, question, result: dict):
+        self.pending.append((index, question, result))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            rows, self.pending = self.pending, []
+            self._safely(self.store.add_qa_results, self.run_id, rows)
+
+    def finish(self, complete: dict, metrics: dict = None):
+        """以 complete 事件作为汇总结束记录，metrics 给出时代替从 complete 中取出的指标"""
+        self.flush()
+        total = complete.get("total") or 0
+        failed = total - (complete.get("success_count") or 0)
+        metrics = metrics or {
+            "total": total,
+            "failed": failed,
+            "error_rate": round(failed / total, 4) if total else None,
+            "p50_ms": _ms(complete.get("latency_p50")),
+            "p95_ms": _ms(complete.get("latency_p95")),
+            "p99_ms": _ms(complete.get("latency_p99")),
+            "throughput": complete.get("throughput"),
+            "output_tokens_per_sec": complete.get("output_tokens_per_sec"),
+            "duration": complete.get("elapsed"),
+        }
+        summary = {key: value for key, value in complete.items() if key != "type"}
+        self._safely(self.store.finish_run, self.run_id, "completed", summary, metrics,
+                     complete.get("report_path"))
+        self.finished = True
+
+    def close(self, error: str = None):
+        """未正常结束（出错或客户端断开）时把已有结果写入并标记为 failed"""
+        if self.finished:
+            return
+        self.flush()
+        self._safely(self.store.finish_run, self.run_id, "failed", {"message": error or "运行未完成"})
+        self.finished = True
+
+    def _safely(self, method, *args):
+        try:
+            method(*args)
+        except Exception as e:
+            logger.warning(f"写入运行记录失败 {self.run_id}: {e}")
+
+
+def open_run_recorder(config: dict, kind: str = "qa", parent_id: str = None):
+    """按配置开始记录一次问答测试（或多目标对比），record_run 关闭时返回 None"""
+    if not is_recording_enabled(config):
+        return None
+    try:
+        store = get_run_store(config.get("run_store_path") or DEFAULT_STORE_PATH)
+    except Exception as e:
+        logger.warning(f"无法打开运行记录库: {e}")
+        return None
+    return RunRecorder(store, config["run_id"]).start(config, kind, parent_id)
+
+
+def record_stress_run(job, status: str, kind: str = "stress"):
+    """压测或容量搜索结束、发布最终事件之前写入记录（包括每秒统计），记录失败只写日志"""
+    if not is_recording_enabled(job.config):
+        return
+    try:
+        store = get_run_store(job.config.get("run_store_path") or DEFAULT_STORE_PATH)
+        store.start_run(job.id, kind, job.config, job.parent_id, job.started)
+        result = job.result or {}
+        if kind == "stress":
+            store.add_stress_history(job.id, job.retained_events("stats"))
+        total = result.get("total_requests")
+        failed = result.get("failed_count")
+        if kind == "stress":
+            metrics = {
+                "total": total,
+                "failed": failed,
+                "error_rate": round(failed / total, 4) if total else None,
+                "p50_ms": result.get("p50_response_time"),
+                "p95_ms": result.get("p95_response_time"),
+                "p99_ms": result.get("p99_response_time"),
+                "throughput": result.get("avg_rps"),
+                "output_tokens_per_sec": result.get("output_tokens_per_sec"),
+                "duration": round(time.time() - job.started, 2) if job.started else None,
+            }
+        else:
+            knee = result.get("knee") or {}
+            metrics = {
+                "total": len(result.get("steps") or []),
+                "error_rate": knee.get("error_rate"),
+                "p50_ms": knee.get("p50_ms"),
+                "p95_ms": knee.get("p95_ms"),
+                "p99_ms": knee.get("p99_ms"),
+                "throughput": result.get("max_rps"),
+                "output_tokens_per_sec": result.get("max_output_tokens_per_sec"),
+                "duration": round(time.time() - job.started, 2) if job.started else None,
+            }
+        summary = {key: value for key, value in result.items() if key != "type"}
+        store.finish_run(job.id, status, summary, metrics, result.get("report_path"))
+    except Exception as e:
+        logger.warning(f"写入运行记录失败 {job.id}: {e}")
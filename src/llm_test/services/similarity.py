@@ -0,0 +1,245 @@
+"""回答相似度计算
+
+提供可插拔的相似度算法：
+- sequence: difflib.SequenceMatcher，与旧版结果一致
+- levenshtein: 归一化编辑距离，支持提前截断（安装 rapidfuzz 时自动使用其C实现）
+- tfidf: 整批回答上的字符 n-gram TF-IDF 余弦相似度，基于 numpy 向量化计算（用到时才导入）
+
+逐对计算的算法在批量较大时会分块交给进程池执行。
+"""
+import math
+import os
+import logging
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from difflib import SequenceMatcher
+from functools import partial
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_METRIC = "sequence"
+# 超过该对数时逐对算法改用进程池
+DEFAULT_PARALLEL_THRESHOLD = 2000
+
+
+def is_missing(value) -> bool:
+    """参考答案或回答缺失（None、NaN、空串）"""
+    if value is None:
+        return True
+    if isinstance(value, float) and math.isnan(value):
+        return True
+    return str(value) == ""
+
+
+def sequence_ratio(a: str, b: str) -> float:
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def levenshtein_ratio(a: str, b: str, cutoff: float = 0.0) -> float:
+    """归一化编辑距离相似度 1 - dist / max(len(a), len(b))
+
+    cutoff 大于0时只在距离不超过 (1 - cutoff) * max_len 的对角带内计算，
+    一旦整行都超出带宽即提前返回 0.0，结果低于 cutoff 时同样返回 0.0。
+    """
+    if a == b:
+        return 1.0
+    if len(a) > len(b):
+        a, b = b, a
+    la, lb = len(a), len(b)
+    longest = lb
+    if la == 0:
+        return 0.0
+
+    try:
+        from rapidfuzz.distance import Levenshtein
+        return Levenshtein.normalized_similarity(a, b, score_cutoff=cutoff or None)
+    except ImportError:
+        pass
+
+    max_dist = longest if cutoff <= 0 else int((1 - cutoff) * longest + 1e-9)
+    if lb - la > max_dist:
+        return 0.0
+    # 字符频次下界：编辑距离不小于 max_len 减去两串可匹配字符数的上限
+    if cutoff > 0:
+        counts_b = Counter(b)
+        matchable = sum(min(count, counts_b[ch]) for ch, count in Counter(a).items())
+        if longest - matchable > max_dist:
+            return 0.0
+
+    inf = longest + 1
+    prev = list(range(la + 1))
+    for j in range(1, lb + 1):
+        lo = max(1, j - max_dist)
+        hi = min(la, j + max_dist)
+        cur = [inf] * (la + 1)
+        if j <= max_dist:
+            cur[0] = j
+        row_min = cur[0]
+        bj = b[j - 1]
+        for i in range(lo, hi + 1):
+            value = prev[i - 1] if a[i - 1] == bj else prev[i - 1] + 1
+            if prev[i] + 1 < value:
+                value = prev[i] + 1
+            if cur[i - 1] + 1 < value:
+                value = cur[i - 1] + 1
+            cur[i] = value
+            if value < row_min:
+                row_min = value
+        if row_min > max_dist:
+            return 0.0
+        prev = cur
+
+    dist = prev[la]
+    if dist > max_dist:
+        return 0.0
+    return 1 - dist / longest
+
+
+def _gram_ids(text: str, ngram_range: tuple):
+    """把文本的字符 n-gram 编码为 uint64（每个码点占21位），返回去重后的 id 及其计数"""
+    import numpy as np
+
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    parts = []
+    for n in range(ngram_range[0], ngram_range[1] + 1):
+        count = len(codes) - n + 1
+        if count <= 0:
+            continue
+        grams = codes[:count].copy()
+        for k in range(1, n):
+            grams = (grams << np.uint64(21)) | codes[k:k + count]
+        parts.append(grams)
+    if not parts:
+        return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)
+    return np.unique(np.concatenate(parts), return_counts=True)
+
+
+def tfidf_cosine(model_answers: list, reference_answers: list, ngram_range: tuple = (1, 2)) -> list:
+    """整批计算字符 n-gram TF-IDF 余弦相似度，IDF 以本批所有回答和参考答案为语料"""
+    import numpy as np
+
+    n = len(model_answers)
+    if n == 0:
+        return []
+
+    docs = [_gram_ids(text, ngram_range) for text in list(model_answers) + list(reference_answers)]
+    vocab, df = np.unique(np.concatenate([ids for ids, _ in docs]), return_counts=True)
+    idf = np.log((1 + len(docs)) / (1 + df)) + 1
+
+    weights = []
+    for ids, counts in docs:
+        w = counts * idf[np.searchsorted(vocab, ids)]
+        norm = np.sqrt(np.dot(w, w))
+        weights.append(w / norm if norm else w)
+
+    scores = []
+    for i in range(n):
+        ids_a, ids_b = docs[i][0], docs[n + i][0]
+        _, ia, ib = np.intersect1d(ids_a, ids_b, assume_unique=True, return_indices=True)
+        # 浮点误差可能使相同文本得到 1.0000000000000002
+        scores.append(min(1.0, float(np.dot(weights[i][ia], weights[n + i][ib]))))
+    return scores
+
+
+# 逐对算法: func(a, b) -> float；整批算法: func(model_answers, reference_answers) -> list
+_PAIR_METRICS = {
+    "sequence": sequence_ratio,
+    "levenshtein": levenshtein_ratio,
+}
+_BATCH_METRICS = {
+    "tfidf": tfidf_cosine,
+}
+
+
+def register_metric(name: str, func, batch: bool = False):
+    """注册自定义相似度算法，逐对算法需为模块级函数以便进程池序列化"""
+    _PAIR_METRICS.pop(name, None)
+    _BATCH_METRICS.pop(name, None)
+    if batch:
+        _BATCH_METRICS[name] = func
+    else:
+        _PAIR_METRICS[name] = func
+
+
+def available_metrics() -> list:
+    return sorted(set(_PAIR_METRICS) | set(_BATCH_METRICS))
+
+
+def _score_chunk(func, pairs: list) -> list:
+    return [func(a, b) for a, b in pairs]
+
+
+def score_pairs(model_answers: list, reference_answers: list, metric: str = DEFAULT_METRIC,
+                cutoff: float = 0.0, workers: int = None,
+                parallel_threshold: int = DEFAULT_PARALLEL_THRESHOLD) -> list:
+    """计算每个回答与参考答案的相似度（保留4位小数），缺失的一方记为 0.0"""
+    if metric not in _PAIR_METRICS and metric not in _BATCH_METRICS:
+        raise ValueError(f"未知的相似度算法: {metric}，可选: {', '.join(available_metrics())}")
+
+    scores = [0.0] * len(model_answers)
+    positions, pairs = [], []
+    for i, (model_ans, ref_ans) in enumerate(zip(model_answers, reference_answers)):
+        if is_missing(ref_ans) or is_missing(model_ans):
+            continue
+        positions.append(i)
+        pairs.append((str(model_ans), str(ref_ans)))
+    if not pairs:
+        return scores
+
+    if metric in _BATCH_METRICS:
+        values = _BATCH_METRICS[metric]([a for a, _ in pairs], [b for _, b in pairs])
+    else:
+        func = _PAIR_METRICS[metric]
+        if metric == "levenshtein" and cutoff:
+            func = partial(func, cutoff=cutoff)
+        if workers != 0 and len(pairs) >= parallel_threshold:
+            values = _score_parallel(func, pairs, workers)
+        else:
+            values = _score_chunk(func, pairs)
+
+    for i, value in zip(positions, values):
+        scores[i] = round(value, 4)
+    return scores
+
+
+def _score_parallel(func, pairs: list, workers: int = None) -> list:
+    workers = workers or os.cpu_count() or 1
+    chunk_size = max(1, len(pairs) // (workers * 4))
+    chunks = [pairs[i:i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+    logger.info(f"相似度计算使用进程池: {len(pairs)} 对, {len(chunks)} 块, {workers} 个进程")
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        values = []
+        for chunk_values in executor.map(_score_chunk, [func] * len(chunks), chunks):
+            values.extend(chunk_values)
+    return values
+
+
+def score_with_config(model_answers: list, reference_answers: list, config: dict) -> list:
+    """按 config 中的 similarity_* 配置计算相似度"""
+    config = config or {}
+    workers = config.get("similarity_workers")
+    return score_pairs(
+        model_answers,
+        reference_answers,
+        metric=config.get("similarity_metric") or DEFAULT_METRIC,
+        cutoff=float(config.get("similarity_cutoff", 0) or 0),
+        workers=int(workers) if workers not in (None, "") else None,
+        parallel_threshold=int(config.get("similarity_parallel_threshold", DEFAULT_PARALLEL_THRESHOLD))
+    )
+
+
+def supports_incremental(config: dict) -> bool:
+    """逐对算法可以在每个回答到达时单独评分，整批算法（如 tfidf）需要等全部回答"""
+    return ((config or {}).get("similarity_metric") or DEFAULT_METRIC) in _PAIR_METRICS
+
+
+def score_one(model_answer, reference_answer, config: dict) -> float:
+    """按配置为单个回答评分，缺失的一方记为 0.0"""
+    config = config or {}
+    return score_pairs(
+        [model_answer],
+        [reference_answer],
+        metric=config.get("similarity_metric") or DEFAULT_METRIC,
+        cutoff=float(config.get("similarity_cutoff", 0) or 0),
+        workers=0
+    )[0]
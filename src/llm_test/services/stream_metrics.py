@@ -0,0 +1,99 @@
+"""流式（SSE）chat/completions 响应的解析与Token级指标统计"""
+import json
+import time
+
+# 压测中以 Locust 自定义请求事件上报的Token级指标：Type 列为 LLM，Name 列为下列名称。
+# TTFT/ITL 的数值单位为毫秒，Tokens/s 行的“响应时间”列实际是每秒输出Token数。
+LOCUST_METRIC_TYPE = "LLM"
+LOCUST_METRICS = {"ttft": "TTFT", "itl": "ITL", "tokens_per_sec": "Tokens/s"}
+# 开环模式下因在途请求超过上限而未发出的请求：计为失败，但不计入响应时间
+LOCUST_DROPPED_TYPE = "DROPPED"
+
+
+def strip_think(answer: str) -> str:
+    """去掉回答中的 <think> 推理部分"""
+    answer = answer.strip()
+    if "<think>" in answer:
+        answer = answer.split("</think>")[-1].strip()
+    return answer
+
+
+class StreamCollector:
+    """逐行累积 SSE 流式响应，统计首Token延迟、Token间延迟和生成速率
+
+    start_time 为请求发出时刻（time.time()）。每收到一个带内容的增量即视为一个Token，
+    若服务端在最后的块中返回 usage.completion_tokens 则以其为准。
+    on_token 在每个内容增量到达时以增量文本调用。
+    """
+
+    def __init__(self, start_time: float, on_token=None):
+        self.start_time = start_time
+        self.on_token = on_token
+        self.parts = []
+        self.token_count = 0
+        self.usage_tokens = None
+        self.first_token_time = None
+        self.last_token_time = None
+        self.done = False
+
+    def feed(self, line) -> None:
+        """处理一行SSE数据（bytes 或 str）"""
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors="replace")
+        line = line.strip()
+        if not line.startswith("data:"):
+            return
+        data = line[5:].strip()
+        if data == "[DONE]":
+            self.done = True
+            return
+
+        chunk = json.loads(data)
+        usage = chunk.get("usage")
+        if usage and usage.get("completion_tokens"):
+            self.usage_tokens = usage["completion_tokens"]
+        if not chunk.get("choices"):
+            return
+
+        delta = chunk["choices"][0].get("delta") or {}
+        content = delta.get("content") or ""
+        reasoning = delta.get("reasoning_content") or ""
+        if not content and not reasoning:
+            return
+
+        now = time.time()
+        if self.first_token_time is None:
+            self.first_token_time = now
+        self.last_token_time = now
+        self.token_count += 1
+        if content:
+            self.parts.append(content)
+            if self.on_token:
+                self.on_token(content)
+
+    def finish(self, connect_time: float = 0.0) -> tuple:
+        """返回 (回答文本, 指标字典)
+
+        指标: ttft 首Token延迟, total_time 总耗时, output_tokens 输出Token数,
+        tokens_per_sec 生成阶段（首Token之后）的Token速率, itl 平均Token间延迟，单位均为秒。
+        connect_time 为本次请求新建连接的耗时，从 ttft 和 total_time 中扣除，与 latency 的口径一致。
+        """
+        end_time = time.time()
+        total_time = end_time - self.start_time - connect_time
+        output_tokens = self.usage_tokens or self.token_count
+        ttft = (self.first_token_time - self.start_time - connect_time) if self.first_token_time else total_time
+
+        generation_time = total_time - ttft
+        tokens_per_sec = output_tokens / generation_time if generation_time > 0 else 0.0
+        itl = 0.0
+        if self.token_count > 1:
+            itl = (self.last_token_time - self.first_token_time) / (self.token_count - 1)
+
+        metrics = {
+            "ttft": round(ttft, 3),
+            "total_time": round(total_time, 3),
+            "output_tokens": output_tokens,
+            "tokens_per_sec": round(tokens_per_sec, 2),
+            "itl": round(itl, 4)
+        }
+        return strip_think("".join(self.parts)), metrics
@@ -0,0 +1,621 @@
+"""后台运行的 Locust 压力测试
+
+每次压测是一个带ID的后台任务：Locust 以 --headless --csv-full-history 在子进程中运行，
+监控线程每秒读取新增的 *_stats_history.csv 行，把当前的 RPS、用户数、p50/p95 和失败数
+作为 stats 事件发布给订阅者（SSE）。任务可以提前停止，结束后从 *_stats.csv 的
+Aggregated 行汇总最终结果。每个任务的脚本、CSV、HTML 报告和日志都放在
+reports/stress/<任务ID>/ 下。
+
+单个 Locust 进程只能用满一个CPU核。workers 大于0时改为分布式运行：启动一个 --master
+和 workers 个本机 --worker 进程（"auto" 表示按CPU核数），external_workers 为额外从其他
+机器连接到 master 的 worker 数；master 汇总所有 worker 的统计后写出 CSV 和报告，
+因此进度和结果的读取方式不变。外部 worker 需使用同一个 locustfile
+（reports/stress/<任务ID>/locustfile.py）并以 --master-host 指向本机的 master 端口。
+"""
+import csv
+import importlib.metadata
+import importlib.util
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import logging
+from functools import lru_cache
+
+from .jobs import BackgroundJob, get_job, list_jobs, register_job
+from .run_store import record_stress_run
+from .workload import build_workload, parse_rate_schedule, schedule_rate
+from .stream_metrics import LOCUST_DROPPED_TYPE, LOCUST_METRIC_TYPE, LOCUST_METRICS
+
+logger = logging.getLogger(__name__)
+
+STRESS_DIR = os.path.join("reports", "stress")
+POLL_INTERVAL = 1.0
+# 压测时长之外留给启动和收尾的时间（秒），超过后强制结束
+SHUTDOWN_GRACE = 60
+PERCENTILE_COLUMNS = (('p50', '50%'), ('p90', '90%'), ('p95', '95%'), ('p99', '99%'), ('max', '100%'))
+# 压测任务对应的 LLMUser 方法
+TASK_METHODS = {'chat': 'chat_completion', 'models': 'get_models'}
+# 有外部 worker 时 master 监听的默认端口（与 Locust 默认值一致）
+DEFAULT_MASTER_PORT = 5557
+# 可以通过 /stress_test/<job_id> 系列接口访问的任务类型
+STRESS_JOB_KINDS = ('stress', 'capacity')
+
+def _as_bool(value) -> bool:
+    if isinstance(value, str):
+        return value.lower() in ('1', 'true', 'on', 'yes')
+    return bool(value)
+
+
+def build_locust_script(config: dict) -> str:
+    """按压测配置生成 locustfile，负载 spec（抽样的问题、模型参数、长度分布、任务权重）直接写入脚本
+
+    用户类继承 LLMUser，聊天请求默认以流式发送并上报 TTFT、ITL 和 Tokens/s。
+    load_mode 为 open 时改为开环调度，按 arrival_rate 发送而不受响应快慢影响。
+    """
+    target_url = config.get('target_url', 'http://localhost:1234')
+    wait_time = float(config.get('wait_time', 1))
+    spec = build_workload(config)
+    if spec['arrival']:
+        # 开环模式：每个用户只负责按计划发送，请求间不等待
+        wait = 'constant(0)'
+        tasks = {'LLMUser.open_loop': 1}
+    else:
+        wait = f'between({wait_time}, {wait_time + 0.5})'
+        tasks = {f'LLMUser.{TASK_METHODS[name]}': weight for name, weight in spec['weights'].items()}
+
+    return f'''from locust import between, constant
+
+try:
+    from llm_test.services.llm_user import LLMUser
+    from llm_test.services.workload import Workload
+except ImportError:
+    from src.llm_test.services.llm_user import LLMUser
+    from src.llm_test.services.workload import Workload
+
+
+class StressTestUser(LLMUser):
+    wait_time = {wait}
+    host = {target_url!r}
+    stream = {_as_bool(config.get('stream', True))}
+    workload = Workload({spec!r})
+    tasks = {{{', '.join(f'{method}: {weight}' for method, weight in tasks.items())}}}
+'''
+
+
+@lru_cache(maxsize=None)
+def probe_locust() -> dict:
+    """检查 Locust 是否可用，结果在进程内缓存
+
+    控制台进程不导入 locust（导入会做 gevent monkey patch，且耗时较长），只查找模块并运行一次
+    python -m locust --version。安装或修复依赖后以 probe_locust.cache_clear() 重新检查。
+    """
+    result = {
+        'python_path': sys.executable,
+        'python_version': sys.version,
+        'checked': time.time(),
+    }
+    if importlib.util.find_spec('locust') is None:
+        result['locust_installed'] = False
+        result['locust_error'] = "No module named 'locust'"
+        result['message'] = 'Locust未安装，请运行: pip install locust'
+    else:
+        result['locust_installed'] = True
+        try:
+            result['locust_version'] = importlib.metadata.version('locust')
+        except importlib.metadata.PackageNotFoundError:
+            pass
+
+    # 测试命令行
+    try:
+        cmd_result = subprocess.run(
+            [sys.executable, '-m', 'locust', '--version'],
+            capture_output=True,
+            text=True,
+            timeout=10
+        )
+        output = cmd_result.stdout + cmd_result.stderr
+        result['locust_command'] = cmd_result.returncode == 0
+        result['locust_command_output'] = output
+        if cmd_result.returncode != 0 and result['locust_installed']:
+            result['locust_installed'] = False
+            result['locust_error'] = output.strip().splitlines()[-1] if output.strip() else f'退出码 {cmd_result.returncode}'
+        if 'zope.event' in output:
+            result['fix_command'] = 'pip install zope.event'
+            result['message'] = '缺少zope.event依赖，请运行: pip install zope.event'
+    except Exception as e:
+        result['locust_command'] = False
+        result['locust_command_error'] = str(e)
+    return result
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def parse_worker_count(value) -> int:
+    """workers 配置: 0 或空为单进程，"auto" 为本机CPU核数"""
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if value == 'auto':
+            return os.cpu_count() or 1
+    return max(0, int(value or 0))
+
+
+def _number(value, cast=float):
+    if value in (None, "", "N/A"):
+        return None
+    try:
+        return cast(float(value))
+    except ValueError:
+        return None
+
+
+def _is_aggregated(row: dict) -> bool:
+    return row.get('Type') == 'Aggregated' or row.get('Name') == 'Aggregated'
+
+
+def _is_metric(row: dict) -> bool:
+    return row.get('Type') == LOCUST_METRIC_TYPE
+
+
+def _is_dropped(row: dict) -> bool:
+    return row.get('Type') == LOCUST_DROPPED_TYPE
+
+
+def _combine_requests(rows: list, count_column: str, average_column: str) -> dict:
+    """合并多个接口行的请求数和平均响应时间，分位数取请求数最多的接口（近似）"""
+    counts = [_number(row.get(count_column), int) or 0 for row in rows]
+    total = sum(counts)
+    average = sum(count * (_number(row.get(average_column)) or 0) for count, row in zip(counts, rows))
+    return {
+        'total': total,
+        'average': average / total if total else 0.0,
+        'main': max(zip(counts, range(len(rows))))[1] if rows else None,
+    }
+
+
+def summarize_metrics(rows: list, count_column: str = 'Request Count',
+                      average_column: str = 'Average Response Time') -> dict:
+    """LLMUser 上报的 TTFT/ITL/Tokens/s 行的汇总，如 {"ttft": {"avg": ..., "p50": ..., ...}}"""
+    names = {name: key for key, name in LOCUST_METRICS.items()}
+    metrics = {}
+    for row in rows:
+        key = names.get(row.get('Name'))
+        if not _is_metric(row) or key is None:
+            continue
+        summary = {'count': _number(row.get(count_column), int), 'avg': _number(row.get(average_column))}
+        for name, column in PERCENTILE_COLUMNS:
+            summary[name] = _number(row.get(column))
+        metrics[key] = {name: round(value, 2) if isinstance(value, float) else value
+                        for name, value in summary.items()}
+    return metrics
+
+
+def read_aggregated_stats(stats_file: str) -> dict:
+    """读取 Locust *_stats.csv 的汇总（响应时间单位为毫秒），文件不存在时返回 None
+
+    LLMUser 上报的 LLM 类型行不是真实请求，不计入请求数和响应时间，
+    而是单独汇总到 llm_metrics；此时分位数取请求数最多的接口。
+    DROPPED 类型行（开环模式未发出的请求）计入请求数和失败数，不计入响应时间。
+    """
+    if not os.path.exists(stats_file):
+        return None
+    with open(stats_file, 'r', encoding='utf-8') as csvfile:
+        rows = list(csv.DictReader(csvfile))
+    aggregated = next((row for row in rows if _is_aggregated(row)), None)
+    if aggregated is None:
+        return None
+
+    metric_rows = [row for row in rows if _is_metric(row)]
+    dropped_rows = [row for row in rows if _is_dropped(row)]
+    if metric_rows or dropped_rows:
+        request_rows = [row for row in rows if not _is_aggregated(row) and not _is_metric(row)
+                        and not _is_dropped(row)]
+        combined = _combine_requests(request_rows, 'Request Count', 'Average Response Time')
+        dropped = sum(_number(row.get('Request Count'), int) or 0 for row in dropped_rows)
+        total_requests = combined['total'] + dropped
+        failed_count = sum(_number(row.get('Failure Count'), int) or 0 for row in request_rows) + dropped
+        average = combined['average']
+        source = request_rows[combined['main']] if request_rows else {}
+    else:
+        dropped = 0
+        total_requests = int(aggregated.get('Request Count', 0) or aggregated.get('# requests', 0) or 0)
+        failed_count = int(aggregated.get('Failure Count', 0) or aggregated.get('# failures', 0) or 0)
+        average = float(aggregated.get('Average Response Time', 0) or aggregated.get('Average response time', 0) or 0)
+        source = aggregated
+    stats = {
+        'total_requests': total_requests,
+        'success_count': total_requests - failed_count,
+        'failed_count': failed_count,
+        'avg_response_time': round(average, 2),
+    }
+    if dropped:
+        stats['dropped_count'] = dropped
+    # Locust 按响应时间直方图给出的分位数
+    for key, column in PERCENTILE_COLUMNS:
+        value = _number(source.get(column))
+        if value is not None:
+            stats[f'{key}_response_time'] = round(value, 2)
+    if metric_rows or dropped_rows:
+        maximum = [_number(row.get('100%')) for row in request_rows]
+        if any(value is not None for value in maximum):
+            stats['max_response_time'] = round(max(value for value in maximum if value is not None), 2)
+    if metric_rows:
+        stats['llm_metrics'] = summarize_metrics(metric_rows)
+        # LLMUser 上报 Tokens/s 时以输出Token数作为内容大小，乘积即为总输出Token数
+        for row in metric_rows:
+            if row.get('Name') == LOCUST_METRICS['tokens_per_sec']:
+                stats['output_tokens'] = int((_number(row.get('Request Count'), int) or 0)
+                                             * (_number(row.get('Average Content Size')) or 0))
+    return stats
+
+
+def parse_history_row(row: dict, started: float) -> dict:
+    """把 *_stats_history.csv 的一行 Aggregated 记录转换为 stats 事件"""
+    timestamp = _number(row.get('Timestamp'), int)
+    return {
+        'type': 'stats',
+        'elapsed': round(timestamp - started, 1) if timestamp else None,
+        'users': _number(row.get('User Count'), int),
+        'current_rps': _number(row.get('Requests/s')),
+        'current_fail_per_sec': _number(row.get('Failures/s')),
+        'p50_response_time': _number(row.get('50%')),
+        'p95_response_time': _number(row.get('95%')),
+        'total_requests': _number(row.get('Total Request Count'), int),
+        'failed_count': _number(row.get('Total Failure Count'), int),
+        'avg_response_time': _number(row.get('Total Average Response Time')),
+    }
+
+
+def parse_history_rows(rows: list, started: float) -> dict:
+    """把同一时刻的各接口行和 Aggregated 行转换为 stats 事件
+
+    LLM 指标行不计入请求统计；DROPPED 行计入请求数和失败数，不计入响应时间和 RPS。
+    """
+    aggregated = rows[-1]
+    metric_rows = [row for row in rows if _is_metric(row)]
+    dropped_rows = [row for row in rows if _is_dropped(row)]
+    if not metric_rows and not dropped_rows:
+        return parse_history_row(aggregated, started)
+
+    request_rows = [row for row in rows[:-1] if not _is_metric(row) and not _is_dropped(row)]
+    combined = _combine_requests(request_rows, 'Total Request Count', 'Total Average Response Time')
+    main = request_rows[combined['main']] if request_rows else {}
+    dropped = sum(_number(row.get('Total Request Count'), int) or 0 for row in dropped_rows)
+    event = parse_history_row(aggregated, started)
+    event.update({
+        'current_rps': round(sum(_number(row.get('Requests/s')) or 0 for row in request_rows), 2),
+        'current_fail_per_sec': round(sum(_number(row.get('Failures/s')) or 0
+                                          for row in request_rows + dropped_rows), 2),
+        'p50_response_time': _number(main.get('50%')),
+        'p95_response_time': _number(main.get('95%')),
+        'total_requests': combined['total'] + dropped,
+        'failed_count': sum(_number(row.get('Total Failure Count'), int) or 0 for row in request_rows) + dropped,
+        'avg_response_time': round(combined['average'], 2),
+    })
+    if dropped:
+        event['dropped_count'] = dropped
+    if metric_rows:
+        event['llm_metrics'] = summarize_metrics(metric_rows, 'Total Request Count', 'Total Average Response Time')
+    return event
+
+
+class CsvTail:
+    """增量读取正在被追加写入的 CSV 文件，只返回已写完整的行"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.offset = 0
+        self.header = None
+
+    def read_new_rows(self) -> list:
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path, 'r', encoding='utf-8', newline='') as f:
+            f.seek(self.offset)
+            chunk = f.read()
+        end = chunk.rfind('\n')
+        if end < 0:
+            return []
+        complete = chunk[:end + 1]
+        self.offset += len(complete.encode('utf-8'))
+        lines = complete.splitlines()
+        if self.header is None and lines:
+            self.header = next(csv.reader([lines[0]]))
+            lines = lines[1:]
+        return [dict(zip(self.header, values)) for values in csv.reader(lines)]
+
+
+class StressJob(BackgroundJob):
+    """一次后台压测"""
+
+    kind = 'stress'
+
+    def __init__(self, config: dict, job_id: str = None, parent_id: str = None):
+        super().__init__(config, job_id, parent_id)
+        self.users = int(config.get('users', 10))
+        self.spawn_rate = int(config.get('spawn_rate', 2))
+        self.duration = int(config.get('duration', 60))
+        self.load_mode = str(config.get('load_mode') or 'closed').lower()
+        self.schedule = None
+        if self.load_mode == 'open' and config.get('arrival_rate'):
+            self.schedule = parse_rate_schedule(config['arrival_rate'], self.duration)
+            # 开环模式的用户只是发送调度器，同时启动
+            self.spawn_rate = self.users
+        self.directory = os.path.join(STRESS_DIR, self.id)
+        self.csv_prefix = os.path.join(self.directory, 'locust')
+        self.html_path = os.path.join(self.directory, 'report.html')
+        self.log_path = os.path.join(self.directory, 'locust.log')
+        self.workers = parse_worker_count(config.get('workers', 0))
+        self.external_workers = max(0, int(config.get('external_workers', 0) or 0))
+        # 外部 worker 需要事先知道 master 端口，只有本机 worker 时选一个空闲端口避免多个任务冲突
+        port = config.get('master_port')
+        if port:
+            self.master_port = int(port)
+        else:
+            self.master_port = DEFAULT_MASTER_PORT if self.external_workers else _free_port()
+
+        self.process = None
+        self.worker_processes = []
+        self.abort_reason = None
+        self.history_rows = []
+
+    @property
+    def distributed(self) -> bool:
+        return self.workers + self.external_workers > 0
+
+    def command(self, script_path: str) -> list:
+        """单进程或 master 的命令行，分布式时只有 master 输出 CSV 和 HTML 报告"""
+        cmd = [
+            sys.executable,
+            '-m', 'locust',
+            '-f', script_path,
+            '--headless',
+            '-u', str(self.users),
+            '-r', str(self.spawn_rate),
+            '-t', f'{self.duration}s',
+            '--html', self.html_path,
+            '--csv', self.csv_prefix,
+            '--csv-full-history',
+            '--loglevel', 'WARNING'
+        ]
+        if self.distributed:
+            cmd += [
+                '--master',
+                '--expect-workers', str(self.workers + self.external_workers),
+                '--master-bind-port', str(self.master_port)
+            ]
+        return cmd
+
+    def worker_command(self, script_path: str) -> list:
+        return [
+            sys.executable,
+            '-m', 'locust',
+            '-f', script_path,
+            '--worker',
+            '--master-host', '127.0.0.1',
+            '--master-port', str(self.master_port),
+            '--loglevel', 'WARNING'
+        ]
+
+    def start(self):
+        script = build_locust_script(self.config)
+        os.makedirs(self.directory, exist_ok=True)
+        script_path = os.path.join(self.directory, 'locustfile.py')
+        with open(script_path, 'w', encoding='utf-8') as f:
+            f.write(script)
+
+        cmd = self.command(script_path)
+        logger.info(f"压测任务 {self.id} 启动: {' '.join(cmd)}")
+        self.log_file = open(self.log_path, 'w', encoding='utf-8', errors='replace')
+        self.started = time.time()
+        try:
+            self.process = subprocess.Popen(
+                cmd,
+                stdout=self.log_file,
+                stderr=subprocess.STDOUT,
+                cwd=os.getcwd(),
+                env=os.environ.copy()
+            )
+            if self.workers:
+                self._start_workers(script_path)
+        except Exception:
+            logger.error(f"压测任务 {self.id} 启动失败，结束已启动的进程", exc_info=True)
+            self._abort_start()
+            raise
+        self.publish({
+            'type': 'start',
+            'users': self.users,
+            'spawn_rate': self.spawn_rate,
+            'load_mode': self.load_mode,
+            'arrival_rate': self.config.get('arrival_rate') if self.schedule else None,
+            'duration': self.duration,
+            'workers': self.workers,
+            'external_workers': self.external_workers,
+            'master_port': self.master_port if self.distributed else None,
+            'report_path': self.html_path,
+        }, status='running')
+        self.thread = threading.Thread(target=self._monitor, name=f'stress-{self.id}', daemon=True)
+        self.thread.start()
+        return self
+
+    def _start_workers(self, script_path: str):
+        cmd = self.worker_command(script_path)
+        logger.info(f"压测任务 {self.id} 启动 {self.workers} 个本机 worker: {' '.join(cmd)}")
+        for index in range(self.workers):
+            log_file = open(os.path.join(self.directory, f'worker-{index + 1}.log'), 'w',
+                            encoding='utf-8', errors='replace')
+            try:
+                process = subprocess.Popen(
+                    cmd,
+                    stdout=log_file,
+                    stderr=subprocess.STDOUT,
+                    cwd=os.getcwd(),
+                    env=os.environ.copy()
+                )
+            except Exception:
+                log_file.close()
+                raise
+            self.worker_processes.append((process, log_file))
+
+    def _abort_start(self):
+        """启动中途失败时结束已启动的 master 和 worker 并关闭日志，不留下孤儿进程"""
+        processes = list(self.worker_processes)
+        if self.process is not None:
+            processes.append((self.process, self.log_file))
+        else:
+            self.log_file.close()
+        for process, log_file in processes:
+            process.terminate()
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+            log_file.close()
+        self.worker_processes = []
+        self.process = None
+
+    def _workers_lost(self) -> bool:
+        """压测时长内本机 worker 全部退出（且没有外部 worker）时，master 会一直等待，需要提前结束
+
+        压测正常结束时 master 会先通知 worker 退出，再写出报告，此时不算异常。
+        """
+        return (bool(self.worker_processes) and not self.external_workers
+                and time.time() < self.started + self.duration
+                and all(process.poll() is not None for process, _ in self.worker_processes))
+
+    def _stop_workers(self):
+        # master 退出时会通知 worker 结束，这里只清理仍未退出的进程
+        for process, log_file in self.worker_processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.terminate()
+                try:
+                    process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+            log_file.close()
+
+    def stop(self) -> bool:
+        """请求提前结束压测，Locust 收到 SIGTERM 后会停止用户并写出报告"""
+        if self.finished or self.process is None:
+            return False
+        self.stop_requested = True
+        logger.info(f"停止压测任务 {self.id}")
+        self.process.terminate()
+        return True
+
+    def _publish_history(self, tail: CsvTail):
+        # 每个时刻先写各接口行，最后写 Aggregated 行
+        for row in tail.read_new_rows():
+            self.history_rows.append(row)
+            if row.get('Name') == 'Aggregated':
+                event = parse_history_rows(self.history_rows, self.started)
+                if self.schedule and event['elapsed'] is not None:
+                    event['target_rps'] = round(schedule_rate(self.schedule, event['elapsed']), 2)
+                self.publish(event)
+                self.history_rows = []
+
+    def _monitor(self):
+        tail = CsvTail(f'{self.csv_prefix}_stats_history.csv')
+        deadline = self.started + self.duration + SHUTDOWN_GRACE
+        try:
+            while self.process.poll() is None:
+                time.sleep(POLL_INTERVAL)
+                self._publish_history(tail)
+                if time.time() > deadline:
+                    logger.error(f"压测任务 {self.id} 超时，强制结束")
+                    self.process.kill()
+                elif self._workers_lost() and self.process.poll() is None:
+                    self.abort_reason = 'worker 进程已全部退出'
+                    logger.error(f"压测任务 {self.id}: {self.abort_reason}，结束 master")
+                    self.process.terminate()
+            self._publish_history(tail)
+        except Exception as e:
+            logger.error(f"读取压测进度失败: {e}", exc_info=True)
+        finally:
+            self.process.wait()
+            self.log_file.close()
+            self._stop_workers()
+        self._finish()
+
+    def _log_tail(self, limit: int = 2000) -> str:
+        output = ''
+        paths = [self.log_path] + [os.path.join(self.directory, f'worker-{index + 1}.log')
+                                   for index in range(len(self.worker_processes))]
+        for path in paths:
+            try:
+                with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                    output += f.read()
+            except OSError:
+                continue
+        lines = [line for line in output.split('\n')
+                 if 'MonkeyPatchWarning' not in line and 'monkey.patch_all' not in line]
+        return '\n'.join(lines).strip()[-limit:]
+
+    def _finish(self):
+        returncode = self.process.returncode
+        elapsed = time.time() - self.started
+        logger.info(f"压测任务 {self.id} 结束，返回码: {returncode}")
+        try:
+            stats = read_aggregated_stats(f'{self.csv_prefix}_stats.csv')
+        except Exception as e:
+            logger.error(f"读取CSV失败: {e}")
+            stats = None
+
+        # Locust 在有失败请求时返回码为1，只要生成了统计就视为完成
+        if stats is None:
+            output = self._log_tail()
+            if 'ModuleNotFoundError' in output or 'No module named' in output:
+                message = 'Locust依赖包缺失，请运行: pip install locust zope.event'
+            elif self.abort_reason:
+                message = f'压测失败: {self.abort_reason}，{output[-500:]}'
+            elif self.stop_requested:
+                message = '压测在产生统计数据前被停止'
+            else:
+                message = f'压测执行失败: {output[-500:] or "未知错误"}'
+            logger.error(message)
+            self.result = {'status': 'error', 'message': message}
+            record_stress_run(self, 'failed')
+            self.publish({'type': 'error', 'message': message}, status='failed')
+            return
+
+        stopped = self.stop_requested or self.abort_reason is not None
+        run_time = min(elapsed, self.duration) if stopped else self.duration
+        stats['avg_rps'] = round(stats['total_requests'] / run_time, 2) if run_time > 0 else 0
+        if 'output_tokens' in stats:
+            stats['output_tokens_per_sec'] = round(stats['output_tokens'] / run_time, 2) if run_time > 0 else 0
+        logger.info(f"最终结果: RPS={stats['avg_rps']}, 总请求={stats['total_requests']}, "
+                    f"成功={stats['success_count']}, 失败={stats['failed_count']}")
+        self.result = dict(stats, status='success', stopped=stopped, report_path=self.html_path)
+        if self.abort_reason:
+            self.result['message'] = f'压测提前结束: {self.abort_reason}'
+        status = 'stopped' if stopped else 'completed'
+        record_stress_run(self, status)
+        self.publish(dict(self.result, type='complete'), status=status)
+
+    def info(self) -> dict:
+        return dict(super().info(), workers=self.workers, external_workers=self.external_workers)
+
+
+def start_stress_job(config: dict) -> StressJob:
+    # 生成负载或启动进程失败时不登记任务
+    return register_job(StressJob(config).start())
+
+
+def get_stress_job(job_id: str):
+    """按ID查找压测或容量搜索任务"""
+    job = get_job(job_id)
+    return job if job is not None and job.kind in STRESS_JOB_KINDS else None
+
+
+def list_stress_jobs() -> list:
+    return [info for info in list_jobs() if info['kind'] in STRESS_JOB_KINDS]
@@ -0,0 +1,189 @@
+"""客户端限流与自适应并发
+
+- RateLimiter: 令牌桶限流，rate_limit_rps 限制每秒发出的请求数，rate_limit_tps 限制每秒
+  输出的Token数（回答返回后按实际输出Token数扣减，欠额还清前不再发出新请求）
+- ConcurrencyLimit: 在途请求上限。adaptive_concurrency 开启时按 AIMD 调整：请求正常且
+  延迟低于目标时每轮加1，遇到 HTTP 429/503 时减半，延迟超过目标时小幅收缩，
+  从而让在途请求数停留在服务端的饱和点附近。
+
+两者共同取代旧版每次回答后固定等待 sleep_interval 的做法。
+"""
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 视为服务端过载的状态码
+OVERLOAD_STATUS = (429, 503)
+# 过载时的乘性收缩比例
+OVERLOAD_BACKOFF = 0.5
+# 延迟超过目标时的乘性收缩比例
+LATENCY_BACKOFF = 0.9
+# 未配置目标延迟时，取观测到的最小延迟的倍数作为目标
+DEFAULT_LATENCY_TOLERANCE = 2.0
+DEFAULT_CONCURRENCY_MAX = 64
+
+
+class TokenBucket:
+    """允许欠额的令牌桶：reserve() 立即扣减并返回需要等待的秒数"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = max(1.0, capacity if capacity is not None else rate)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float = 1.0) -> float:
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(0.0, (amount - self.level) / self.rate)
+            self.level -= amount
+            return wait
+
+    def consume(self, amount: float):
+        """事后扣减（如实际输出的Token数），可使余额为负"""
+        with self.lock:
+            self._refill(time.monotonic())
+            self.level -= amount
+
+
+class RateLimiter:
+    """请求数和Token数两个令牌桶的组合"""
+
+    def __init__(self, rps: float = 0, tps: float = 0, burst: float = None):
+        self.requests = TokenBucket(rps, burst if burst is not None else 1) if rps > 0 else None
+        self.tokens = TokenBucket(tps) if tps > 0 else None
+
+    def delay(self) -> float:
+        """为下一个请求预留额度，返回发出前需要等待的秒数"""
+        wait = 0.0
+        if self.requests is not None:
+            wait = self.requests.reserve(1)
+        if self.tokens is not None:
+            # 只等待还清之前的欠额，本次的Token数在回答返回后扣减
+            wait = max(wait, self.tokens.reserve(0))
+        return wait
+
+    def wait(self):
+        delay = self.delay()
+        if delay > 0:
+            time.sleep(delay)
+
+    def record(self, result: dict):
+        """按回答的实际输出Token数扣减，没有 usage 时以回答字符数估计"""
+        if self.tokens is None or not result.get("success") or result.get("cached"):
+            return
+        self.tokens.consume(result.get("output_tokens") or len(result.get("answer") or ""))
+
+
+class ConcurrencyLimit:
+    """在途请求上限，adaptive 为真时按 AIMD 调整"""
+
+    def __init__(self, initial: int = 1, adaptive: bool = False, minimum: int = 1,
+                 maximum: int = DEFAULT_CONCURRENCY_MAX, target_latency: float = 0,
+                 tolerance: float = DEFAULT_LATENCY_TOLERANCE):
+        self.adaptive = adaptive
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum) if adaptive else initial
+        self.value = float(min(max(initial, self.minimum), self.maximum))
+        self.target_latency = target_latency
+        self.tolerance = tolerance
+        self.min_latency = None
+        self.last_decrease = 0.0
+        self.peak = self.limit
+
+    @property
+    def limit(self) -> int:
+        return max(1, int(self.value))
+
+    def _target(self):
+        if self.target_latency:
+            return self.target_latency
+        if self.min_latency is None:
+            return None
+        return self.min_latency * self.tolerance
+
+    def on_result(self, result: dict):
+        """根据一个完成的请求调整上限"""
+        if not self.adaptive or result.get("cached"):
+            return
+        now = time.monotonic()
+        latency = result.get("latency") or 0
+        # 在上次收缩之前发出的请求反映的是收缩前的负载，不再重复收缩
+        sent_at = now - latency - (result.get("connect_time") or 0)
+
+        # 重试后成功的请求中途遇到的 429/503 同样说明服务端已过载
+        overload = [a["status_code"] for a in result.get("attempts") or [result]
+                    if a.get("status_code") in OVERLOAD_STATUS]
+        if overload:
+            self._decrease(OVERLOAD_BACKOFF, sent_at, now, f"HTTP {overload[-1]}", logging.INFO)
+            return
+        if not result.get("success"):
+            return
+
+        if latency > 0 and (self.min_latency is None or latency < self.min_latency):
+            self.min_latency = latency
+        target = self._target()
+        if target is not None and latency > target:
+            self._decrease(LATENCY_BACKOFF, sent_at, now, f"延迟 {latency}s 超过目标 {target:.2f}s", logging.DEBUG)
+        elif self.value < self.maximum:
+            # 每完成约 limit 个请求（一轮）加1
+            self.value = min(self.maximum, self.value + 1 / self.value)
+            self.peak = max(self.peak, self.limit)
+
+    def _decrease(self, ratio: float, sent_at: float, now: float, reason: str, level: int):
+        if sent_at < self.last_decrease:
+            return
+        before = self.limit
+        self.value = max(self.minimum, self.value * ratio)
+        self.last_decrease = now
+        if self.limit != before:
+            logger.log(level, f"自适应并发收缩: {before} -> {self.limit}（{reason}）")
+
+
+def _as_bool(value) -> bool:
+    if isinstance(value, str):
+        return value.lower() in ("1", "true", "on", "yes")
+    return bool(value)
+
+
+def create_rate_limiter(config: dict):
+    """按 rate_limit_rps / rate_limit_tps 创建限流器，均未配置时返回 None
+
+    兼容旧配置：逐个提问且未配置 rate_limit_rps 时，sleep_interval 换算为每秒请求数。
+    """
+    rps = float(config.get("rate_limit_rps") or 0)
+    tps = float(config.get("rate_limit_tps") or 0)
+    burst = config.get("rate_limit_burst")
+    concurrency = max(1, int(config.get("concurrency", 1) or 1))
+    sleep_interval = float(config.get("sleep_interval") or 0)
+    if not rps and concurrency == 1 and sleep_interval > 0 and not _as_bool(config.get("adaptive_concurrency")):
+        rps = 1 / sleep_interval
+    if rps <= 0 and tps <= 0:
+        return None
+    logger.info(f"客户端限流: {rps or '不限'} 请求/秒, {tps or '不限'} Token/秒")
+    return RateLimiter(rps, tps, float(burst) if burst not in (None, "") else None)
+
+
+def create_concurrency_limit(config: dict) -> ConcurrencyLimit:
+    """按 concurrency 和 adaptive_concurrency 配置创建在途请求上限"""
+    concurrency = max(1, int(config.get("concurrency", 1) or 1))
+    adaptive = _as_bool(config.get("adaptive_concurrency", False))
+    limit = ConcurrencyLimit(
+        initial=concurrency,
+        adaptive=adaptive,
+        minimum=int(config.get("concurrency_min", 1) or 1),
+        maximum=int(config.get("concurrency_max", DEFAULT_CONCURRENCY_MAX) or DEFAULT_CONCURRENCY_MAX),
+        target_latency=float(config.get("target_latency") or 0),
+        tolerance=float(config.get("latency_tolerance") or DEFAULT_LATENCY_TOLERANCE)
+    )
+    if adaptive:
+        logger.info(f"自适应并发: 初始 {limit.limit}, 范围 {limit.minimum}-{limit.maximum}")
+    return limit
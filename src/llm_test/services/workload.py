@@ -0,0 +1,261 @@
+"""压测负载：从问题库抽样的提示词、长度分布和任务权重
+
+压测脚本原先对每个请求都发送固定的“你好”和 max_tokens=100，既会命中服务端的前缀缓存，
+Token 量也与真实流量相差甚远。build_workload 按问答测试相同的问题来源（question_mode 为
+file 时读 questions_file，为 input 时读 questions_text）抽样最多 max_prompts 个问题，
+连同模型参数和长度分布组成一个只含基本类型的 spec，写入生成的 locustfile；
+压测进程中由 Workload 按 spec 逐个生成请求体。
+
+长度分布的写法（prompt_length 单位为字符，output_length 单位为Token，即每个请求的 max_tokens）：
+- "256": 固定值
+- "uniform:64,512": 均匀分布
+- "normal:300,80": 正态分布（均值, 标准差）
+- "lognormal:200,0.8": 对数正态分布（中位数, sigma），适合长尾的回答长度
+- "choice:64,256,1024": 从给定值中等概率选取
+
+task_weights 为任务权重，如 "chat:4,models:1"，未配置时按 test_endpoint 取默认值。
+
+load_mode 为 open 时使用开环负载：不论响应快慢，都按 arrival_rate 计划的时刻发出请求，
+避免服务端变慢时发出的负载随之下降（coordinated omission）。arrival_rate 的写法：
+- "20": 固定 20 请求/秒
+- "ramp:1,50": 在压测时长内从 1 线性增加到 50 请求/秒
+- "steps:5,10,20,40": 把压测时长均分为若干段，逐段提高到达率
+arrival_process 为 uniform（等间隔，默认）或 poisson（指数分布的间隔）。
+"""
+import math
+import random
+import logging
+
+from .question_loader import iter_file, iter_text
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROMPT = "你好"
+DEFAULT_MAX_PROMPTS = 1000
+DISTRIBUTIONS = ("uniform", "normal", "lognormal", "choice")
+SCHEDULES = ("ramp", "steps")
+ARRIVAL_PROCESSES = ("uniform", "poisson")
+# 开环模式下所有用户合计的在途请求上限，超出的请求记为失败而不是排队等待
+DEFAULT_MAX_IN_FLIGHT = 1000
+TASKS = ("chat", "models")
+# test_endpoint 对应的默认任务权重
+ENDPOINT_WEIGHTS = {
+    "models": {"models": 1},
+    "chat": {"chat": 1},
+    "both": {"models": 1, "chat": 3},
+}
+
+
+def parse_distribution(spec):
+    """把长度分布的字符串解析为 {"kind": ..., "params": [...]}，空值返回 None"""
+    if spec in (None, ""):
+        return None
+    if isinstance(spec, dict):
+        return spec
+    spec = str(spec).strip()
+    if ":" not in spec:
+        return {"kind": "fixed", "params": [float(spec)]}
+    kind, _, args = spec.partition(":")
+    kind = kind.strip().lower()
+    if kind not in DISTRIBUTIONS:
+        raise ValueError(f"未知的长度分布: {kind}，可选: fixed, {', '.join(DISTRIBUTIONS)}")
+    params = [float(value) for value in args.split(",") if value.strip()]
+    if kind != "choice" and len(params) != 2:
+        raise ValueError(f"长度分布 {kind} 需要两个参数: {spec}")
+    if not params:
+        raise ValueError(f"长度分布缺少参数: {spec}")
+    return {"kind": kind, "params": params}
+
+
+def sample_length(distribution: dict, rng: random.Random) -> int:
+    """按分布取一个长度，结果至少为1"""
+    kind, params = distribution["kind"], distribution["params"]
+    if kind == "fixed":
+        value = params[0]
+    elif kind == "uniform":
+        value = rng.uniform(params[0], params[1])
+    elif kind == "normal":
+        value = rng.gauss(params[0], params[1])
+    elif kind == "lognormal":
+        value = rng.lognormvariate(math.log(params[0]), params[1])
+    else:
+        value = rng.choice(params)
+    return max(1, int(round(value)))
+
+
+def parse_rate_schedule(spec, duration: float) -> dict:
+    """把到达率的字符串解析为 {"kind": ..., "rates": [...], "duration": ...}"""
+    spec = str(spec).strip()
+    if ":" not in spec:
+        return {"kind": "constant", "rates": [float(spec)], "duration": duration}
+    kind, _, args = spec.partition(":")
+    kind = kind.strip().lower()
+    if kind not in SCHEDULES:
+        raise ValueError(f"未知的到达率计划: {kind}，可选: 固定值, {', '.join(SCHEDULES)}")
+    rates = [float(value) for value in args.split(",") if value.strip()]
+    if kind == "ramp" and len(rates) != 2:
+        raise ValueError(f"ramp 需要起始和结束两个到达率: {spec}")
+    if not rates:
+        raise ValueError(f"到达率计划缺少参数: {spec}")
+    return {"kind": kind, "rates": rates, "duration": duration}
+
+
+def schedule_rate(schedule: dict, elapsed: float) -> float:
+    """压测开始 elapsed 秒时的计划到达率（请求/秒）"""
+    rates = schedule["rates"]
+    duration = schedule.get("duration") or 0
+    progress = min(1.0, max(0.0, elapsed / duration)) if duration > 0 else 1.0
+    if schedule["kind"] == "ramp":
+        return rates[0] + (rates[1] - rates[0]) * progress
+    if schedule["kind"] == "steps":
+        return rates[min(len(rates) - 1, int(progress * len(rates)))]
+    return rates[0]
+
+
+def build_arrival(config: dict):
+    """load_mode 为 open 时返回开环负载的配置，否则返回 None"""
+    if str(config.get("load_mode") or "closed").lower() != "open":
+        return None
+    spec = config.get("arrival_rate")
+    if spec in (None, ""):
+        raise ValueError("开环模式需要设置到达率 arrival_rate")
+    process = str(config.get("arrival_process") or "uniform").lower()
+    if process not in ARRIVAL_PROCESSES:
+        raise ValueError(f"未知的到达过程: {process}，可选: {', '.join(ARRIVAL_PROCESSES)}")
+    return {
+        "schedule": parse_rate_schedule(spec, float(config.get("duration", 60))),
+        "process": process,
+        # 每个用户承担 1/users 的到达率
+        "users": max(1, int(config.get("users", 1))),
+        "max_in_flight": int(config.get("max_in_flight") or DEFAULT_MAX_IN_FLIGHT),
+    }
+
+
+def parse_weights(spec, test_endpoint: str = "models") -> dict:
+    """解析 "chat:4,models:1" 形式的任务权重，权重为0的任务不执行"""
+    if not spec:
+        return dict(ENDPOINT_WEIGHTS.get(test_endpoint, ENDPOINT_WEIGHTS["models"]))
+    weights = {}
+    for item in str(spec).split(","):
+        if not item.strip():
+            continue
+        name, _, weight = item.partition(":")
+        name = name.strip()
+        if name not in TASKS:
+            raise ValueError(f"未知的压测任务: {name}，可选: {', '.join(TASKS)}")
+        weights[name] = int(weight) if weight.strip() else 1
+    weights = {name: weight for name, weight in weights.items() if weight > 0}
+    if not weights:
+        raise ValueError(f"任务权重全部为0: {spec}")
+    return weights
+
+
+def sample_prompts(rows, limit: int, rng: random.Random) -> list:
+    """从 (序号, 问题, 参考答案) 中蓄水池抽样最多 limit 个非空问题，不把整个问题库读入内存"""
+    prompts = []
+    seen = 0
+    for _, question, _ in rows:
+        if not question or not question.strip():
+            continue
+        seen += 1
+        if len(prompts) < limit:
+            prompts.append(question.strip())
+        else:
+            index = rng.randrange(seen)
+            if index < limit:
+                prompts[index] = question.strip()
+    return prompts
+
+
+def load_prompts(config: dict, rng: random.Random) -> list:
+    """按 question_mode 读取压测用的提示词，未配置问题来源时返回固定提示词"""
+    mode = config.get("question_mode") or "fixed"
+    limit = int(config.get("max_prompts") or DEFAULT_MAX_PROMPTS)
+    if mode == "input":
+        rows = iter_text(config.get("questions_text") or "")
+    elif mode == "file":
+        file_path = config.get("questions_file")
+        if not file_path:
+            raise ValueError("未提供问题文件")
+        rows = iter_file(file_path)
+    else:
+        return [DEFAULT_PROMPT]
+    prompts = sample_prompts(rows, limit, rng)
+    if not prompts:
+        raise ValueError("问题来源中没有可用的问题")
+    logger.info(f"压测提示词: 从{'文本输入' if mode == 'input' else file_path}抽取 {len(prompts)} 个问题")
+    return prompts
+
+
+def _as_bool(value) -> bool:
+    if isinstance(value, str):
+        return value.lower() in ("1", "true", "on", "yes")
+    return bool(value)
+
+
+def build_workload(config: dict) -> dict:
+    """按压测配置生成负载 spec（可直接写入 locustfile 的 dict）"""
+    seed = config.get("seed")
+    rng = random.Random(int(seed) if seed not in (None, "") else None)
+    weights = parse_weights(config.get("task_weights"), config.get("test_endpoint", "models"))
+    return {
+        "model": config.get("model_name", "local-model"),
+        "temperature": float(config.get("temperature", 0.7)),
+        "max_tokens": int(config.get("max_tokens", 100)),
+        # 只压测 /v1/models 时不需要读取问题来源
+        "prompts": load_prompts(config, rng) if "chat" in weights else [DEFAULT_PROMPT],
+        "prompt_length": parse_distribution(config.get("prompt_length")),
+        "output_length": parse_distribution(config.get("output_length")),
+        "ignore_eos": _as_bool(config.get("ignore_eos", False)),
+        "weights": weights,
+        "arrival": build_arrival(config),
+        "seed": int(seed) if seed not in (None, "") else None,
+    }
+
+
+class Workload:
+    """在压测进程中按 spec 生成请求体"""
+
+    def __init__(self, spec: dict):
+        self.spec = spec
+        self.prompts = spec.get("prompts") or [DEFAULT_PROMPT]
+        self.prompt_length = spec.get("prompt_length")
+        self.output_length = spec.get("output_length")
+        self.rng = random.Random(spec.get("seed"))
+
+    def prompt(self) -> str:
+        """随机取一个问题；配置了 prompt_length 时拼接多个问题后截断到抽样的长度"""
+        if not self.prompt_length:
+            return self.rng.choice(self.prompts)
+        target = sample_length(self.prompt_length, self.rng)
+        parts = []
+        size = 0
+        while size < target:
+            part = self.rng.choice(self.prompts)
+            parts.append(part)
+            size += len(part) + 1
+        return "\n".join(parts)[:target]
+
+    def next_task(self) -> str:
+        """开环模式下按任务权重选择下一个请求"""
+        weights = self.spec.get("weights") or {"chat": 1}
+        return self.rng.choices(list(weights), weights=list(weights.values()))[0]
+
+    def max_tokens(self) -> int:
+        if not self.output_length:
+            return self.spec.get("max_tokens", 100)
+        return sample_length(self.output_length, self.rng)
+
+    def payload(self, stream: bool = False) -> dict:
+        payload = {
+            "model": self.spec.get("model", "local-model"),
+            "messages": [{"role": "user", "content": self.prompt()}],
+            "temperature": self.spec.get("temperature", 0.7),
+            "max_tokens": self.max_tokens(),
+        }
+        if self.spec.get("ignore_eos"):
+            # vLLM 等服务端的扩展参数：忽略结束符，按 max_tokens 生成满额Token
+            payload["ignore_eos"] = True
+        if stream:
+            payload["stream"] = True
+        return payload
@@ -5,8 +5,8 @@ import os
 def check_structure():
     """检查项目结构"""
     print("检查项目结构...")
-    required_dirs = ['src/llm_test', 'templates', 'data', 'docs', 'scripts', 'reports']
-    required_files = ['main.py', 'README.md', 'requirements.txt', 'setup.py']
+    required_dirs = ['src/llm_test', 'src/llm_test/templates', 'data', 'docs', 'scripts', 'reports']
+    required_files = ['main.py', 'docs/README.md', 'requirements.txt', 'setup.py']
     
     missing = []
     for d in required_dirs:
@@ -52,7 +52,7 @@ def check_templates():
     missing = []
     
     for t in templates:
-        path = os.path.join('templates', t)
+        path = os.path.join('src', 'llm_test', 'templates', t)
         if not os.path.exists(path):
             missing.append(t)
     